@@ -1,14 +1,15 @@
-import pymysql
-pymysql.install_as_MySQLdb()
 from flask import Flask
-from flask_mysqldb import MySQL
 from datetime import timedelta
+from .db import Database
 
-mysql = MySQL()
+# Pooled connections; keeps the flask_mysqldb `mysql.connection` interface
+mysql = Database()
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.config.from_pyfile('../config.py')
+    if config:
+        app.config.update(config)
     
     # Session configuration for authentication
     app.config['SESSION_PERMANENT'] = True
@@ -19,7 +20,59 @@ def create_app():
     
     mysql.init_app(app)
     
+    # Operator-tuned maintenance intervals, picked up without restarting workers
+    from .models.oil_calculator import refresh_interval_rules
+    if app.config.get('INTERVAL_RULES_FILE'):
+        # Also for the CLI commands, which serve no requests
+        refresh_interval_rules(app.config['INTERVAL_RULES_FILE'], 0)
+    
+    @app.before_request
+    def reload_interval_rules():
+        if app.config.get('INTERVAL_RULES_FILE'):
+            refresh_interval_rules(app.config['INTERVAL_RULES_FILE'],
+                                   app.config.get('INTERVAL_RULES_CHECK_SECONDS', 30))
+    
+    # Per-worker caches of the dashboard header counters, the logged-in user identities and table rows
+    from .cache import summary_cache, identity_cache, row_fragment_cache
+    summary_cache.configure(maxsize=app.config.get('SUMMARY_CACHE_SIZE', 1024),
+                            ttl=app.config.get('SUMMARY_CACHE_TTL', 60))
+    identity_cache.configure(ttl=app.config.get('IDENTITY_CACHE_TTL', 30))
+    row_fragment_cache.configure(max_bytes=app.config.get('ROW_FRAGMENT_CACHE_BYTES', 32 * 1024 * 1024))
+    
+    from .security import password_hasher
+    password_hasher.configure(scheme=app.config.get('PASSWORD_HASH_SCHEME', 'pbkdf2'),
+                              pbkdf2_iterations=app.config.get('PASSWORD_PBKDF2_ITERATIONS', 1000000),
+                              bcrypt_rounds=app.config.get('PASSWORD_BCRYPT_ROUNDS', 12),
+                              workers=app.config.get('PASSWORD_HASH_WORKERS', 4),
+                              timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 10))
+    
+    # Uploaded logos are validated and resized by a background thread pool
+    from .logos import logo_processor
+    logo_processor.configure(app, mysql, workers=app.config.get('LOGO_WORKERS', 2))
+    
+    from .catalog import car_model_catalog
+    car_model_catalog.check_interval = app.config.get('CATALOG_CHECK_SECONDS', 60)
+    
     from .routes import main
     app.register_blueprint(main)
     
+    from .commands import register_commands
+    register_commands(app)
+    
+    # Optional in-process scheduler for the background fleet scan (enable in one process only)
+    if app.config.get('FLEET_SCAN_INTERVAL'):
+        from .scanner import start_scan_scheduler
+        start_scan_scheduler(app, mysql)
+    
+    # Request, SQL, estimator and template timings at /metrics
+    if app.config.get('METRICS_ENABLED', True):
+        from .metrics import init_metrics
+        init_metrics(app, mysql)
+    
+    # Odometer readings posted by telematics boxes are buffered and flushed in the background
+    if app.config.get('TELEMETRY_TOKENS'):
+        from .telemetry import odometer_buffer, start_telemetry_flusher
+        odometer_buffer.max_pending = app.config.get('TELEMETRY_MAX_PENDING', 50000)
+        start_telemetry_flusher(app, mysql)
+    
     return app
\ No newline at end of file
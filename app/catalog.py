@@ -0,0 +1,212 @@
+"""
+Car model catalog cache. The grouped catalog served by /api/car_models is built once,
+kept as encoded JSON bytes with a content-hash ETag, and rebuilt only when a cheap
+fingerprint query over car_models shows that the table changed. The typeahead search
+index is built together with it.
+"""
+from collections import namedtuple
+import hashlib
+import heapq
+import re
+import threading
+import time
+
+from flask import current_app
+
+FUEL_TYPE_SUFFIXES = {'electric': " ⚡", 'hybrid': " 🔋", 'diesel': " 🛢️"}
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 50
+MIN_TRIGRAM_SIMILARITY = 0.5  # Share of the query's trigrams an entry must contain
+
+CatalogSnapshot = namedtuple('CatalogSnapshot', 'body etag by_id search_index fingerprint')
+
+
+def model_display_name(model):
+    """Model name with engine size and fuel type indicator, as shown in the model picker"""
+    display_name = model['model']
+    if model['engine_size'] and model['engine_size'] != '0.0L':
+        display_name += f" ({model['engine_size']})"
+    return display_name + FUEL_TYPE_SUFFIXES.get(model['fuel_type'], '')
+
+
+def group_by_brand(models):
+    """Group active model rows by brand for the picker"""
+    brands = {}
+    for model in models:
+        if not model['is_active']:
+            continue
+        brands.setdefault(model['brand'], []).append({
+            'id': model['id'],
+            'model': model['model'],
+            'engine_size': model['engine_size'],
+            'fuel_type': model['fuel_type'],
+            'display': model_display_name(model)
+        })
+    return brands
+
+
+def _tokenize(text):
+    """Lowercase search tokens: words, engine sizes like "2.0l", plus hyphenated words joined ("cr-v" -> "crv")"""
+    text = text.lower()
+    tokens = [token.strip('.') for token in re.findall(r'[\w.]+', text)]
+    tokens += [word.replace('-', '') for word in re.findall(r'\w+(?:-\w+)+', text)]
+    return [token for token in tokens if token]
+
+
+def _trigrams(token):
+    """Character trigrams of a token, padded so that the start of the word weighs more"""
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ModelSearchIndex:
+    """
+    In-memory typeahead index over brand, model and engine size of the active models.
+    Every query term must prefix-match a token of the entry; entries are ranked by the
+    number of terms matching a whole token, then catalog order. Queries with no prefix
+    match (typos) fall back to trigram similarity.
+    """
+
+    def __init__(self, models):
+        self.entries = []
+        prefixes = {}
+        self.exact = {}
+        self.trigrams = {}
+
+        for model in models:
+            if not model['is_active']:
+                continue
+            entry_id = len(self.entries)
+            self.entries.append({
+                'id': model['id'],
+                'brand': model['brand'],
+                'model': model['model'],
+                'engine_size': model['engine_size'],
+                'fuel_type': model['fuel_type'],
+                'display': f"{model['brand']} {model_display_name(model)}"
+            })
+
+            tokens = set(_tokenize(' '.join(filter(None, (model['brand'], model['model'], model['engine_size'])))))
+            for token in tokens:
+                self.exact.setdefault(token, set()).add(entry_id)
+                for end in range(1, len(token) + 1):
+                    prefixes.setdefault(token[:end], set()).add(entry_id)
+                for trigram in _trigrams(token):
+                    self.trigrams.setdefault(trigram, set()).add(entry_id)
+
+        # Sets for membership tests, sorted tuples to walk matches in catalog order
+        self.prefix_sets = prefixes
+        self.prefix_lists = {prefix: tuple(sorted(entry_ids)) for prefix, entry_ids in prefixes.items()}
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Top `limit` entries for a free-text query; an empty query lists the catalog in order"""
+        terms = _tokenize(query or '')
+        if not terms:
+            return self.entries[:limit]
+        if any(term not in self.prefix_sets for term in terms):
+            return self._fuzzy(terms, limit)
+
+        # Walk the shortest posting list, checking membership in the others
+        terms.sort(key=lambda term: len(self.prefix_sets[term]))
+        others = [self.prefix_sets[term] for term in terms[1:]]
+        exact = [self.exact[term] for term in terms if term in self.exact]
+
+        # Bucket matches by how many terms hit a whole token; stop once the best bucket is full
+        buckets = [[] for _ in range(len(exact) + 1)]
+        for entry_id in self.prefix_lists[terms[0]]:
+            if all(entry_id in entry_ids for entry_ids in others):
+                bucket = buckets[sum(entry_id in entry_ids for entry_ids in exact)]
+                bucket.append(entry_id)
+                if bucket is buckets[-1] and len(bucket) >= limit:
+                    break
+
+        ranked = [entry_id for bucket in reversed(buckets) for entry_id in bucket][:limit]
+        return [self.entries[entry_id] for entry_id in ranked]
+
+    def _fuzzy(self, terms, limit):
+        """Entries containing most of the query's trigrams"""
+        query_trigrams = set().union(*(_trigrams(term) for term in terms))
+        shared = {}
+        for trigram in query_trigrams:
+            for entry_id in self.trigrams.get(trigram, ()):
+                shared[entry_id] = shared.get(entry_id, 0) + 1
+
+        threshold = MIN_TRIGRAM_SIMILARITY * len(query_trigrams)
+        candidates = [entry_id for entry_id, count in shared.items() if count >= threshold]
+        ranked = heapq.nsmallest(limit, candidates, key=lambda entry_id: (-shared[entry_id], entry_id))
+        return [self.entries[entry_id] for entry_id in ranked]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class CarModelCatalog:
+    """Process-wide catalog snapshot, re-validated against the database at most every `check_interval` seconds"""
+
+    def __init__(self, check_interval=60):
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._miss_checked_at = 0.0
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def _fingerprint(self, cursor):
+        # updated_at changes on every edit, so renamed models or changed fuel types are noticed too
+        cursor.execute("""
+            SELECT COUNT(*) AS models, MAX(id) AS max_id, SUM(is_active) AS active, MAX(created_at) AS newest,
+                   MAX(updated_at) AS last_change
+            FROM car_models
+        """)
+        row = cursor.fetchone()
+        return (int(row['models']), row['max_id'], int(row['active'] or 0), str(row['newest']),
+                str(row['last_change']))
+
+    def _build(self, cursor, fingerprint):
+        cursor.execute("""
+            SELECT id, brand, model, engine_size, fuel_type, is_active
+            FROM car_models
+            ORDER BY brand, model, engine_size
+        """)
+        models = cursor.fetchall()
+
+        body = current_app.json.dumps(group_by_brand(models)).encode('utf-8')
+        by_id = {model['id']: {'brand': model['brand'], 'model': model['model'],
+                               'engine_size': model['engine_size'], 'fuel_type': model['fuel_type']}
+                 for model in models}
+        self.builds += 1
+        return CatalogSnapshot(body, hashlib.sha1(body).hexdigest(), by_id, ModelSearchIndex(models), fingerprint)
+
+    def get(self, cursor):
+        """Current snapshot, rebuilding it if car_models changed since it was built"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is not snapshot:
+                return self._snapshot  # Another thread already refreshed it
+            fingerprint = self._fingerprint(cursor)
+            if snapshot is None or snapshot.fingerprint != fingerprint:
+                self._snapshot = self._build(cursor, fingerprint)
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def lookup(self, cursor, model_id):
+        """Catalog entry for a model id (including inactive models), or None"""
+        model = self.get(cursor).by_id.get(model_id)
+        if model is None and time.monotonic() - self._miss_checked_at >= self.check_interval:
+            # Possibly added since the last check, don't wait for the interval; at most once per
+            # interval, so requests for unknown ids cannot force a check each time
+            self._miss_checked_at = time.monotonic()
+            self.invalidate()
+            model = self.get(cursor).by_id.get(model_id)
+        return model
+
+    def invalidate(self):
+        """Force a fingerprint check on the next access"""
+        self._checked_at = 0.0
+
+
+car_model_catalog = CarModelCatalog()
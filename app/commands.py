@@ -0,0 +1,170 @@
+"""
+Maintenance commands for the flask CLI, e.g. `flask --app run backfill-service-due`
+"""
+import os
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app import mysql
+from .fleet import invalidate_fleet_summary, materialize_service_due
+from .importer import detect_format, import_vehicles
+from .scanner import SCAN_BATCH_SIZE, scan_fleet
+from .reminders import send_due_reminders
+from .forecasting import rebuild_usage_stats
+from .migrations import check_query_plans, migrate, pending_migrations
+from .logos import GC_GRACE_SECONDS, collect_logo_garbage, is_vector, logo_processor
+
+
+@click.command('backfill-service-due')
+@click.option('--batch-size', default=1000, show_default=True, help='Cars updated per transaction')
+@with_appcontext
+def backfill_service_due(batch_size):
+    """Recompute the materialized next-service-due columns for every car (stale rows are also recomputed on use)"""
+    updated = materialize_service_due(mysql.connection, stale_only=False, batch_size=batch_size)
+    click.echo(f"Backfilled next-service-due columns for {updated} cars.")
+
+
+@click.command('import-vehicles')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--company-id', type=int, required=True, help='Company the vehicles are added to')
+@click.option('--user-id', type=int, help='User recorded as creator (defaults to the company admin)')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension')
+@with_appcontext
+def import_vehicles_command(path, company_id, user_id, fmt):
+    """Bulk import vehicles from a CSV or NDJSON file"""
+    fmt = detect_format(path, fmt)
+    cursor = mysql.connection.cursor()
+    if user_id is None:
+        cursor.execute("""
+            SELECT id FROM users WHERE company_id = %s AND is_active = TRUE
+            ORDER BY role = 'admin' DESC, id LIMIT 1
+        """, (company_id,))
+        user = cursor.fetchone()
+        if not user:
+            raise click.ClickException(f"Company {company_id} has no active users")
+        user_id = user['id']
+    cursor.close()
+
+    with open(path, 'rb') as stream:
+        report = import_vehicles(mysql.connection, company_id, user_id, stream, fmt)
+    invalidate_fleet_summary(company_id)
+
+    for error in report.errors:
+        click.echo(f"line {error['line']} [{error['plate_number'] or '-'}]: {error['error']}", err=True)
+    click.echo(f"Imported {report.imported} of {report.processed} vehicles ({report.error_count} failed).")
+
+
+@click.command('scan-fleet')
+@click.option('--workers', type=int, help='Evaluator processes (0 evaluates in this process)')
+@click.option('--batch-size', default=SCAN_BATCH_SIZE, show_default=True, help='Cars per batch')
+@with_appcontext
+def scan_fleet_command(workers, batch_size):
+    """Precompute the maintenance and tire status of every active car"""
+    if workers is None:
+        workers = current_app.config.get('FLEET_SCAN_WORKERS', 0)
+    result = scan_fleet(mysql.connection, workers=workers, batch_size=batch_size,
+                        rules_file=current_app.config.get('INTERVAL_RULES_FILE'))
+    click.echo(f"Refreshed {result['scanned']} vehicle status snapshots in {result['seconds']}s.")
+
+
+@click.command('send-reminders')
+@with_appcontext
+def send_reminders_command():
+    """Queue reminders for newly due vehicles and deliver all pending ones"""
+    result = send_due_reminders(mysql.connection, current_app.config)
+    click.echo(f"Queued {result['queued']} reminders, sent {result['sent']}, failed {result['failed']}.")
+
+
+@click.command('rebuild-usage')
+@with_appcontext
+def rebuild_usage_command():
+    """Recompute the usage-rate forecast statistics from service history and current mileage"""
+    rebuilt = rebuild_usage_stats(mysql.connection)
+    click.echo(f"Rebuilt usage statistics for {rebuilt} cars.")
+
+
+@click.command('migrate-db')
+@click.option('--target', type=int, help='Stop after this version (defaults to the latest)')
+@click.option('--status', is_flag=True, help='List pending migrations without applying them')
+@with_appcontext
+def migrate_db_command(target, status):
+    """Apply the pending schema migrations"""
+    if status:
+        pending = pending_migrations(mysql.connection)
+        for migration in pending:
+            click.echo(f"pending {migration.version}: {migration.description}")
+        click.echo(f"{len(pending)} pending migrations.")
+        return
+    applied = migrate(mysql.connection, target)
+    for migration in applied:
+        click.echo(f"Applied {migration.version}: {migration.description}")
+    click.echo(f"Database is up to date ({len(applied)} migrations applied).")
+
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans_command():
+    """EXPLAIN the hot queries and fail if any of them scans a whole table or index or sorts outside one"""
+    problems = check_query_plans(mysql.connection)
+    for name, issues in problems.items():
+        for issue in issues:
+            click.echo(f"{name}: {issue}", err=True)
+    if problems:
+        raise click.ClickException(f"{len(problems)} hot queries do full scans or sorts")
+    click.echo("All hot queries use indexes.")
+
+
+@click.command('process-logos')
+@with_appcontext
+def process_logos_command():
+    """Write the pre-sized variants of company logos uploaded before they existed"""
+    from .routes import UPLOAD_FOLDER
+    cursor = mysql.connection.cursor()
+    cursor.execute("SELECT id, logo_filename FROM companies WHERE logo_filename IS NOT NULL")
+    companies = cursor.fetchall()
+    cursor.close()
+
+    processed = rejected = 0
+    for company in companies:
+        logo_filename = company['logo_filename']
+        if is_vector(logo_filename) or logo_processor.is_ready(UPLOAD_FOLDER, logo_filename):
+            continue
+        if logo_processor.process(os.path.abspath(os.path.join(UPLOAD_FOLDER, logo_filename))):
+            processed += 1
+        else:
+            rejected += 1
+    click.echo(f"Processed {processed} logos, {rejected} could not be used.")
+
+
+@click.command('gc-logos')
+@click.option('--grace-seconds', default=GC_GRACE_SECONDS, show_default=True,
+              help='Keep unreferenced files written or reused more recently than this')
+@click.option('--dry-run', is_flag=True, help='List the files that would be deleted')
+@with_appcontext
+def gc_logos_command(grace_seconds, dry_run):
+    """Delete logo files (and their thumbnails) that no company refers to"""
+    from .routes import UPLOAD_FOLDER
+    cursor = mysql.connection.cursor()
+    cursor.execute("SELECT DISTINCT logo_filename FROM companies WHERE logo_filename IS NOT NULL")
+    referenced = [row['logo_filename'] for row in cursor.fetchall()]
+    cursor.close()
+
+    removed = collect_logo_garbage(UPLOAD_FOLDER, referenced, grace_seconds, dry_run)
+    for name in removed:
+        click.echo(f"{'would remove' if dry_run else 'removed'} {name}")
+    click.echo(f"{len(removed)} unreferenced logo files {'found' if dry_run else 'deleted'}.")
+
+
+def register_commands(app):
+    """Attach the CLI commands to the app"""
+    app.cli.add_command(backfill_service_due)
+    app.cli.add_command(import_vehicles_command)
+    app.cli.add_command(scan_fleet_command)
+    app.cli.add_command(send_reminders_command)
+    app.cli.add_command(rebuild_usage_command)
+    app.cli.add_command(migrate_db_command)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(process_logos_command)
+    app.cli.add_command(gc_logos_command)
@@ -0,0 +1,281 @@
+"""
+Pooled MySQL connections. Replaces flask_mysqldb's connection-per-app-context with a bounded
+pool: each request (or CLI app context) checks out one connection on first use and returns
+it on teardown. `db.connection` keeps the flask_mysqldb interface, so routes are unchanged.
+"""
+from collections import deque
+import threading
+import time
+
+from flask import g
+import pymysql
+import pymysql.cursors
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the pool timeout"""
+    pass
+
+
+def default_health_check(connection):
+    """Ping the server; pymysql connections have ping(), other DB-API connections run SELECT 1"""
+    if hasattr(connection, 'ping'):
+        connection.ping(reconnect=False)
+    else:
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        cursor.close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections made by `creator`.
+
+    min_size connections are kept open; up to max_size may exist at once, and the ones above
+    min_size are closed after `idle_timeout` seconds unused. When all max_size connections are
+    in use, checkout waits up to `timeout` seconds for one to be returned.
+    Connections older than `max_lifetime` seconds are replaced, and connections idle for more
+    than `ping_after` seconds are health-checked on checkout.
+    """
+
+    def __init__(self, creator, min_size=1, max_size=10, timeout=10, max_lifetime=3600, idle_timeout=300,
+                 ping_after=5, health_check=default_health_check):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self.creator = creator
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.health_check = health_check
+
+        self._idle = deque()  # (connection, created_at, last_used_at), most recently used on the right
+        self._created_at = {}  # id(connection) -> created_at for connections checked out
+        self._size = 0
+        self._cond = threading.Condition()
+
+        self.checkouts = 0
+        self.created = 0
+        self.closed = 0
+        self.failed_health_checks = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _open(self):
+        """Create a connection for a slot already reserved in _size"""
+        try:
+            connection = self.creator()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.created += 1
+        return connection, time.monotonic()
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self.closed += 1
+            self._cond.notify()
+
+    def _checkout(self, connection, created_at):
+        self._created_at[id(connection)] = created_at
+        self.checkouts += 1
+        return connection
+
+    def acquire(self):
+        """Check out a healthy connection, waiting up to `timeout` seconds if the pool is exhausted"""
+        deadline = None
+        started = time.monotonic()
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    if deadline is None:
+                        deadline = started + self.timeout
+                        self.waits += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"No database connection available within {self.timeout}s "
+                                          f"({self.max_size} in use)")
+                    self._cond.wait(remaining)
+
+                if deadline is not None:
+                    waited = time.monotonic() - started
+                    self.total_wait += waited
+                    self.max_wait = max(self.max_wait, waited)
+                    deadline = None
+
+                if self._idle:
+                    connection, created_at, last_used_at = self._idle.pop()
+                else:
+                    self._size += 1
+                    connection = None
+
+            if connection is None:
+                connection, created_at = self._open()
+                with self._cond:
+                    return self._checkout(connection, created_at)
+
+            now = time.monotonic()
+            if now - created_at > self.max_lifetime:
+                self._close(connection)
+                continue
+            if now - last_used_at > self.ping_after:
+                try:
+                    self.health_check(connection)
+                except Exception:
+                    with self._cond:
+                        self.failed_health_checks += 1
+                    self._close(connection)
+                    continue
+            with self._cond:
+                return self._checkout(connection, created_at)
+
+    def release(self, connection, discard=False):
+        """Return a checked-out connection; any open transaction is rolled back"""
+        with self._cond:
+            created_at = self._created_at.pop(id(connection), None)
+        if created_at is None:
+            return
+
+        if not discard:
+            try:
+                connection.rollback()
+            except Exception:
+                discard = True
+
+        now = time.monotonic()
+        if discard or now - created_at > self.max_lifetime:
+            self._close(connection)
+        else:
+            with self._cond:
+                self._idle.append((connection, created_at, now))
+                self._cond.notify()
+        self._shrink(now)
+
+    def _shrink(self, now):
+        """Close connections above min_size that have been idle for more than idle_timeout"""
+        expired = []
+        with self._cond:
+            while (self._idle and self._size - len(expired) > self.min_size
+                   and now - self._idle[0][2] > self.idle_timeout):
+                expired.append(self._idle.popleft()[0])
+        for connection in expired:
+            self._close(connection)
+
+    def fill(self):
+        """Open connections until min_size are available (e.g. at startup)"""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            connection, created_at = self._open()
+            with self._cond:
+                self._idle.appendleft((connection, created_at, time.monotonic()))
+                self._cond.notify()
+
+    def close_all(self):
+        """Close the idle connections, e.g. at shutdown or after a database failover"""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _, _ in idle:
+            self._close(connection)
+
+    def stats(self):
+        """Pool counters for monitoring"""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'size': self._size,
+                'in_use': self._size - idle,
+                'idle': idle,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'checkouts': self.checkouts,
+                'created': self.created,
+                'closed': self.closed,
+                'failed_health_checks': self.failed_health_checks,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'total_wait_ms': round(self.total_wait * 1000, 3),
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'avg_wait_ms': round(self.total_wait * 1000 / self.waits, 3) if self.waits else 0.0
+            }
+
+
+class Database:
+    """
+    Flask extension handing out pooled connections, a drop-in for flask_mysqldb.MySQL:
+    `db.connection` is checked out on first use in an app context and released on teardown.
+
+    Pool settings come from DB_POOL_* config keys. DB_CREATOR may be set to a callable
+    returning a DB-API connection (e.g. a local SQLite stand-in) instead of connecting to MySQL.
+    """
+
+    def __init__(self, app=None):
+        self.pool = None
+        self.wrap_connection = None  # Optional proxy factory for the handed-out connection (see app/metrics.py)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        creator = app.config.get('DB_CREATOR') or self._mysql_creator(app.config)
+        self.pool = ConnectionPool(
+            creator,
+            min_size=app.config.get('DB_POOL_MIN_SIZE', 1),
+            max_size=app.config.get('DB_POOL_MAX_SIZE', 10),
+            timeout=app.config.get('DB_POOL_TIMEOUT', 10),
+            max_lifetime=app.config.get('DB_POOL_MAX_LIFETIME', 3600),
+            idle_timeout=app.config.get('DB_POOL_IDLE_TIMEOUT', 300),
+            ping_after=app.config.get('DB_POOL_PING_AFTER', 5)
+        )
+        app.teardown_appcontext(self.teardown)
+
+    @staticmethod
+    def _mysql_creator(config):
+        """Connection factory from the MYSQL_* settings flask_mysqldb used"""
+        cursorclass = getattr(pymysql.cursors, config.get('MYSQL_CURSORCLASS') or 'Cursor')
+        kwargs = {
+            'host': config.get('MYSQL_HOST', 'localhost'),
+            'user': config.get('MYSQL_USER'),
+            'password': config.get('MYSQL_PASSWORD', ''),
+            'database': config.get('MYSQL_DB'),
+            'port': config.get('MYSQL_PORT', 3306),
+            'charset': config.get('MYSQL_CHARSET', 'utf8mb4'),
+            'cursorclass': cursorclass,
+            'connect_timeout': config.get('MYSQL_CONNECT_TIMEOUT', 10),
+            'autocommit': False
+        }
+        if config.get('MYSQL_UNIX_SOCKET'):
+            kwargs['unix_socket'] = config['MYSQL_UNIX_SOCKET']
+        return lambda: pymysql.connect(**kwargs)
+
+    @property
+    def connection(self):
+        """The app context's pooled connection, checked out on first access"""
+        if 'db_connection' not in g:
+            g.db_connection = self.pool.acquire()
+            g.db_connection_view = self.wrap_connection(g.db_connection) if self.wrap_connection else g.db_connection
+        return g.db_connection_view
+
+    def teardown(self, exception):
+        g.pop('db_connection_view', None)
+        connection = g.pop('db_connection', None)
+        if connection is not None:
+            self.pool.release(connection)
+
+    def stats(self):
+        return self.pool.stats() if self.pool else {}
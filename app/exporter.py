@@ -0,0 +1,102 @@
+"""
+Streaming fleet export to CSV or NDJSON. Rows are read through an unbuffered server-side
+cursor and evaluated in small batches, so memory stays flat whatever the fleet size.
+"""
+from operator import itemgetter
+import csv
+import io
+import json
+
+import pymysql.cursors
+
+from .fleet import evaluate_vehicles, filter_conditions
+from .models.oil_calculator import Severity
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXPORT_BATCH_SIZE = 500
+
+
+def _status_columns(prefix, key):
+    """Getters for the fields of a ServiceStatus column"""
+    return {
+        f'{prefix}_severity': lambda vehicle: Severity(vehicle[key].severity).name.lower(),
+        f'{prefix}_km_remaining': lambda vehicle: vehicle[key].km_remaining,
+        f'{prefix}_months_remaining': lambda vehicle: vehicle[key].months_remaining,
+        f'{prefix}_status': lambda vehicle: vehicle[key].message
+    }
+
+
+# Column name -> value getter over a dashboard row (see fleet.evaluate_vehicles), in export order
+EXPORT_COLUMNS = {
+    **{name: itemgetter(name) for name in ('id', 'plate_number', 'car_model', 'brand', 'vehicle_type',
+                                           'owner_name', 'owner_phone', 'mileage', 'gas_type', 'oil_type',
+                                           'tire_brand', 'status')},
+    **_status_columns('maintenance', 'maintenance_status'),
+    **_status_columns('tire', 'tire_status'),
+    **{name: itemgetter(name) for name in ('last_oil_change_km', 'last_oil_change_date', 'last_tire_change_km',
+                                           'last_tire_change_date', 'created_at')}
+}
+
+
+def parse_columns(value):
+    """Selected export columns from a comma-separated list, all columns if empty"""
+    if not value:
+        return list(EXPORT_COLUMNS)
+    columns = [column.strip() for column in value.split(',') if column.strip()]
+    unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown export columns: {', '.join(unknown)}")
+    return columns
+
+
+def _json_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _format_csv(rows, columns, header):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def _format_ndjson(rows, columns, header):
+    return ''.join(json.dumps(dict(zip(columns, map(_json_value, row))), ensure_ascii=False) + '\n'
+                   for row in rows)
+
+
+def export_vehicles(connection, company_id, filters, columns, fmt):
+    """
+    Generator of export chunks (str) for a company's vehicles, newest first.
+    Must be consumed within the request, e.g. through stream_with_context.
+    """
+    formatter = _format_csv if fmt == 'csv' else _format_ndjson
+    getters = [EXPORT_COLUMNS[column] for column in columns]
+    conditions, params = filter_conditions(company_id, filters)
+
+    # Unbuffered: the server streams the result instead of the client materializing it
+    cursor = connection.cursor(pymysql.cursors.SSDictCursor)
+    try:
+        cursor.execute(f"""
+            SELECT c.*, cm.brand, cm.model as model_name, cm.engine_size, cm.fuel_type
+            FROM cars c
+            LEFT JOIN car_models cm ON c.car_model_id = cm.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY c.created_at DESC, c.id DESC
+        """, params)
+
+        header = True
+        while True:
+            cars = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not cars:
+                break
+            rows = [[getter(vehicle) for getter in getters] for vehicle in evaluate_vehicles(cars)]
+            yield formatter(rows, columns, header)
+            header = False
+
+        if header and fmt == 'csv':
+            yield formatter([], columns, header)
+    finally:
+        cursor.close()
@@ -0,0 +1,466 @@
+"""
+Fleet queries shared by the dashboard and the JSON API: keyset-paginated vehicle listing,
+server-side filters and the header counters.
+"""
+from datetime import date, datetime
+import base64
+import hashlib
+import time
+
+import numpy as np
+
+from .cache import summary_cache
+from .catalog import car_model_catalog
+from .metrics import observe_estimator
+from .models.oil_calculator import (ServiceStatus, Severity, estimate_maintenance_batch, estimate_tire_batch,
+                                    get_interval_table, months_elapsed, months_after, to_service_statuses)
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+FLEET_STATUSES = ('good', 'critical')
+VEHICLE_TYPES = ('gasoline', 'diesel', 'hybrid', 'electric')
+
+# Tires with no recorded change date are assumed to be this many months old (see evaluate_fleet)
+MISSING_TIRE_MONTHS = 48
+# Due date stored for such tires when that age is past their interval, i.e. they are always due
+ALWAYS_DUE = date(1970, 1, 1)
+
+# Service due conditions over the materialized next_*_due columns, parameterized by today's date
+# (twice for SERVICE_DUE_CONDITION, once for TIRE_DUE_CONDITION).
+# The columns are covered by idx_cars_service_due, so these evaluate inside the index range scan
+# for a company instead of running the estimators over the whole fleet.
+TIRE_DUE_CONDITION = "(c.mileage >= c.next_tire_due_km OR c.next_tire_due_date <= %s)"
+SERVICE_DUE_CONDITION = f"""COALESCE(c.mileage >= c.next_oil_due_km OR c.next_oil_due_date <= %s
+                                     OR {TIRE_DUE_CONDITION}, FALSE)"""
+
+# Materialized columns written by compute_service_due. The interval rules version and vehicle type they
+# were computed with are stored too, so rows are recomputed after the rules or the catalog change.
+SERVICE_DUE_COLUMNS = ('next_oil_due_km', 'next_oil_due_date', 'next_tire_due_km', 'next_tire_due_date',
+                       'due_rules_version', 'due_vehicle_type')
+# Rows computed under other rules or another catalog fuel type, parameterized by the rules version
+STALE_DUE_CONDITION = """(c.due_rules_version IS NULL OR c.due_rules_version <> %s
+                          OR c.due_vehicle_type <> COALESCE(cm.fuel_type, 'gasoline'))"""
+DUE_CHECK_INTERVAL = 60  # Seconds a company's due columns are trusted before looking for stale rows again
+
+SELECT_SERVICE_DUE_INPUTS = """
+    SELECT c.id, c.company_id, c.mileage, c.gas_type, c.oil_type, c.last_oil_change_km, c.last_oil_change_date,
+           c.last_tire_change_km, c.last_tire_change_date, c.tire_brand, cm.fuel_type
+    FROM cars c
+    LEFT JOIN car_models cm ON c.car_model_id = cm.id
+    WHERE {conditions}
+    ORDER BY c.id
+    LIMIT %s
+"""
+UPDATE_SERVICE_DUE = f"""
+    UPDATE cars SET {', '.join(f'{column} = %s' for column in SERVICE_DUE_COLUMNS)}
+    WHERE id = %s
+"""
+
+# company_id (None for the whole table) -> (rules version, catalog fingerprint, checked at)
+_due_checked = {}
+
+
+# Car columns the estimators read; a snapshot is only reused while they are unchanged
+ESTIMATOR_INPUTS = ('mileage', 'gas_type', 'oil_type', 'last_oil_change_km', 'last_oil_change_date',
+                    'last_tire_change_km', 'last_tire_change_date', 'tire_brand', 'fuel_type')
+
+# Precomputed statuses from the background fleet scan (see app/scanner.py)
+SNAPSHOT_COLUMNS = """s.evaluated_on AS snapshot_evaluated_on, s.inputs_key AS snapshot_inputs_key,
+       s.rules_version AS snapshot_rules_version,
+       s.maintenance_severity, s.maintenance_km_remaining, s.maintenance_months_remaining, s.maintenance_kind,
+       s.tire_severity, s.tire_km_remaining, s.tire_months_remaining, s.tire_kind"""
+
+
+def determine_vehicle_type(car_model_info):
+    """Determine vehicle type from car model information"""
+    if not car_model_info:
+        return 'gasoline'
+
+    fuel_type = (car_model_info.get('fuel_type') or 'gasoline').lower()
+    return fuel_type
+
+
+def resolve_fuel_type(vehicle_type, gas_type):
+    """Pick the estimator fuel type: the vehicle type for non-gasoline cars, otherwise the octane rating"""
+    if vehicle_type in ('electric', 'diesel', 'hybrid'):
+        return vehicle_type
+    return str(int(gas_type)) if str(gas_type).isdigit() else '95'
+
+
+def encode_cursor(created_at, car_id):
+    """Opaque pagination cursor for the (created_at, id) position of a row"""
+    raw = f"{created_at.isoformat()}|{car_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor, raises ValueError for malformed tokens"""
+    try:
+        created_at, car_id = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(car_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+
+
+def parse_filters(args):
+    """Read the listing filters from request args, dropping empty or unknown values"""
+    status = args.get('status', '').strip().lower()
+    vehicle_type = args.get('vehicle_type', '').strip().lower()
+    return {
+        'status': status if status in FLEET_STATUSES else None,
+        'vehicle_type': vehicle_type if vehicle_type in VEHICLE_TYPES else None,
+        'brand': args.get('brand', '').strip() or None,
+        'search': args.get('q', '').strip().upper() or None
+    }
+
+
+def parse_page_size(value):
+    """Clamp a requested page size to 1..MAX_PAGE_SIZE"""
+    try:
+        return min(max(int(value), 1), MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return PAGE_SIZE
+
+
+def _escape_like(value):
+    """Escape LIKE wildcards in user input"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def filter_conditions(company_id, filters):
+    """WHERE conditions and parameters for a company's active cars with the listing filters applied"""
+    conditions = ["c.company_id = %s", "c.is_active = TRUE"]
+    params = [company_id]
+
+    if filters.get('vehicle_type'):
+        conditions.append("COALESCE(cm.fuel_type, 'gasoline') = %s")
+        params.append(filters['vehicle_type'])
+    if filters.get('brand'):
+        conditions.append("cm.brand = %s")
+        params.append(filters['brand'])
+    if filters.get('status'):
+        today = date.today()
+        conditions.append(SERVICE_DUE_CONDITION if filters['status'] == 'critical'
+                          else f"NOT {SERVICE_DUE_CONDITION}")
+        params.extend([today, today])
+    if filters.get('search'):
+        # Prefix match so the (company_id, plate_number) unique key can be used
+        conditions.append("c.plate_number LIKE %s")
+        params.append(_escape_like(filters['search']) + '%')
+    return conditions, params
+
+
+def select_cars_query(company_id, filters, position, limit):
+    """SQL and parameters for up to `limit` cars after `position`, newest first, with the SQL-side filters applied"""
+    conditions, params = filter_conditions(company_id, filters)
+    if position:
+        created_at, car_id = position
+        conditions.append("(c.created_at < %s OR (c.created_at = %s AND c.id < %s))")
+        params.extend([created_at, created_at, car_id])
+
+    return f"""
+        SELECT c.*, cm.brand, cm.model as model_name, cm.engine_size, cm.fuel_type, {SNAPSHOT_COLUMNS}
+        FROM cars c
+        LEFT JOIN car_models cm ON c.car_model_id = cm.id
+        LEFT JOIN vehicle_status_snapshots s ON s.car_id = c.id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY c.created_at DESC, c.id DESC
+        LIMIT %s
+    """, (*params, limit)
+
+
+def _select_cars(cursor, company_id, filters, position, limit):
+    """Fetch up to `limit` cars after `position`, newest first, with the SQL-side filters applied"""
+    cursor.execute(*select_cars_query(company_id, filters, position, limit))
+    return cursor.fetchall()
+
+
+def evaluate_fleet(cars):
+    """
+    Run the batch estimators over a list of car rows.
+    Returns (vehicle_types, maintenance, tires, critical) where maintenance/tires are the
+    batch result dicts and critical is a boolean array.
+    """
+    started = time.perf_counter()
+    vehicle_types = [determine_vehicle_type(car) for car in cars]
+
+    maintenance = estimate_maintenance_batch(
+        distances=[car['mileage'] - car['last_oil_change_km'] for car in cars],
+        months=months_elapsed([car['last_oil_change_date'] for car in cars]),
+        fuel_types=[resolve_fuel_type(vehicle_type, car['gas_type']) for vehicle_type, car in zip(vehicle_types, cars)],
+        oil_brands=[car['oil_type'] or 'standard' for car in cars],
+        vehicle_types=vehicle_types
+    )
+    tires = estimate_tire_batch(
+        distances=[car['mileage'] - (car['last_tire_change_km'] or 0) for car in cars],
+        months=months_elapsed([car['last_tire_change_date'] for car in cars], missing=MISSING_TIRE_MONTHS),
+        tire_brands=[car['tire_brand'] or 'standard' for car in cars]
+    )
+
+    critical = (maintenance['status'] >= Severity.NOW) | (tires['status'] >= Severity.NOW)
+    observe_estimator(time.perf_counter() - started, len(cars))
+    return vehicle_types, maintenance, tires, critical
+
+
+def car_model_display(car, vehicle_type):
+    """Enhanced car model display"""
+    if car['brand'] and car['model_name']:
+        display = f"{car['brand']} {car['model_name']}"
+        if car['engine_size'] and car['engine_size'] != '0.0L':
+            display += f" ({car['engine_size']})"
+        if vehicle_type == 'electric':
+            display += " ⚡"
+        elif vehicle_type == 'hybrid':
+            display += " 🔋"
+        return display
+    return car['custom_model'] or 'Unknown Model'
+
+
+def estimator_inputs_key(car):
+    """Short digest of a car's estimator inputs, stored with its scan snapshot"""
+    values = '\x1f'.join(str(car[column]) for column in ESTIMATOR_INPUTS)
+    return hashlib.blake2b(values.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _snapshot_is_fresh(car, today, rules_version):
+    """
+    A scan snapshot is usable if it was taken today, with the current rules, from the same
+    estimator inputs. Comparing the inputs rather than updated_at (one-second resolution) also
+    catches edits within the same second and catalog fuel type changes.
+    """
+    return (car.get('snapshot_evaluated_on') == today
+            and car['snapshot_rules_version'] == rules_version
+            and car['snapshot_inputs_key'] == estimator_inputs_key(car))
+
+
+def fleet_statuses(cars):
+    """
+    (vehicle_types, maintenance_statuses, tire_statuses, critical) for car rows. Rows with a
+    fresh scan snapshot reuse it; only the others go through the estimators.
+    """
+    today = date.today()
+    rules_version = get_interval_table().version
+    vehicle_types = [determine_vehicle_type(car) for car in cars]
+    maintenance_statuses = [None] * len(cars)
+    tire_statuses = [None] * len(cars)
+
+    stale = []
+    for i, car in enumerate(cars):
+        if _snapshot_is_fresh(car, today, rules_version):
+            maintenance_statuses[i] = ServiceStatus(car['maintenance_severity'], car['maintenance_km_remaining'],
+                                                    car['maintenance_months_remaining'], car['maintenance_kind'])
+            tire_statuses[i] = ServiceStatus(car['tire_severity'], car['tire_km_remaining'],
+                                             car['tire_months_remaining'], car['tire_kind'])
+        else:
+            stale.append(i)
+
+    if stale:
+        _, maintenance, tires, _ = evaluate_fleet([cars[i] for i in stale])
+        for i, maintenance_status, tire_status in zip(stale, to_service_statuses(maintenance),
+                                                       to_service_statuses(tires)):
+            maintenance_statuses[i] = maintenance_status
+            tire_statuses[i] = tire_status
+
+    critical = [m.is_critical or t.is_critical for m, t in zip(maintenance_statuses, tire_statuses)]
+    return vehicle_types, maintenance_statuses, tire_statuses, critical
+
+
+def evaluate_vehicles(cars):
+    """Build the dashboard rows for a list of car rows"""
+    vehicle_types, maintenance_statuses, tire_statuses, critical = fleet_statuses(cars)
+
+    vehicles = []
+    for car, vehicle_type, is_critical, maintenance_status, tire_status in zip(
+            cars, vehicle_types, critical, maintenance_statuses, tire_statuses):
+        vehicles.append({
+            'id': car['id'],
+            'plate_number': car['plate_number'],
+            'car_model': car_model_display(car, vehicle_type),
+            'brand': car['brand'],
+            'owner_name': car['owner'],
+            'owner_phone': car['tel_no'],
+            'mileage': car['mileage'],
+            'gas_type': car['gas_type'],
+            'oil_type': car['oil_type'],
+            'tire_brand': car['tire_brand'],
+            'vehicle_type': vehicle_type,
+            'status': 'critical' if is_critical else 'good',
+            'maintenance_status': maintenance_status,
+            'tire_status': tire_status,
+            'last_oil_change_km': car['last_oil_change_km'],
+            'last_oil_change_date': car['last_oil_change_date'],
+            'last_tire_change_km': car['last_tire_change_km'],
+            'last_tire_change_date': car['last_tire_change_date'],
+            'created_at': car['created_at'],
+            'updated_at': car['updated_at']
+        })
+    return vehicles
+
+
+def fetch_vehicle_page(cursor, company_id, filters=None, after=None, limit=PAGE_SIZE):
+    """
+    One page of a company's vehicles, newest first, using keyset pagination on (created_at, id).
+    Returns (vehicles, next_cursor); next_cursor is None on the last page.
+    """
+    position = decode_cursor(after) if after else None
+    # Fetch one extra row to find out whether there is a next page
+    cars = _select_cars(cursor, company_id, filters or {}, position, limit + 1)
+
+    next_cursor = None
+    if len(cars) > limit:
+        cars = cars[:limit]
+        next_cursor = encode_cursor(cars[-1]['created_at'], cars[-1]['id'])
+    return evaluate_vehicles(cars), next_cursor
+
+
+def fleet_summary_query(company_id, today):
+    """SQL and parameters of the header counters, counted from the materialized due columns"""
+    return f"""
+        SELECT COUNT(*) AS total_vehicles,
+               SUM({SERVICE_DUE_CONDITION}) AS critical_count,
+               SUM(COALESCE({TIRE_DUE_CONDITION}, FALSE)) AS tire_critical_count
+        FROM cars c
+        WHERE c.company_id = %s AND c.is_active = TRUE
+    """, (today, today, today, company_id)
+
+
+def fetch_fleet_summary(cursor, company_id):
+    """Header counters for the whole fleet, counted in SQL from the materialized due columns"""
+    cursor.execute(*fleet_summary_query(company_id, date.today()))
+    row = cursor.fetchone()
+
+    total_vehicles = int(row['total_vehicles'])
+    critical_count = int(row['critical_count'] or 0)
+    return {
+        'total_vehicles': total_vehicles,
+        'critical_count': critical_count,
+        'good_count': total_vehicles - critical_count,
+        'tire_critical_count': int(row['tire_critical_count'] or 0)
+    }
+
+
+def get_fleet_summary(cursor, company_id):
+    """
+    Cached fetch_fleet_summary. The key includes today's date and the rules version because the
+    counters depend on them, so the day rollover and reloaded rules start from fresh counts and
+    the old entries simply age out.
+    """
+    key = (company_id, date.today(), get_interval_table().version)
+    summary = summary_cache.get(key)
+    if summary is None:
+        summary = fetch_fleet_summary(cursor, company_id)
+        summary_cache.set(key, summary)
+    return summary
+
+
+def invalidate_fleet_summary(company_id):
+    """Drop a company's cached counters after its fleet changed"""
+    summary_cache.invalidate((company_id, date.today(), get_interval_table().version))
+
+
+def compute_service_due(cars):
+    """
+    Materialized due values for car rows: the odometer reading and the first day of the month
+    at which each service becomes due, matching what the estimators report for the same row.
+    Returns a list of SERVICE_DUE_COLUMNS tuples.
+    """
+    vehicle_types, maintenance, tires, _ = evaluate_fleet(cars)
+    version = get_interval_table().version
+
+    oil_due_km = np.array([car['last_oil_change_km'] for car in cars], dtype=np.int64) + maintenance['adjusted_km']
+    oil_due_date = months_after([car['last_oil_change_date'] for car in cars], maintenance['adjusted_months'])
+    tire_due_km = np.array([car['last_tire_change_km'] or 0 for car in cars], dtype=np.int64) + tires['adjusted_km']
+    tire_due_date = months_after([car['last_tire_change_date'] for car in cars], tires['adjusted_months'])
+    # Without a change date the estimator's tire age never grows, so those tires are either always
+    # due by time or never, depending on their interval in the loaded table
+    undated_due = (tires['adjusted_months'] <= MISSING_TIRE_MONTHS).tolist()
+
+    return [
+        (oil_km, oil_date, tire_km, tire_date or (ALWAYS_DUE if always_due else None), version, vehicle_type)
+        for oil_km, oil_date, tire_km, tire_date, always_due, vehicle_type in zip(
+            oil_due_km.tolist(), oil_due_date, tire_due_km.tolist(), tire_due_date, undated_due, vehicle_types)
+    ]
+
+
+def service_due_inputs_query(company_id, stale_only, last_id, limit):
+    """SQL and parameters of the next batch of cars (stale ones only, or all) to recompute the due columns of"""
+    conditions = ["c.id > %s"]
+    params = [last_id]
+    if company_id is not None:
+        conditions.append("c.company_id = %s")
+        params.append(company_id)
+    if stale_only:
+        conditions.append(STALE_DUE_CONDITION)
+        params.append(get_interval_table().version)
+    return SELECT_SERVICE_DUE_INPUTS.format(conditions=' AND '.join(conditions)), (*params, limit)
+
+
+def materialize_service_due(connection, company_id=None, stale_only=True, batch_size=1000):
+    """
+    Recompute the due columns of a company's cars (every company's if company_id is None), one
+    committed batch at a time: only the stale rows, or all of them. Returns how many were updated.
+    """
+    cursor = connection.cursor()
+    last_id = 0
+    updated = 0
+    companies = set()
+    while True:
+        cursor.execute(*service_due_inputs_query(company_id, stale_only, last_id, batch_size))
+        cars = cursor.fetchall()
+        if not cars:
+            break
+        cursor.executemany(UPDATE_SERVICE_DUE, [(*due, car['id'])
+                                                for car, due in zip(cars, compute_service_due(cars))])
+        connection.commit()
+        updated += len(cars)
+        last_id = cars[-1]['id']
+        companies.update(car['company_id'] for car in cars)
+    cursor.close()
+
+    for changed_company in companies:
+        invalidate_fleet_summary(changed_company)
+    return updated
+
+
+def refresh_service_due(connection, company_id=None):
+    """
+    Re-materialize the due columns computed under other interval rules or another catalog fuel
+    type before they are queried. Checked again only when the rules or the catalog changed, or
+    after DUE_CHECK_INTERVAL seconds (other workers may still have written rows with older rules).
+    """
+    cursor = connection.cursor()
+    fingerprint = car_model_catalog.get(cursor).fingerprint
+    cursor.close()
+    version = get_interval_table().version
+    checked = _due_checked.get(company_id)
+    if checked and checked[:2] == (version, fingerprint) and time.monotonic() - checked[2] < DUE_CHECK_INTERVAL:
+        return 0
+
+    updated = materialize_service_due(connection, company_id)
+    _due_checked[company_id] = (version, fingerprint, time.monotonic())
+    return updated
+
+
+def fetch_fleet_brands(cursor, company_id):
+    """Distinct brands in a company's fleet, for the brand filter"""
+    cursor.execute("""
+        SELECT DISTINCT cm.brand
+        FROM cars c
+        JOIN car_models cm ON c.car_model_id = cm.id
+        WHERE c.company_id = %s AND c.is_active = TRUE
+        ORDER BY cm.brand
+    """, (company_id,))
+    return [row['brand'] for row in cursor.fetchall()]
+
+
+def vehicle_to_json(vehicle):
+    """JSON-safe copy of a dashboard row"""
+    data = dict(vehicle)
+    for key in ('maintenance_status', 'tire_status'):
+        status = data[key]
+        data[key] = {**status._asdict(), 'is_critical': status.is_critical, 'message': status.message}
+    for key in ('last_oil_change_date', 'last_tire_change_date', 'created_at', 'updated_at'):
+        if hasattr(data[key], 'isoformat'):
+            data[key] = data[key].isoformat()
+    return data
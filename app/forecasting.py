@@ -0,0 +1,158 @@
+"""
+Stored usage-rate statistics and next-service forecasts (see app/models/forecast.py).
+
+vehicle_usage_stats keeps each vehicle's decayed least-squares sums. Completed services and
+telematics odometer flushes fold their readings in with record_usage(); `flask rebuild-usage`
+recomputes everything from maintenance_history and the current mileage.
+"""
+from datetime import date, datetime
+
+import numpy as np
+
+from .fleet import determine_vehicle_type
+from .models.forecast import (STAT_FIELDS, accumulate_usage_stats, empty_stats, fit_daily_rates,
+                              predict_due_dates, to_days, update_usage_stats)
+
+REBUILD_BATCH_SIZE = 2000
+
+UPSERT_USAGE = f"""
+    REPLACE INTO vehicle_usage_stats (car_id, company_id, {', '.join(STAT_FIELDS)})
+    VALUES (%s, %s, {', '.join(['%s'] * len(STAT_FIELDS))})
+"""
+
+
+def _stats_from_rows(rows, car_ids):
+    """Statistics arrays aligned to car_ids from vehicle_usage_stats rows (missing cars start empty)"""
+    stats = empty_stats(len(car_ids))
+    position = {car_id: i for i, car_id in enumerate(car_ids)}
+    for row in rows:
+        i = position[row['car_id']]
+        for field in STAT_FIELDS:
+            if row[field] is not None:
+                stats[field][i] = row[field]
+    return stats
+
+
+def _stats_rows(car_ids, company_ids, stats):
+    """UPSERT_USAGE parameters for statistics arrays"""
+    columns = [stats[field].tolist() for field in STAT_FIELDS]
+    return [(car_id, company_id, *values) for car_id, company_id, *values in zip(car_ids, company_ids, *columns)]
+
+
+def record_usage(cursor, readings):
+    """
+    Fold odometer readings [(car_id, company_id, odometer_km, date or datetime)] into the stored
+    statistics; the caller commits. A car appearing more than once keeps only its latest reading,
+    and readings for cars that are not the company's are ignored. Returns how many cars were updated.
+    """
+    latest = {}
+    for car_id, company_id, odometer_km, read_at in readings:
+        if not isinstance(read_at, datetime):
+            read_at = datetime.combine(read_at, datetime.min.time())
+        if car_id not in latest or read_at >= latest[car_id][2]:
+            latest[car_id] = (company_id, odometer_km, read_at)
+    if not latest:
+        return 0
+
+    cursor.execute(f"""
+        SELECT c.id AS car_id, c.company_id, {', '.join('u.' + field for field in STAT_FIELDS)}
+        FROM cars c
+        LEFT JOIN vehicle_usage_stats u ON u.car_id = c.id
+        WHERE c.id IN ({', '.join(['%s'] * len(latest))})
+    """, list(latest))
+    rows = [row for row in cursor.fetchall() if row['company_id'] == latest[row['car_id']][0]]
+    if not rows:
+        return 0
+
+    car_ids = [row['car_id'] for row in rows]
+    stats = update_usage_stats(_stats_from_rows(rows, car_ids),
+                               to_days([latest[car_id][2] for car_id in car_ids]),
+                               [latest[car_id][1] for car_id in car_ids])
+    cursor.executemany(UPSERT_USAGE, _stats_rows(car_ids, [row['company_id'] for row in rows], stats))
+    return len(car_ids)
+
+
+def rebuild_usage_stats(connection, batch_size=REBUILD_BATCH_SIZE):
+    """Recompute the statistics of every active car from its service history and current mileage"""
+    cursor = connection.cursor()
+    last_id = 0
+    rebuilt = 0
+    while True:
+        cursor.execute("""
+            SELECT id, company_id, mileage, updated_at FROM cars
+            WHERE id > %s AND is_active = TRUE
+            ORDER BY id
+            LIMIT %s
+        """, (last_id, batch_size))
+        cars = cursor.fetchall()
+        if not cars:
+            break
+        last_id = cars[-1]['id']
+
+        car_ids = [car['id'] for car in cars]
+        position = {car_id: i for i, car_id in enumerate(car_ids)}
+        cursor.execute(f"""
+            SELECT car_id, mileage_at_service, service_date FROM maintenance_history
+            WHERE car_id IN ({', '.join(['%s'] * len(car_ids))})
+        """, car_ids)
+        history = cursor.fetchall()
+
+        # Service history points plus the current mileage as of the car's last update
+        readings = ([(position[row['car_id']], row['mileage_at_service'], row['service_date']) for row in history] +
+                    [(i, car['mileage'], car['updated_at'] or date.today()) for i, car in enumerate(cars)])
+        stats = accumulate_usage_stats([reading[0] for reading in readings],
+                                       to_days([reading[2] for reading in readings]),
+                                       [reading[1] for reading in readings], len(cars))
+
+        cursor.executemany(UPSERT_USAGE, _stats_rows(car_ids, [car['company_id'] for car in cars], stats))
+        connection.commit()
+        rebuilt += len(cars)
+    cursor.close()
+    return rebuilt
+
+
+def fetch_forecasts(cursor, company_id, within_days=None, today=None):
+    """
+    Predicted next maintenance (oil/battery) and tire service date for a company's active cars,
+    soonest first. within_days limits the result to vehicles predicted due in that many days.
+    """
+    today = today or date.today()
+    cursor.execute(f"""
+        SELECT c.id, c.plate_number, c.mileage, c.next_oil_due_km, c.next_oil_due_date,
+               c.next_tire_due_km, c.next_tire_due_date, cm.fuel_type,
+               {', '.join('u.' + field for field in STAT_FIELDS)}, u.car_id
+        FROM cars c
+        LEFT JOIN car_models cm ON c.car_model_id = cm.id
+        LEFT JOIN vehicle_usage_stats u ON u.car_id = c.id
+        WHERE c.company_id = %s AND c.is_active = TRUE
+    """, (company_id,))
+    cars = cursor.fetchall()
+    if not cars:
+        return []
+
+    car_ids = [car['id'] for car in cars]
+    stats = _stats_from_rows([car for car in cars if car['car_id'] is not None], car_ids)
+    rates, fitted = fit_daily_rates(stats)
+    mileage = [car['mileage'] for car in cars]
+    maintenance = predict_due_dates(rates, mileage, [car['next_oil_due_km'] for car in cars],
+                                    [car['next_oil_due_date'] for car in cars], today)
+    tires = predict_due_dates(rates, mileage, [car['next_tire_due_km'] for car in cars],
+                              [car['next_tire_due_date'] for car in cars], today)
+
+    soonest = np.fmin(maintenance, tires)
+    order = np.argsort(soonest, kind='stable')  # NaT sorts last
+    if within_days is not None:
+        order = order[soonest[order] <= np.datetime64(today, 'D') + np.timedelta64(within_days, 'D')]
+
+    def iso(value):
+        return None if np.isnat(value) else str(value)
+
+    return [{
+        'id': cars[i]['id'],
+        'plate_number': cars[i]['plate_number'],
+        'vehicle_type': determine_vehicle_type(cars[i]),
+        'daily_km': round(float(rates[i]), 1),
+        'rate_fitted': bool(fitted[i]),
+        'maintenance_due': iso(maintenance[i]),
+        'tires_due': iso(tires[i])
+    } for i in order.tolist()]
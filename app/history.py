@@ -0,0 +1,162 @@
+"""
+Maintenance history timelines for one vehicle or a whole company. Entries are paged newest
+first by (service_date, id), and the rollups are aggregated in SQL. Both are served by the
+history indexes from migrations 2 and 3 (the rollups index-only), so vehicles with years of
+history never load all their rows into Python.
+"""
+from .fleet import decode_cursor, encode_cursor
+
+HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 100
+
+MAINTENANCE_TYPES = ('oil_change', 'tire_change', 'filter_change', 'brake_service', 'inspection',
+                     'battery_service', 'other')
+
+
+def parse_history_limit(value):
+    """Clamp a requested page size to 1..MAX_HISTORY_PAGE_SIZE"""
+    try:
+        return min(max(int(value), 1), MAX_HISTORY_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return HISTORY_PAGE_SIZE
+
+
+def _scope(company_id, car_id, maintenance_type):
+    conditions = ["h.company_id = %s"]
+    params = [company_id]
+    if car_id is not None:
+        conditions.append("h.car_id = %s")
+        params.append(car_id)
+    if maintenance_type:
+        if maintenance_type not in MAINTENANCE_TYPES:
+            raise ValueError(f"Unknown maintenance type '{maintenance_type}'")
+        conditions.append("h.maintenance_type = %s")
+        params.append(maintenance_type)
+    return conditions, params
+
+
+def history_page_query(company_id, car_id, maintenance_type, position, limit):
+    """
+    SQL and parameters for up to `limit` history entries after `position` (service_date, id),
+    newest first. Raises ValueError for an unknown maintenance type.
+    """
+    conditions, params = _scope(company_id, car_id, maintenance_type)
+    if position:
+        service_date, entry_id = position
+        conditions.append("(h.service_date < %s OR (h.service_date = %s AND h.id < %s))")
+        params.extend([service_date, service_date, entry_id])
+
+    return f"""
+        SELECT h.id, h.car_id, c.plate_number, h.maintenance_type, h.mileage_at_service, h.service_date,
+               h.cost, h.notes, u.full_name AS performed_by_name
+        FROM maintenance_history h
+        JOIN cars c ON c.id = h.car_id
+        LEFT JOIN users u ON u.id = h.performed_by
+        WHERE {' AND '.join(conditions)}
+        ORDER BY h.service_date DESC, h.id DESC
+        LIMIT %s
+    """, (*params, limit)
+
+
+def fetch_history_page(cursor, company_id, car_id=None, maintenance_type=None, after=None, limit=HISTORY_PAGE_SIZE):
+    """
+    One page of history entries, newest first. car_id=None pages through the whole company.
+    Returns (entries, next_cursor); raises ValueError for a malformed cursor or unknown type.
+    """
+    position = None
+    if after:
+        service_date, entry_id = decode_cursor(after)
+        position = (service_date.date(), entry_id)
+
+    cursor.execute(*history_page_query(company_id, car_id, maintenance_type, position, limit + 1))
+    entries = cursor.fetchall()
+
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1]['service_date'], entries[-1]['id'])
+    return entries, next_cursor
+
+
+def history_rollups_query(company_id, car_id):
+    """SQL and parameters of the per-type rollups for one vehicle or the whole company"""
+    conditions, params = _scope(company_id, car_id, None)
+
+    # Average km between services per vehicle is (last - first mileage) / (services - 1);
+    # the outer query combines the vehicles so each interval counts once
+    return f"""
+        SELECT v.maintenance_type,
+               SUM(v.services) AS services,
+               MIN(v.first_date) AS first_service_date,
+               MAX(v.last_date) AS last_service_date,
+               ROUND(SUM(v.max_km - v.min_km) / NULLIF(SUM(v.services - 1), 0)) AS avg_km_between,
+               SUM(v.total_cost) AS total_cost
+        FROM (
+            SELECT h.car_id, h.maintenance_type, COUNT(*) AS services,
+                   MIN(h.service_date) AS first_date, MAX(h.service_date) AS last_date,
+                   MIN(h.mileage_at_service) AS min_km, MAX(h.mileage_at_service) AS max_km,
+                   SUM(h.cost) AS total_cost
+            FROM maintenance_history h
+            WHERE {' AND '.join(conditions)}
+            GROUP BY h.car_id, h.maintenance_type
+        ) v
+        GROUP BY v.maintenance_type
+        ORDER BY services DESC
+    """, params
+
+
+def last_service_query(company_id, car_id):
+    """SQL and parameters of the latest service of one vehicle or the whole company"""
+    conditions, params = _scope(company_id, car_id, None)
+    return f"""
+        SELECT h.maintenance_type, h.service_date, h.mileage_at_service, h.cost
+        FROM maintenance_history h
+        WHERE {' AND '.join(conditions)}
+        ORDER BY h.service_date DESC, h.id DESC
+        LIMIT 1
+    """, params
+
+
+def fetch_history_rollups(cursor, company_id, car_id=None):
+    """
+    Per-type rollups (service count, first/last date, average km between services, total cost)
+    plus the latest service, for one vehicle or the whole company.
+    """
+    cursor.execute(*history_rollups_query(company_id, car_id))
+    by_type = [{
+        'maintenance_type': row['maintenance_type'],
+        'services': int(row['services']),
+        'first_service_date': row['first_service_date'].isoformat(),
+        'last_service_date': row['last_service_date'].isoformat(),
+        'avg_km_between': int(row['avg_km_between']) if row['avg_km_between'] is not None else None,
+        'total_cost': float(row['total_cost'] or 0)
+    } for row in cursor.fetchall()]
+
+    cursor.execute(*last_service_query(company_id, car_id))
+    last = cursor.fetchone()
+
+    return {
+        'total_services': sum(rollup['services'] for rollup in by_type),
+        'by_type': by_type,
+        'last_service': {
+            'maintenance_type': last['maintenance_type'],
+            'service_date': last['service_date'].isoformat(),
+            'mileage': last['mileage_at_service'],
+            'cost': float(last['cost'] or 0)
+        } if last else None
+    }
+
+
+def history_entry_to_json(entry):
+    """JSON-serializable view of a history row"""
+    return {
+        'id': entry['id'],
+        'vehicle_id': entry['car_id'],
+        'plate_number': entry['plate_number'],
+        'maintenance_type': entry['maintenance_type'],
+        'mileage': entry['mileage_at_service'],
+        'service_date': entry['service_date'].isoformat(),
+        'cost': float(entry['cost'] or 0),
+        'notes': entry['notes'],
+        'performed_by': entry['performed_by_name']
+    }
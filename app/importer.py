@@ -0,0 +1,252 @@
+"""
+Bulk vehicle import from CSV or NDJSON. The upload is parsed as a stream and handled in
+chunks: one duplicate-plate query, one executemany INSERT and one commit per chunk, with
+car models resolved from the cached catalog.
+"""
+from datetime import date
+import csv
+import io
+import json
+
+from .catalog import car_model_catalog
+from .fleet import SERVICE_DUE_COLUMNS, compute_service_due
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+REQUIRED_FIELDS = ('plate_number', 'owner_name', 'owner_phone', 'mileage', 'gas_type',
+                   'last_oil_change_km', 'last_oil_change_date')
+
+INSERT_CAR = f"""
+    INSERT INTO cars (company_id, plate_number, car_model_id, custom_model, owner, tel_no, mileage,
+                    production_date, gas_type, oil_type, last_oil_change_km, last_oil_change_date,
+                    last_tire_change_km, last_tire_change_date, tire_brand, created_by,
+                    {', '.join(SERVICE_DUE_COLUMNS)})
+    VALUES ({', '.join(['%s'] * (16 + len(SERVICE_DUE_COLUMNS)))})
+"""
+
+
+def detect_format(filename, requested=None):
+    """Import format from an explicit value or the file extension"""
+    extension = filename.rsplit('.', 1)[1] if filename and '.' in filename else ''
+    fmt = (requested or extension).lower()
+    if fmt in ('jsonl', 'json'):
+        fmt = 'ndjson'
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format '{fmt}', use CSV or NDJSON")
+    return fmt
+
+
+def iter_records(stream, fmt):
+    """
+    Yield (line_number, record) from a binary stream without reading it all into memory.
+    Malformed NDJSON lines are yielded as (line_number, ValueError).
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+            yield line_number, record
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+
+
+def _field(record, name):
+    value = record.get(name)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _int_field(record, name, default=None):
+    value = _field(record, name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a whole number") from None
+
+
+def _date_field(record, name):
+    value = _field(record, name)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format") from None
+
+
+def model_name_index(catalog):
+    """(brand, model, engine_size) -> model id lookup over the catalog, case-insensitive"""
+    index = {}
+    for model_id, model in catalog.by_id.items():
+        brand, name = model['brand'].lower(), model['model'].lower()
+        index.setdefault((brand, name, (model['engine_size'] or '').lower()), model_id)
+        index.setdefault((brand, name, ''), model_id)
+    return index
+
+
+def parse_vehicle(record, catalog, model_names):
+    """Validate an import record the way add_vehicle validates its form; raises ValueError"""
+    missing = [name for name in REQUIRED_FIELDS if _field(record, name) is None]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+
+    car_model_id = _int_field(record, 'car_model_id')
+    if car_model_id is not None and car_model_id not in catalog.by_id:
+        raise ValueError(f"Unknown car_model_id {car_model_id}")
+    if car_model_id is None and _field(record, 'brand') and _field(record, 'model'):
+        key = (_field(record, 'brand').lower(), _field(record, 'model').lower(),
+               (_field(record, 'engine_size') or '').lower())
+        car_model_id = model_names.get(key)
+        if car_model_id is None:
+            raise ValueError(f"Unknown car model {' '.join(filter(None, key))}")
+    custom_model = _field(record, 'custom_model') or ''
+    if car_model_id is None and not custom_model:
+        raise ValueError("Provide car_model_id, brand and model, or custom_model")
+
+    vehicle = {
+        'plate_number': _field(record, 'plate_number').upper(),
+        'car_model_id': car_model_id,
+        'custom_model': custom_model,
+        'owner': _field(record, 'owner_name'),
+        'tel_no': _field(record, 'owner_phone'),
+        'mileage': _int_field(record, 'mileage'),
+        'production_date': _date_field(record, 'production_date') or date.today(),
+        'gas_type': _field(record, 'gas_type'),
+        'oil_type': _field(record, 'oil_type') or 'standard',
+        'last_oil_change_km': _int_field(record, 'last_oil_change_km'),
+        'last_oil_change_date': _date_field(record, 'last_oil_change_date'),
+        'last_tire_change_km': _int_field(record, 'last_tire_change_km', 0),
+        'last_tire_change_date': _date_field(record, 'last_tire_change_date'),
+        'tire_brand': _field(record, 'tire_brand') or 'standard',
+        'fuel_type': catalog.by_id[car_model_id]['fuel_type'] if car_model_id else None
+    }
+
+    if vehicle['last_oil_change_km'] > vehicle['mileage']:
+        raise ValueError("Last service distance cannot be greater than current mileage")
+    if vehicle['last_tire_change_km'] > vehicle['mileage']:
+        raise ValueError("Last tire change distance cannot be greater than current mileage")
+    return vehicle
+
+
+class ImportReport:
+    """Counters and per-row errors of one import run"""
+
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line_number, plate_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'plate_number': plate_number, 'error': message})
+
+    def to_dict(self):
+        return {
+            'processed': self.processed,
+            'imported': self.imported,
+            'failed': self.error_count,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+            'errors_truncated': self.error_count > len(self.errors)
+        }
+
+
+def _existing_plates(cursor, company_id, plates):
+    """Plates of the chunk already taken in the company, with whether the car is active"""
+    placeholders = ', '.join(['%s'] * len(plates))
+    cursor.execute(f"""
+        SELECT plate_number, is_active FROM cars
+        WHERE company_id = %s AND plate_number IN ({placeholders})
+    """, (company_id, *plates))
+    return {row['plate_number'].upper(): bool(row['is_active']) for row in cursor.fetchall()}
+
+
+def _insert_chunk(connection, cursor, company_id, user_id, chunk, report):
+    """Duplicate-check and insert one chunk of (line_number, vehicle) in a single transaction"""
+    existing = _existing_plates(cursor, company_id, [vehicle['plate_number'] for _, vehicle in chunk])
+
+    rows = []
+    seen = set()
+    for line_number, vehicle in chunk:
+        plate_number = vehicle['plate_number']
+        if plate_number in existing:
+            report.add_error(line_number, plate_number,
+                             'Vehicle with this plate number already exists in your fleet' if existing[plate_number]
+                             else 'Plate number belongs to a removed vehicle')
+        elif plate_number in seen:
+            report.add_error(line_number, plate_number, 'Duplicate plate number in the import file')
+        else:
+            seen.add(plate_number)
+            rows.append((line_number, vehicle))
+    if not rows:
+        return
+
+    service_due = compute_service_due([vehicle for _, vehicle in rows])
+    params = [
+        (company_id, vehicle['plate_number'], vehicle['car_model_id'], vehicle['custom_model'], vehicle['owner'],
+         vehicle['tel_no'], vehicle['mileage'], vehicle['production_date'], vehicle['gas_type'], vehicle['oil_type'],
+         vehicle['last_oil_change_km'], vehicle['last_oil_change_date'], vehicle['last_tire_change_km'],
+         vehicle['last_tire_change_date'], vehicle['tire_brand'], user_id, *due)
+        for (_, vehicle), due in zip(rows, service_due)
+    ]
+
+    try:
+        cursor.executemany(INSERT_CAR, params)
+        connection.commit()
+        report.imported += len(rows)
+    except Exception:
+        # Retry row by row so a single bad row (e.g. a plate inserted concurrently) is reported on its own
+        connection.rollback()
+        for (line_number, vehicle), row_params in zip(rows, params):
+            try:
+                cursor.execute(INSERT_CAR, row_params)
+                report.imported += 1
+            except Exception as e:
+                report.add_error(line_number, vehicle['plate_number'], str(e))
+        connection.commit()
+
+
+def import_vehicles(connection, company_id, user_id, stream, fmt, chunk_size=CHUNK_SIZE):
+    """Import vehicles from a CSV/NDJSON stream into a company's fleet, returns an ImportReport"""
+    cursor = connection.cursor()
+    catalog = car_model_catalog.get(cursor)
+    model_names = model_name_index(catalog)
+    report = ImportReport()
+
+    chunk = []
+    for line_number, record in iter_records(stream, fmt):
+        report.processed += 1
+        if isinstance(record, Exception):
+            report.add_error(line_number, None, str(record))
+            continue
+        try:
+            chunk.append((line_number, parse_vehicle(record, catalog, model_names)))
+        except ValueError as e:
+            report.add_error(line_number, _field(record, 'plate_number'), str(e))
+            continue
+
+        if len(chunk) >= chunk_size:
+            _insert_chunk(connection, cursor, company_id, user_id, chunk, report)
+            chunk = []
+
+    if chunk:
+        _insert_chunk(connection, cursor, company_id, user_id, chunk, report)
+    cursor.close()
+    return report
@@ -0,0 +1,238 @@
+"""
+Company logo storage and processing. Logos are stored under a hash of their content
+(content_filename), so identical uploads share one file and a stored file never changes;
+they are served with immutable caching headers. Files no company refers to any more are
+removed by collect_logo_garbage (`flask gc-logos`).
+
+Stored logos are handed to a small background thread pool, which validates the image with
+Pillow and writes fixed-size variants next to it:
+
+    <name>.navbar.webp / <name>.navbar.png   80x80, the 40px navbar logo at 2x
+    <name>.thumb.webp / <name>.thumb.png     200x160, the logo settings preview at 2x
+
+Pages link the variants once they exist (see sources()) and the original until then. A logo
+that is not a readable image is deleted and removed from the companies using it. SVG logos are
+vector images and are served as uploaded.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .cache import identity_cache
+
+logger = logging.getLogger(__name__)
+
+LOGO_VARIANTS = {'navbar': (80, 80), 'thumb': (200, 160)}
+# The PNG is written last, so its presence means the variant is complete
+VARIANT_FORMATS = (('webp', 'WEBP', {'quality': 85, 'method': 6}), ('png', 'PNG', {'optimize': True}))
+MAX_LOGO_PIXELS = 25000000  # Larger images are rejected as possible decompression bombs
+VECTOR_EXTENSIONS = {'svg'}
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{32}\.')
+GC_GRACE_SECONDS = 3600  # Unreferenced files younger than this may belong to an upload in progress
+
+
+def content_filename(data, original_filename):
+    """Storage name of an uploaded logo: a hash of its content with the original extension"""
+    extension = original_filename.rsplit('.', 1)[-1].lower()
+    return f"{hashlib.sha256(data).hexdigest()[:32]}.{extension}"
+
+
+def is_content_addressed(filename):
+    """Logos (and their variants) stored under a content hash never change"""
+    return bool(CONTENT_ADDRESSED.match(filename))
+
+
+def _write_atomically(path, write):
+    """Write a file under a temporary name first, so readers never see it half written"""
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(temporary)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def store_logo(folder, logo_filename, data):
+    """Write a logo unless a file with the same content exists; returns whether it was written"""
+    path = os.path.join(folder, logo_filename)
+    if os.path.exists(path):
+        # Refresh the shared file's age so a concurrent garbage collection leaves it alone
+        os.utime(path)
+        return False
+    os.makedirs(folder, exist_ok=True)
+
+    def write(temporary):
+        with open(temporary, 'wb') as f:
+            f.write(data)
+
+    _write_atomically(path, write)
+    return True
+
+
+def variant_filename(logo_filename, variant, extension):
+    """File name of one pre-sized variant of an uploaded logo"""
+    return f"{logo_filename.rsplit('.', 1)[0]}.{variant}.{extension}"
+
+
+def is_vector(logo_filename):
+    """SVG logos are not rasterized"""
+    return logo_filename.rsplit('.', 1)[-1].lower() in VECTOR_EXTENSIONS
+
+
+def render_variants(path):
+    """Validate the image at path and write its variants next to it; raises ValueError if it is not usable"""
+    folder, logo_filename = os.path.split(path)
+    try:
+        with Image.open(path) as image:
+            if image.width * image.height > MAX_LOGO_PIXELS:
+                raise ValueError(f"{image.width}x{image.height} pixels is too large")
+            image.load()
+            image = ImageOps.exif_transpose(image).convert('RGBA')
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Not a valid image: {e}") from e
+
+    for variant, size in LOGO_VARIANTS.items():
+        # Fit the logo inside a transparent canvas of exactly the variant size
+        fitted = ImageOps.contain(image, size, Image.Resampling.LANCZOS)
+        canvas = Image.new('RGBA', size, (0, 0, 0, 0))
+        canvas.paste(fitted, ((size[0] - fitted.width) // 2, (size[1] - fitted.height) // 2))
+        for extension, image_format, options in VARIANT_FORMATS:
+            _write_atomically(os.path.join(folder, variant_filename(logo_filename, variant, extension)),
+                              lambda temporary: canvas.save(temporary, image_format, **options))
+
+
+class LogoProcessor:
+    """Background thread pool turning uploaded logos into pre-sized variants"""
+
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.app = None
+        self.db = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._ready = set()  # Logo file names whose variants are known to exist
+        self.processed = 0
+        self.rejected = 0
+
+    def configure(self, app=None, db=None, workers=None):
+        """Set the app and database used to unset rejected logos; a new worker count applies to the next upload"""
+        if app is not None:
+            self.app = app
+        if db is not None:
+            self.db = db
+        if workers is not None:
+            with self._lock:
+                self.workers = workers
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+
+    def submit(self, path):
+        """Process a stored logo in the background; returns the Future (True once the variants exist)"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='logo')
+            return self._executor.submit(self.process, path)
+
+    def process(self, path):
+        """Validate a logo and write its variants, rejecting it if it is not a readable image"""
+        logo_filename = os.path.basename(path)
+        if is_vector(logo_filename):
+            return False
+        try:
+            render_variants(path)
+        except ValueError as e:
+            logger.warning("Rejected logo %s: %s", logo_filename, e)
+            self._reject(path)
+            return False
+        except Exception:
+            logger.exception("Processing logo %s failed", logo_filename)
+            return False
+        with self._lock:
+            self._ready.add(logo_filename)
+            self.processed += 1
+        return True
+
+    def _reject(self, path):
+        """Delete an unusable logo and unset it for the companies using it"""
+        logo_filename = os.path.basename(path)
+        with self._lock:
+            self.rejected += 1
+            self._ready.discard(logo_filename)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        if self.app is None:
+            return
+        try:
+            with self.app.app_context():
+                cursor = self.db.connection.cursor()
+                cursor.execute("UPDATE companies SET logo_filename = NULL WHERE logo_filename = %s", (logo_filename,))
+                self.db.connection.commit()
+                cursor.close()
+        except Exception:
+            logger.exception("Could not unset rejected logo %s", logo_filename)
+        identity_cache.invalidate_where(lambda user_id, identity: identity['logo_filename'] == logo_filename)
+
+    def is_ready(self, folder, logo_filename):
+        """Whether the variants of a logo have been written (by any worker)"""
+        if logo_filename in self._ready:
+            return True
+        last_variant = list(LOGO_VARIANTS)[-1]
+        if os.path.exists(os.path.join(folder, variant_filename(logo_filename, last_variant, 'png'))):
+            with self._lock:
+                self._ready.add(logo_filename)
+            return True
+        return False
+
+    def sources(self, folder, logo_filename, variant):
+        """
+        {'webp': ..., 'fallback': ...} file names to show a logo at a variant's size. Until the
+        variants exist (or for SVG logos) there is no WebP and the fallback is the original.
+        """
+        if not is_vector(logo_filename) and self.is_ready(folder, logo_filename):
+            return {'webp': variant_filename(logo_filename, variant, 'webp'),
+                    'fallback': variant_filename(logo_filename, variant, 'png')}
+        return {'webp': None, 'fallback': logo_filename}
+
+    def stats(self):
+        """Processed/rejected counters for monitoring"""
+        return {'workers': self.workers, 'processed': self.processed, 'rejected': self.rejected}
+
+
+def collect_logo_garbage(folder, referenced, grace_seconds=GC_GRACE_SECONDS, dry_run=False):
+    """
+    Delete the logos (with their variants) and leftover temporary files in folder that are not in
+    `referenced` and were not written or reused within grace_seconds. Returns the removed names.
+    """
+    referenced = set(referenced)
+    referenced_stems = {name.rsplit('.', 1)[0] for name in referenced}
+    cutoff = time.time() - grace_seconds
+    removed = []
+    for entry in os.scandir(folder) if os.path.isdir(folder) else ():
+        if not entry.is_file():
+            continue
+        parts = entry.name.split('.')
+        if entry.name.endswith('.tmp'):
+            in_use = False
+        elif len(parts) >= 3 and parts[-2] in LOGO_VARIANTS:
+            in_use = '.'.join(parts[:-2]) in referenced_stems
+        else:
+            in_use = entry.name in referenced
+        if in_use or entry.stat().st_mtime > cutoff:
+            continue
+        if not dry_run:
+            os.remove(entry.path)
+        removed.append(entry.name)
+    return sorted(removed)
+
+
+logo_processor = LogoProcessor()
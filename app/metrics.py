@@ -0,0 +1,258 @@
+"""
+Request, SQL, estimator and template timings, exposed at /metrics in the Prometheus text format.
+
+init_metrics(app) (called from create_app) times every request per endpoint. It also counts
+the queries and SQL time of each request through a cursor wrapper on the pooled connection,
+and times template rendering through Flask's template signals. Estimator time is recorded by
+fleet.evaluate_fleet. Metrics are kept per worker process; scrape every worker (or run one) to
+see them all. /metrics is only served when METRICS_TOKEN is set, and requires it as a bearer token.
+"""
+from bisect import bisect_left
+import hmac
+import logging
+import threading
+import time
+
+from flask import Response, current_app, g, request, before_render_template, template_rendered
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Thread-safe histogram with a fixed set of label names"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._bounds = [f'le="{bound}"' for bound in self.buckets] + ['le="+Inf"']
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        with self._lock:
+            snapshot = [(labelvalues, list(series)) for labelvalues, series in self._series.items()]
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, series in sorted(snapshot):
+            cumulative = 0
+            for bound, count in zip(self._bounds, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Thread-safe monotonically increasing counter with a fixed set of label names"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        lines = [f"# HELP {self.name}_total {self.documentation}", f"# TYPE {self.name}_total counter"]
+        lines.extend(f"{self.name}_total{_labels(self.labelnames, labelvalues)} {_number(value)}"
+                     for labelvalues, value in snapshot)
+        return lines
+
+
+class CallbackCollector:
+    """Values read at scrape time from a callback returning {name: (type, documentation, value)}"""
+
+    def __init__(self, collect):
+        self.collect = collect
+
+    def render(self):
+        lines = []
+        for name, (kind, documentation, value) in self.collect().items():
+            lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {_number(value)}"])
+        return lines
+
+
+REQUEST_SECONDS = Histogram('carminder_request_duration_seconds', 'Request latency by endpoint',
+                            ('endpoint', 'method', 'status'))
+REQUEST_QUERIES = Histogram('carminder_request_sql_queries', 'SQL statements executed per request',
+                            ('endpoint',), QUERY_COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram('carminder_request_sql_seconds', 'Time spent in SQL per request', ('endpoint',))
+ESTIMATOR_SECONDS = Histogram('carminder_estimator_seconds', 'Fleet estimator evaluation time per call')
+ESTIMATOR_VEHICLES = Counter('carminder_estimator_vehicles', 'Vehicles evaluated by the fleet estimators')
+TEMPLATE_SECONDS = Histogram('carminder_template_render_seconds', 'Jinja template render time', ('template',))
+
+METRICS = [REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_SQL_SECONDS, ESTIMATOR_SECONDS, ESTIMATOR_VEHICLES,
+           TEMPLATE_SECONDS]
+
+
+def observe_estimator(seconds, vehicles):
+    """Record one fleet estimator evaluation"""
+    ESTIMATOR_SECONDS.observe(seconds)
+    ESTIMATOR_VEHICLES.inc(vehicles)
+
+
+class InstrumentedCursor:
+    """Cursor proxy adding each statement's duration to the current request's SQL totals"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if 'sql_queries' in g:
+                g.sql_queries += 1
+                g.sql_seconds += time.perf_counter() - started
+
+    def execute(self, *args):
+        return self._timed(self._cursor.execute, *args)
+
+    def executemany(self, *args):
+        return self._timed(self._cursor.executemany, *args)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._cursor.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Connection proxy whose cursors are InstrumentedCursors"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, *args):
+        return InstrumentedCursor(self._connection.cursor(*args))
+
+    def __enter__(self):
+        self._connection.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._connection.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def render_metrics(collectors=()):
+    """All metrics in the text exposition format"""
+    lines = []
+    for metric in (*METRICS, *collectors):
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app, db):
+    """Register the request hooks, template signal handlers and the /metrics endpoint"""
+    db.wrap_connection = InstrumentedConnection
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_seconds = 0.0
+
+    @app.after_request
+    def record_request(response):
+        if 'request_started' in g:
+            endpoint = request.endpoint or 'unmatched'
+            REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint, request.method,
+                                    str(response.status_code))
+            REQUEST_QUERIES.observe(g.sql_queries, endpoint)
+            REQUEST_SQL_SECONDS.observe(g.sql_seconds, endpoint)
+        return response
+
+    def template_started(sender, template, context, **extra):
+        g.setdefault('template_started', []).append(time.perf_counter())
+
+    def template_finished(sender, template, context, **extra):
+        if g.get('template_started'):
+            TEMPLATE_SECONDS.observe(time.perf_counter() - g.template_started.pop(), template.name or 'string')
+
+    # The handlers are local functions, so the signals must hold strong references to them
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
+
+    from .cache import identity_cache, row_fragment_cache, summary_cache
+
+    def collect_runtime():
+        pool = db.stats()
+        values = {
+            'carminder_db_pool_in_use': ('gauge', 'Pooled connections checked out', pool.get('in_use', 0)),
+            'carminder_db_pool_idle': ('gauge', 'Pooled connections idle', pool.get('idle', 0)),
+            'carminder_db_pool_waits_total': ('counter', 'Checkouts that waited for a connection', pool.get('waits', 0))
+        }
+        for name, cache in (('summary', summary_cache), ('identity', identity_cache)):
+            values[f'carminder_{name}_cache_hits_total'] = ('counter', f'{name} cache hits', cache.hits)
+            values[f'carminder_{name}_cache_misses_total'] = ('counter', f'{name} cache misses', cache.misses)
+            values[f'carminder_{name}_cache_entries'] = ('gauge', f'{name} cache entries', len(cache))
+        values['carminder_row_fragment_cache_hits_total'] = ('counter', 'Dashboard rows served from cache',
+                                                            row_fragment_cache.hits)
+        values['carminder_row_fragment_cache_misses_total'] = ('counter', 'Dashboard rows rendered',
+                                                              row_fragment_cache.misses)
+        values['carminder_row_fragment_cache_bytes'] = ('gauge', 'Memory held by cached dashboard rows',
+                                                       row_fragment_cache.bytes)
+        return values
+
+    collectors = [CallbackCollector(collect_runtime)]
+
+    # Traffic and pool internals are not for the public: without a token there is no endpoint
+    if not app.config.get('METRICS_TOKEN'):
+        logger.warning("METRICS_TOKEN is not set; metrics are collected but /metrics is not served")
+        return
+
+    def metrics():
+        token = current_app.config['METRICS_TOKEN']
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render_metrics(collectors), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
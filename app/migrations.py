@@ -0,0 +1,302 @@
+"""
+Versioned schema migrations. schema.sql creates the baseline database; every later change is a
+Migration here, applied in version order by `flask migrate-db` and recorded in schema_migrations.
+
+Each step checks information_schema before running, so a migration interrupted halfway (MySQL
+DDL commits implicitly) can simply be run again. `flask check-query-plans` EXPLAINs the hot
+queries and fails if one of them scans a whole table or index, or needs a filesort or a
+temporary table.
+"""
+from collections import namedtuple
+from datetime import date, datetime
+import logging
+
+from .fleet import PAGE_SIZE, fleet_summary_query, select_cars_query, service_due_inputs_query
+from .history import HISTORY_PAGE_SIZE, history_page_query, history_rollups_query, last_service_query
+from .reminders import (ENQUEUE_BATCH_SIZE, MAX_ATTEMPTS, REMINDER_BATCH_SIZE, SELECT_CLAIMABLE,
+                        enqueue_query)
+from .routes import SELECT_CURRENT_USER, SELECT_LOGIN_USER
+from .scanner import DELETE_INACTIVE_SNAPSHOTS, MAX_CAR_ID, SCAN_BATCH_SIZE, SELECT_SCAN_BATCH
+
+logger = logging.getLogger(__name__)
+
+Migration = namedtuple('Migration', 'version description steps')
+Step = namedtuple('Step', 'description exists_sql exists_params sql')
+
+MIGRATION_LOCK = 'carminder_schema_migrations'
+
+CREATE_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        description VARCHAR(200) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def add_column(table, column, definition):
+    """Step adding a column unless it exists"""
+    return Step(f"add column {table}.{column}",
+                """SELECT 1 FROM information_schema.columns
+                   WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s""",
+                (table, column),
+                f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def add_index(table, name, columns):
+    """Step creating an index unless one with that name exists"""
+    return Step(f"add index {table}.{name}",
+                """SELECT 1 FROM information_schema.statistics
+                   WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s""",
+                (table, name),
+                f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+
+
+def modify_column(table, column, definition, marker):
+    """Step redefining a column unless its type already contains `marker` (e.g. a new ENUM value)"""
+    return Step(f"modify column {table}.{column}",
+                """SELECT 1 FROM information_schema.columns
+                   WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+                     AND column_type LIKE %s""",
+                (table, column, f"%{marker}%"),
+                f"ALTER TABLE {table} MODIFY COLUMN {column} {definition}")
+
+
+def create_table(table, body):
+    """Step creating a table unless it exists"""
+    return Step(f"create table {table}", None, None, f"CREATE TABLE IF NOT EXISTS {table} ({body})")
+
+
+MIGRATIONS = [
+    # Everything schema.sql appends after the original tables, for databases created before it
+    Migration(1, 'Materialized service due columns, status snapshots and reminders', [
+        add_column('cars', 'next_oil_due_km', 'INT NULL AFTER tire_brand'),
+        add_column('cars', 'next_oil_due_date', 'DATE NULL AFTER next_oil_due_km'),
+        add_column('cars', 'next_tire_due_km', 'INT NULL AFTER next_oil_due_date'),
+        add_column('cars', 'next_tire_due_date', 'DATE NULL AFTER next_tire_due_km'),
+        add_index('cars', 'idx_cars_service_due', ['company_id', 'is_active', 'next_oil_due_date',
+                                                   'next_tire_due_date', 'next_oil_due_km',
+                                                   'next_tire_due_km', 'mileage']),
+        create_table('vehicle_status_snapshots', """
+            car_id INT PRIMARY KEY,
+            company_id INT NOT NULL,
+            evaluated_on DATE NOT NULL,
+            car_updated_at TIMESTAMP NULL,
+            rules_version CHAR(12) NOT NULL,
+            vehicle_type VARCHAR(20) NOT NULL,
+            maintenance_severity TINYINT NOT NULL,
+            maintenance_km_remaining INT NOT NULL,
+            maintenance_months_remaining INT NOT NULL,
+            maintenance_kind TINYINT NOT NULL,
+            tire_severity TINYINT NOT NULL,
+            tire_km_remaining INT NOT NULL,
+            tire_months_remaining INT NOT NULL,
+            tire_kind TINYINT NOT NULL,
+            is_critical BOOLEAN NOT NULL,
+            scanned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (car_id) REFERENCES cars(id) ON DELETE CASCADE,
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE,
+            INDEX idx_snapshots_company (company_id, is_critical)
+        """),
+        create_table('service_reminders', """
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            car_id INT NOT NULL,
+            company_id INT NOT NULL,
+            service_type ENUM('oil_change', 'tire_change') NOT NULL,
+            due_km INT NOT NULL,
+            due_date DATE NOT NULL,
+            status ENUM('pending', 'sent', 'failed') DEFAULT 'pending',
+            attempts INT DEFAULT 0,
+            last_error VARCHAR(255) NULL,
+            sent_at TIMESTAMP NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (car_id) REFERENCES cars(id) ON DELETE CASCADE,
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE,
+            UNIQUE KEY unique_reminder_per_due (car_id, service_type, due_km, due_date),
+            INDEX idx_reminders_status (status, id)
+        """)
+    ]),
+    Migration(2, 'Indexes for the dashboard listing and vehicle history', [
+        # Newest-first listing and keyset pagination; InnoDB appends the primary key, so this also
+        # orders by (created_at, id) without a filesort
+        add_index('cars', 'idx_cars_company_listing', ['company_id', 'is_active', 'created_at']),
+        # A vehicle's service history in date order
+        add_index('maintenance_history', 'idx_history_car_date', ['car_id', 'service_date'])
+    ]),
+    Migration(3, 'Indexes for the company history timeline and history rollups', [
+        # Company-wide timeline paged by (service_date, id)
+        add_index('maintenance_history', 'idx_history_company_date', ['company_id', 'service_date']),
+        # Covers history.fetch_history_rollups for a vehicle or a company, so it reads no table rows
+        add_index('maintenance_history', 'idx_history_rollup', ['company_id', 'car_id', 'maintenance_type',
+                                                               'service_date', 'mileage_at_service', 'cost'])
+    ]),
+    Migration(4, 'Usage-rate statistics for next-service forecasts', [
+        # Decayed least-squares sums per car, see app/models/forecast.py (`flask rebuild-usage` fills it)
+        create_table('vehicle_usage_stats', """
+            car_id INT PRIMARY KEY,
+            company_id INT NOT NULL,
+            points INT NOT NULL,
+            weight DOUBLE NOT NULL,
+            sum_t DOUBLE NOT NULL,
+            sum_x DOUBLE NOT NULL,
+            sum_tt DOUBLE NOT NULL,
+            sum_tx DOUBLE NOT NULL,
+            last_t DOUBLE NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (car_id) REFERENCES cars(id) ON DELETE CASCADE,
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+        """)
+    ]),
+    Migration(5, 'Change timestamp on car models for the catalog cache', [
+        # Part of the catalog fingerprint (catalog.CarModelCatalog), so edits to existing models are
+        # noticed; microseconds tell apart edits within the same second
+        add_column('car_models', 'updated_at',
+                   'TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6) AFTER created_at')
+    ]),
+    Migration(6, 'Estimator inputs digest on status snapshots', [
+        # fleet.estimator_inputs_key; snapshots without one are re-evaluated until the next scan
+        add_column('vehicle_status_snapshots', 'inputs_key', 'CHAR(16) NULL AFTER car_updated_at')
+    ]),
+    Migration(7, 'Delivery claims on service reminders', [
+        # reminders.deliver_reminders claims rows before sending, so overlapping runs skip them
+        modify_column('service_reminders', 'status',
+                      "ENUM('pending', 'sending', 'sent', 'failed') DEFAULT 'pending'", "'sending'"),
+        add_column('service_reminders', 'claim_token', 'CHAR(32) NULL AFTER status'),
+        add_column('service_reminders', 'claimed_at', 'TIMESTAMP NULL AFTER claim_token'),
+        add_index('service_reminders', 'idx_reminders_claim', ['claim_token']),
+        # release_expired_claims
+        add_index('service_reminders', 'idx_reminders_claimed', ['status', 'claimed_at'])
+    ]),
+    Migration(8, 'Interval rules version of the materialized service due columns', [
+        # fleet.refresh_service_due recomputes rows written under other rules or another fuel type;
+        # existing rows have neither and are recomputed on first use
+        add_column('cars', 'due_rules_version', 'CHAR(12) NULL AFTER next_tire_due_date'),
+        add_column('cars', 'due_vehicle_type', 'VARCHAR(20) NULL AFTER due_rules_version')
+    ]),
+    Migration(9, 'Index for the per-company stale due check', [
+        # fleet.service_due_inputs_query pages through one company's cars in id order without a filesort
+        add_index('cars', 'idx_cars_company_id', ['company_id', 'id'])
+    ]),
+    Migration(10, 'Per-vehicle origin of the usage-rate sums', [
+        # models.forecast sums days since this origin; 0 (EPOCH) is exact for the existing rows,
+        # `flask rebuild-usage` moves them to their first reading
+        add_column('vehicle_usage_stats', 'origin_t', 'DOUBLE NOT NULL DEFAULT 0 AFTER last_t')
+    ])
+]
+
+
+def applied_versions(cursor):
+    """Versions recorded in schema_migrations (created on first use)"""
+    cursor.execute(CREATE_MIGRATIONS_TABLE)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row['version'] for row in cursor.fetchall()}
+
+
+def pending_migrations(connection):
+    """Migrations not yet recorded in schema_migrations, in version order"""
+    cursor = connection.cursor()
+    applied = applied_versions(cursor)
+    cursor.close()
+    return [migration for migration in sorted(MIGRATIONS, key=lambda m: m.version)
+            if migration.version not in applied]
+
+
+def run_step(cursor, step):
+    """Run a step unless its object already exists; returns True if it ran"""
+    if step.exists_sql:
+        cursor.execute(step.exists_sql, step.exists_params)
+        if cursor.fetchone():
+            return False
+    cursor.execute(step.sql)
+    return True
+
+
+def migrate(connection, target=None):
+    """
+    Apply pending migrations up to `target` (all by default) under a server-side lock, so two
+    deploys cannot migrate at once. Returns the applied migrations.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, 60) AS acquired", (MIGRATION_LOCK,))
+    if not cursor.fetchone()['acquired']:
+        cursor.close()
+        raise RuntimeError("Another process is running migrations")
+
+    applied = []
+    try:
+        for migration in pending_migrations(connection):
+            if target is not None and migration.version > target:
+                break
+            for step in migration.steps:
+                if run_step(cursor, step):
+                    logger.info("Migration %d: %s", migration.version, step.description)
+            cursor.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                           (migration.version, migration.description))
+            connection.commit()
+            applied.append(migration)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+        cursor.fetchall()
+        cursor.close()
+    return applied
+
+
+# EXPLAIN access types that read every row of a table or index
+FULL_SCAN_TYPES = {'ALL': 'full scan', 'index': 'full index scan'}
+# EXPLAIN Extra notes for sorting or grouping outside an index
+SLOW_PLAN_MARKERS = ('Using filesort', 'Using temporary')
+
+# The queries behind login, the dashboard and the background jobs with representative parameters,
+# built from the same SQL constants and builders the code runs
+HOT_QUERIES = {
+    'login (routes.login)': (SELECT_LOGIN_USER, ('demo@carminder.com', 'demo@carminder.com')),
+    'identity (routes.get_current_user)': (SELECT_CURRENT_USER, (1,)),
+    'dashboard page (fleet._select_cars)': select_cars_query(1, {}, None, PAGE_SIZE + 1),
+    'dashboard next page (fleet._select_cars)': select_cars_query(1, {}, (datetime(2030, 1, 1), MAX_CAR_ID),
+                                                                  PAGE_SIZE + 1),
+    'due vehicles filter (fleet.filter_conditions)': select_cars_query(1, {'status': 'critical'}, None,
+                                                                       PAGE_SIZE + 1),
+    'plate search (fleet.filter_conditions)': select_cars_query(1, {'search': '10'}, None, PAGE_SIZE + 1),
+    'fleet summary (fleet.fetch_fleet_summary)': fleet_summary_query(1, date(2030, 1, 1)),
+    'stale due columns (fleet.materialize_service_due)': service_due_inputs_query(1, True, 0, 1000),
+    'vehicle history (history.fetch_history_page)': history_page_query(1, 1, None, None, HISTORY_PAGE_SIZE + 1),
+    'company history (history.fetch_history_page)': history_page_query(1, None, None, (date(2030, 1, 1), MAX_CAR_ID),
+                                                                       HISTORY_PAGE_SIZE + 1),
+    'history rollups (history.fetch_history_rollups)': history_rollups_query(1, 1),
+    'last service (history.fetch_history_rollups)': last_service_query(1, 1),
+    'fleet scan batch (scanner._car_batches)': (SELECT_SCAN_BATCH, (0, SCAN_BATCH_SIZE)),
+    'removed car snapshots (scanner._car_batches)': (DELETE_INACTIVE_SNAPSHOTS,
+                                                     (0, SCAN_BATCH_SIZE, 0, SCAN_BATCH_SIZE)),
+    'enqueue oil reminders (reminders.enqueue_due_reminders)': enqueue_query('oil_change', date(2030, 1, 1),
+                                                                             0, ENQUEUE_BATCH_SIZE),
+    'enqueue tire reminders (reminders.enqueue_due_reminders)': enqueue_query('tire_change', date(2030, 1, 1),
+                                                                              0, ENQUEUE_BATCH_SIZE),
+    'claimable reminders (reminders._claimed_batches)': (SELECT_CLAIMABLE, (MAX_ATTEMPTS, 0, REMINDER_BATCH_SIZE))
+}
+
+
+def check_query_plans(connection, queries=None):
+    """
+    EXPLAIN every hot query; returns {name: [problems]} for the ones that read a whole table or
+    index (access type ALL or index) or sort or group through a filesort or temporary table.
+    An empty result means every plan reads index ranges in index order.
+    """
+    cursor = connection.cursor()
+    problems = {}
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        cursor.execute("EXPLAIN " + sql, params)
+        issues = []
+        for row in cursor.fetchall():
+            # Derived tables (<derivedN>, <subqueryN>) hold the already aggregated rows of an inner
+            # query, and the target table of an INSERT ... SELECT is written, not read
+            if str(row['table']).startswith('<') or row['select_type'] == 'INSERT':
+                continue
+            if row['type'] in FULL_SCAN_TYPES:
+                issues.append(f"{FULL_SCAN_TYPES[row['type']]} of {row['table']} (~{row['rows']} rows, "
+                             f"possible keys: {row['possible_keys'] or 'none'})")
+            issues.extend(f"{marker.lower()} on {row['table']}" for marker in SLOW_PLAN_MARKERS
+                         if marker in (row.get('Extra') or ''))
+        if issues:
+            problems[name] = issues
+    cursor.close()
+    return problems
@@ -0,0 +1,139 @@
+"""
+Usage-rate forecasting. Each vehicle's daily km rate is the slope of a weighted least-squares
+line through its odometer readings (km over days), where older readings count less
+(weight halves every HALF_LIFE_DAYS). The fit is kept as per-vehicle sufficient statistics,
+so a new reading updates them in O(1) instead of refitting the history, and everything
+here works on whole-fleet arrays at once. The sums are over days since the vehicle's first
+reading (origin_t), which keeps them small enough to fit without losing precision.
+"""
+from datetime import date, datetime
+
+import numpy as np
+
+EPOCH = np.datetime64('2000-01-01T00:00:00', 's')
+HALF_LIFE_DAYS = 180.0
+DEFAULT_DAILY_KM = 40.0  # ~15,000 km a year, used until a vehicle has enough readings
+MAX_DAILY_KM = 2000.0
+MIN_SPREAD_DAYS = 7.0  # weighted std of the reading days needed before a fit is trusted
+
+STAT_FIELDS = ('points', 'weight', 'sum_t', 'sum_x', 'sum_tt', 'sum_tx', 'last_t', 'origin_t')
+
+
+def to_days(values):
+    """Days since EPOCH (float) for a sequence of dates/datetimes"""
+    stamps = np.array([np.datetime64(value if isinstance(value, datetime) else
+                                     datetime.combine(value, datetime.min.time()), 's') for value in values],
+                      dtype='datetime64[s]')
+    return (stamps - EPOCH).astype(np.float64) / 86400.0
+
+
+def empty_stats(count):
+    """Statistics for `count` vehicles without readings"""
+    stats = {field: np.zeros(count) for field in STAT_FIELDS}
+    stats['last_t'] = np.full(count, np.nan)
+    return stats
+
+
+def update_usage_stats(stats, t, x, half_life=HALF_LIFE_DAYS):
+    """
+    Fold one reading per vehicle (day t, odometer x) into its statistics; returns new arrays.
+    The existing sums are decayed to the newer of the two days, so the result equals a full
+    refit with weights relative to each vehicle's latest reading.
+    """
+    t = np.asarray(t, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    # A vehicle's first reading sets the origin its sums are relative to
+    origin_t = np.where(stats['points'] > 0, stats['origin_t'], t)
+    last_t = stats['last_t']
+    gap = np.where(np.isnan(last_t), 0.0, t - last_t)
+    decay = np.where(gap > 0, np.exp2(-gap / half_life), 1.0)
+    weight = np.where(gap < 0, np.exp2(gap / half_life), 1.0)
+    days = t - origin_t
+    return {
+        'points': stats['points'] + 1,
+        'weight': stats['weight'] * decay + weight,
+        'sum_t': stats['sum_t'] * decay + weight * days,
+        'sum_x': stats['sum_x'] * decay + weight * x,
+        'sum_tt': stats['sum_tt'] * decay + weight * days * days,
+        'sum_tx': stats['sum_tx'] * decay + weight * days * x,
+        'last_t': np.fmax(last_t, t),
+        'origin_t': origin_t
+    }
+
+
+def accumulate_usage_stats(vehicle_index, t, x, count, half_life=HALF_LIFE_DAYS):
+    """
+    Statistics from scratch for `count` vehicles from readings in any order, where
+    vehicle_index[i] says which vehicle reading i belongs to.
+    """
+    vehicle_index = np.asarray(vehicle_index, dtype=np.intp)
+    t = np.asarray(t, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    stats = empty_stats(count)
+    if not len(t):
+        return stats
+
+    last_t = np.full(count, -np.inf)
+    np.maximum.at(last_t, vehicle_index, t)
+    origin_t = np.full(count, np.inf)
+    np.minimum.at(origin_t, vehicle_index, t)
+    weight = np.exp2((t - last_t[vehicle_index]) / half_life)
+    days = t - origin_t[vehicle_index]
+
+    def total(values):
+        return np.bincount(vehicle_index, weights=values, minlength=count)
+
+    stats.update({
+        'points': np.bincount(vehicle_index, minlength=count).astype(np.float64),
+        'weight': total(weight),
+        'sum_t': total(weight * days),
+        'sum_x': total(weight * x),
+        'sum_tt': total(weight * days * days),
+        'sum_tx': total(weight * days * x),
+        'last_t': np.where(np.isinf(last_t), np.nan, last_t),
+        'origin_t': np.where(np.isinf(origin_t), 0.0, origin_t)
+    })
+    return stats
+
+
+def fit_daily_rates(stats, fallback=None):
+    """
+    Daily km rate per vehicle from its statistics. Returns (rates, fitted) where vehicles
+    with too few or too close readings, or a non-positive slope, get `fallback` (by default the
+    median of the fitted rates, else DEFAULT_DAILY_KM) and fitted=False.
+    """
+    weight = stats['weight']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # The sums are relative to each vehicle's first reading day, so sum_tt / weight and
+        # mean_t ** 2 stay small and their difference keeps its precision
+        mean_t = stats['sum_t'] / weight
+        mean_x = stats['sum_x'] / weight
+        var_t = stats['sum_tt'] / weight - mean_t * mean_t
+        cov_tx = stats['sum_tx'] / weight - mean_t * mean_x
+        slope = cov_tx / var_t
+
+    fitted = (stats['points'] >= 2) & (var_t >= MIN_SPREAD_DAYS ** 2) & (slope > 0)
+    if fallback is None:
+        fallback = float(np.median(slope[fitted])) if fitted.any() else DEFAULT_DAILY_KM
+    rates = np.where(fitted, np.minimum(slope, MAX_DAILY_KM), fallback)
+    return rates, fitted
+
+
+def predict_due_dates(rates, mileage, due_km, due_dates, today=None):
+    """
+    Predicted service date per vehicle: the day the km limit is reached at the vehicle's rate,
+    or its calendar due date if that comes first. Vehicles already due get today; vehicles
+    with neither a due km nor a due date get NaT. Returns a datetime64[D] array.
+    """
+    today = np.datetime64(today or date.today(), 'D')
+    due_km = np.array([np.nan if value is None else value for value in due_km], dtype=np.float64)
+    remaining = np.maximum(due_km - np.asarray(mileage, dtype=np.float64), 0)
+    with np.errstate(invalid='ignore'):
+        days = np.ceil(remaining / np.asarray(rates, dtype=np.float64))
+    by_km = today + np.where(np.isnan(days), 0, days).astype('timedelta64[D]')
+    by_km = np.where(np.isnan(days), np.datetime64('NaT', 'D'), by_km)
+
+    by_date = np.array([np.datetime64(value, 'D') if value else np.datetime64('NaT', 'D') for value in due_dates],
+                       dtype='datetime64[D]')
+    predicted = np.where(np.isnat(by_date) | (by_km < by_date), by_km, by_date)
+    return np.maximum(predicted, today)
@@ -1,60 +1,182 @@
+from collections import namedtuple
+from datetime import date
+from enum import IntEnum
+import copy
+import hashlib
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Severity(IntEnum):
+    """Status codes shared by the scalar estimators and the batch API"""
+    ERROR = -1
+    GOOD = 0
+    SOON = 1
+    NOW = 2
+    URGENT = 3
+
+
+class ServiceKind(IntEnum):
+    """Which service a status refers to"""
+    OIL_CHANGE = 0
+    BATTERY_SERVICE = 1
+    TIRE_CHANGE = 2
+
+
+class ServiceStatus(namedtuple('ServiceStatus', 'severity km_remaining months_remaining kind')):
+    """
+    Compact estimator result. km/months remaining are negative when overdue.
+    The display message is only built when the record is rendered.
+    """
+    __slots__ = ()
+
+    @property
+    def is_critical(self):
+        """Service is due now or overdue"""
+        return self.severity >= Severity.NOW
+
+    @property
+    def needs_attention(self):
+        """Anything other than a clean bill of health"""
+        return self.severity != Severity.GOOD
+
+    @property
+    def message(self):
+        """Human readable status message"""
+        if self.kind == ServiceKind.TIRE_CHANGE:
+            return format_tire_status(self.severity, self.km_remaining, self.months_remaining)
+        vehicle_type = 'electric' if self.kind == ServiceKind.BATTERY_SERVICE else 'gasoline'
+        return format_maintenance_status(self.severity, self.km_remaining, self.months_remaining, vehicle_type)
+
+    def __str__(self):
+        return self.message
+
+
+def format_maintenance_status(status, km_remaining, months_remaining, vehicle_type='gasoline'):
+    """Build the display message for a maintenance status code"""
+    service_name = "Battery/brake service" if vehicle_type == 'electric' else "Oil change"
+
+    if status == Severity.ERROR:
+        return "Error calculating maintenance status - check vehicle data"
+    if status == Severity.URGENT:
+        return f"{service_name} needed URGENTLY 🚨"
+    if status == Severity.NOW:
+        return f"{service_name} needed NOW 🚨"
+    if status == Severity.SOON:
+        return f"{service_name} soon - {km_remaining} km or {months_remaining} months remaining ⚠️"
+    return f"Maintenance good for {km_remaining} km or {months_remaining} months ✅"
+
+
+def format_tire_status(status, km_remaining, months_remaining):
+    """Build the display message for a tire status code"""
+    if status == Severity.ERROR:
+        return "Error calculating tire status - check vehicle data"
+    if status == Severity.URGENT:
+        return "Tire change needed URGENTLY 🚨"
+    if status == Severity.NOW:
+        return "Tire change needed NOW 🚨"
+    if status == Severity.SOON:
+        return f"Tire change soon - {km_remaining} km or {months_remaining} months remaining ⚠️"
+    return f"Tires good for {km_remaining} km or {months_remaining} months ✅"
+
+
+# Default interval rules. Operators can override any section with a JSON rules file
+# (see load_interval_rules) without restarting workers.
+DEFAULT_INTERVAL_RULES = {
+    # Service intervals by vehicle type
+    'service_intervals': {
+        'gasoline': {
+            'base_km': 10000,
+            'base_months': 6,
+            'service_type': 'oil_change'
+        },
+        'diesel': {
+            'base_km': 12000,
+            'base_months': 8,
+            'service_type': 'oil_change'
+        },
+        'hybrid': {
+            'base_km': 12000,
+            'base_months': 8,
+            'service_type': 'oil_change'
+        },
+        'electric': {
+            'base_km': 20000,  # Battery coolant/brake fluid service
+            'base_months': 12,
+            'service_type': 'maintenance_check'
+        }
+    },
+
+    # Fuel type modifiers for gasoline/diesel vehicles
+    'fuel_modifiers': {
+        '92': 0.85,
+        '95': 1.0,
+        '98': 1.15,
+        'diesel': 1.3,
+        'electric': 1.0,  # No fuel modifier for electric
+        'hybrid': 1.1
+    },
+
+    # Oil type modifiers (only applies to combustion engines)
+    'oil_modifiers': {
+        'standard': 1.0,
+        'premium': 1.2,
+        'semi-synthetic': 1.3,
+        'synthetic': 1.5
+    },
+
+    # Base tire intervals
+    'tire_base_km': 60000,   # 60,000 km base interval
+    'tire_base_months': 48,  # 4 years base interval
+
+    # Tire quality modifiers
+    'tire_modifiers': {
+        'budget': 0.8,     # Budget tires - 48,000 km
+        'standard': 1.0,   # Standard tires - 60,000 km
+        'premium': 1.3,    # Premium tires - 78,000 km
+        'performance': 0.9, # Performance tires - 54,000 km
+        'winter': 0.85     # Winter tires - 51,000 km
+    },
+
+    # Driving condition modifiers
+    'condition_modifiers': {
+        'city': 0.85,      # City driving - more wear
+        'highway': 1.15,   # Highway driving - less wear
+        'mixed': 1.0,      # Mixed driving - standard
+        'aggressive': 0.7, # Aggressive driving - much more wear
+        'normal': 1.0      # Normal driving - standard
+    }
+}
+
+
 class MaintenanceEstimator:
     """
     Professional maintenance estimator supporting all vehicle types including electric cars
     """
-    
+
+    # Built-in rule defaults; the active (possibly operator-tuned) rules live in the interval table
+    SERVICE_INTERVALS = DEFAULT_INTERVAL_RULES['service_intervals']
+    FUEL_MODIFIERS = DEFAULT_INTERVAL_RULES['fuel_modifiers']
+    OIL_MODIFIERS = DEFAULT_INTERVAL_RULES['oil_modifiers']
+
     def __init__(self, distance_km, fuel_type, months_since_last, oil_brand='standard', vehicle_type='gasoline'):
         self.distance = distance_km
-        self.fuel_type = fuel_type.lower() if fuel_type else 'gasoline'
+        self.fuel_type = str(fuel_type).lower() if fuel_type else 'gasoline'
         self.months = months_since_last
         self.oil_brand = oil_brand.lower() if oil_brand else 'standard'
         self.vehicle_type = vehicle_type.lower()
-        
-        # Service intervals by vehicle type
-        self.SERVICE_INTERVALS = {
-            'gasoline': {
-                'base_km': 10000,
-                'base_months': 6,
-                'service_type': 'oil_change'
-            },
-            'diesel': {
-                'base_km': 12000,
-                'base_months': 8,
-                'service_type': 'oil_change'
-            },
-            'hybrid': {
-                'base_km': 12000,
-                'base_months': 8,
-                'service_type': 'oil_change'
-            },
-            'electric': {
-                'base_km': 20000,  # Battery coolant/brake fluid service
-                'base_months': 12,
-                'service_type': 'maintenance_check'
-            }
-        }
-        
-        # Fuel type modifiers for gasoline/diesel vehicles
-        self.FUEL_MODIFIERS = {
-            '92': 0.85,
-            '95': 1.0,
-            '98': 1.15,
-            'diesel': 1.3,
-            'electric': 1.0,  # No fuel modifier for electric
-            'hybrid': 1.1
-        }
-        
-        # Oil type modifiers (only applies to combustion engines)
-        self.OIL_MODIFIERS = {
-            'standard': 1.0,
-            'premium': 1.2,
-            'semi-synthetic': 1.3,
-            'synthetic': 1.5
-        }
+        self.table = get_interval_table()
 
     def get_vehicle_config(self):
         """Get vehicle-specific configuration"""
-        return self.SERVICE_INTERVALS.get(self.vehicle_type, self.SERVICE_INTERVALS['gasoline'])
+        intervals = self.table.rules['service_intervals']
+        return intervals.get(self.vehicle_type, intervals['gasoline'])
 
     def get_fuel_modifier(self):
         """Get fuel type modifier"""
@@ -64,8 +186,8 @@ class MaintenanceEstimator:
         try:
             # Handle numeric fuel types (octane ratings)
             if isinstance(self.fuel_type, str) and self.fuel_type.isdigit():
-                return self.FUEL_MODIFIERS.get(self.fuel_type, 1.0)
-            return self.FUEL_MODIFIERS.get(self.fuel_type, 1.0)
+                return self.table.rules['fuel_modifiers'].get(self.fuel_type, 1.0)
+            return self.table.rules['fuel_modifiers'].get(self.fuel_type, 1.0)
         except (ValueError, TypeError):
             return 1.0
 
@@ -73,32 +195,32 @@ class MaintenanceEstimator:
         """Get oil type modifier (only for combustion engines)"""
         if self.vehicle_type == 'electric':
             return 1.0
-        return self.OIL_MODIFIERS.get(self.oil_brand, 1.0)
+        return self.table.rules['oil_modifiers'].get(self.oil_brand, 1.0)
 
     def calculate_adjusted_intervals(self):
-        """Calculate adjusted maintenance intervals"""
-        config = self.get_vehicle_config()
-        fuel_factor = self.get_fuel_modifier()
-        oil_factor = self.get_oil_modifier()
-        
-        adjusted_km = int(config['base_km'] * fuel_factor * oil_factor)
-        adjusted_months = int(config['base_months'] * oil_factor)
-        
-        return adjusted_km, adjusted_months
+        """Calculate adjusted maintenance intervals (precompiled in the interval table)"""
+        intervals = self.table.lookup(self.vehicle_type, self.fuel_type, self.oil_brand)
+        return intervals.service_km, intervals.service_months
+
+    def get_service_kind(self):
+        """Battery/brake service for electric cars, oil change for everything else"""
+        return ServiceKind.BATTERY_SERVICE if self.vehicle_type == 'electric' else ServiceKind.OIL_CHANGE
 
     def calculate_maintenance_need(self):
         """
         Calculate maintenance needs based on vehicle type
+        Returns a ServiceStatus record
         """
         try:
-            config = self.get_vehicle_config()
             adjusted_km, adjusted_months = self.calculate_adjusted_intervals()
             
             # Check if maintenance is needed
             km_exceeded = self.distance >= adjusted_km
             time_exceeded = self.months >= adjusted_months
             
-            service_name = "Battery/brake service" if self.vehicle_type == 'electric' else "Oil change"
+            # Calculate remaining distance/time (negative when overdue)
+            km_remaining = adjusted_km - self.distance
+            months_remaining = adjusted_months - self.months
             
             if km_exceeded or time_exceeded:
                 # Calculate how overdue
@@ -106,22 +228,20 @@ class MaintenanceEstimator:
                 months_overdue = max(0, self.months - adjusted_months)
                 
                 if km_overdue > (adjusted_km * 0.2) or months_overdue > 2:
-                    return f"{service_name} needed URGENTLY 🚨"
+                    severity = Severity.URGENT
                 else:
-                    return f"{service_name} needed NOW 🚨"
+                    severity = Severity.NOW
             else:
-                # Calculate remaining distance/time
-                km_remaining = adjusted_km - self.distance
-                months_remaining = adjusted_months - self.months
-                
                 # Warning if close to limit
                 if km_remaining <= 1000 or months_remaining <= 1:
-                    return f"{service_name} soon - {km_remaining} km or {months_remaining} months remaining ⚠️"
+                    severity = Severity.SOON
                 else:
-                    return f"Maintenance good for {km_remaining} km or {months_remaining} months ✅"
+                    severity = Severity.GOOD
+            
+            return ServiceStatus(severity, km_remaining, months_remaining, self.get_service_kind())
                     
-        except Exception as e:
-            return "Error calculating maintenance status - check vehicle data"
+        except Exception:
+            return ServiceStatus(Severity.ERROR, 0, 0, self.get_service_kind())
 
     def get_calculation_details(self):
         """Get detailed calculation breakdown"""
@@ -187,79 +307,61 @@ class TireChangeEstimator:
     Professional tire change estimator
     """
     
+    # Built-in rule defaults; the active (possibly operator-tuned) rules live in the interval table
+    BASE_INTERVAL_KM = DEFAULT_INTERVAL_RULES['tire_base_km']
+    BASE_TIME_MONTHS = DEFAULT_INTERVAL_RULES['tire_base_months']
+    TIRE_MODIFIERS = DEFAULT_INTERVAL_RULES['tire_modifiers']
+    CONDITION_MODIFIERS = DEFAULT_INTERVAL_RULES['condition_modifiers']
+
     def __init__(self, distance_km, months_since_last, tire_brand='standard', driving_conditions='normal'):
         self.distance = distance_km
         self.months = months_since_last
         self.tire_brand = tire_brand.lower() if tire_brand else 'standard'
         self.driving_conditions = driving_conditions.lower()
-        
-        # Base tire intervals
-        self.BASE_INTERVAL_KM = 60000  # 60,000 km base interval
-        self.BASE_TIME_MONTHS = 48     # 4 years base interval
-        
-        # Tire quality modifiers
-        self.TIRE_MODIFIERS = {
-            'budget': 0.8,     # Budget tires - 48,000 km
-            'standard': 1.0,   # Standard tires - 60,000 km
-            'premium': 1.3,    # Premium tires - 78,000 km
-            'performance': 0.9, # Performance tires - 54,000 km
-            'winter': 0.85     # Winter tires - 51,000 km
-        }
-        
-        # Driving condition modifiers
-        self.CONDITION_MODIFIERS = {
-            'city': 0.85,      # City driving - more wear
-            'highway': 1.15,   # Highway driving - less wear
-            'mixed': 1.0,      # Mixed driving - standard
-            'aggressive': 0.7, # Aggressive driving - much more wear
-            'normal': 1.0      # Normal driving - standard
-        }
+        self.table = get_interval_table()
 
     def get_tire_modifier(self):
         """Get tire quality modifier"""
-        return self.TIRE_MODIFIERS.get(self.tire_brand, 1.0)
+        return self.table.rules['tire_modifiers'].get(self.tire_brand, 1.0)
 
     def get_condition_modifier(self):
         """Get driving condition modifier"""
-        return self.CONDITION_MODIFIERS.get(self.driving_conditions, 1.0)
+        return self.table.rules['condition_modifiers'].get(self.driving_conditions, 1.0)
 
     def calculate_adjusted_intervals(self):
-        """Calculate adjusted tire change intervals"""
-        tire_factor = self.get_tire_modifier()
-        condition_factor = self.get_condition_modifier()
-        
-        adjusted_km = int(self.BASE_INTERVAL_KM * tire_factor * condition_factor)
-        adjusted_months = self.BASE_TIME_MONTHS  # Time doesn't change much for tires
-        
-        return adjusted_km, adjusted_months
+        """Calculate adjusted tire change intervals (precompiled in the interval table)"""
+        intervals = self.table.lookup(tire_brand=self.tire_brand, driving_conditions=self.driving_conditions)
+        return intervals.tire_km, intervals.tire_months
 
     def calculate_tire_change_need(self):
-        """Calculate tire change needs"""
+        """Calculate tire change needs, returns a ServiceStatus record"""
         try:
             adjusted_km, adjusted_months = self.calculate_adjusted_intervals()
             
             km_exceeded = self.distance >= adjusted_km
             time_exceeded = self.months >= adjusted_months
             
+            km_remaining = adjusted_km - self.distance
+            months_remaining = adjusted_months - self.months
+            
             if km_exceeded or time_exceeded:
                 km_overdue = max(0, self.distance - adjusted_km)
                 months_overdue = max(0, self.months - adjusted_months)
                 
                 if km_overdue > (adjusted_km * 0.1) or months_overdue > 6:
-                    return "Tire change needed URGENTLY 🚨"
+                    severity = Severity.URGENT
                 else:
-                    return "Tire change needed NOW 🚨"
+                    severity = Severity.NOW
             else:
-                km_remaining = adjusted_km - self.distance
-                months_remaining = adjusted_months - self.months
-                
                 if km_remaining <= 5000 or months_remaining <= 6:
-                    return f"Tire change soon - {km_remaining} km or {months_remaining} months remaining ⚠️"
+                    severity = Severity.SOON
                 else:
-                    return f"Tires good for {km_remaining} km or {months_remaining} months ✅"
+                    severity = Severity.GOOD
+            
+            return ServiceStatus(severity, km_remaining, months_remaining, ServiceKind.TIRE_CHANGE)
                     
-        except Exception as e:
-            return "Error calculating tire status - check vehicle data"
+        except Exception:
+            return ServiceStatus(Severity.ERROR, 0, 0, ServiceKind.TIRE_CHANGE)
 
     def is_critical(self):
         """Check if tires need immediate replacement"""
@@ -267,6 +369,298 @@ class TireChangeEstimator:
         return self.distance >= adjusted_km or self.months >= adjusted_months
 
 
+Intervals = namedtuple('Intervals', 'service_km service_months tire_km tire_months kind')
+
+
+class IntervalTable:
+    """
+    Adjusted intervals precomputed for every (vehicle_type, fuel, oil, tire, condition)
+    combination, so evaluating a vehicle is a single dict lookup.
+    Values the rules don't know about map to None, which compiles to the estimator defaults.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        # Identifies the rules a precomputed status was evaluated with
+        self.version = hashlib.sha1(json.dumps(rules, sort_keys=True).encode()).hexdigest()[:12]
+        intervals = rules['service_intervals']
+        fuel_modifiers = rules['fuel_modifiers']
+        oil_modifiers = rules['oil_modifiers']
+        tire_modifiers = rules['tire_modifiers']
+        condition_modifiers = rules['condition_modifiers']
+
+        self.dimensions = tuple(frozenset(keys) for keys in (
+            intervals, fuel_modifiers, oil_modifiers, tire_modifiers, condition_modifiers))
+
+        service = {}
+        for vehicle_type in [*intervals, None]:
+            config = intervals.get(vehicle_type, intervals['gasoline'])
+            electric = vehicle_type == 'electric'
+            kind = ServiceKind.BATTERY_SERVICE if electric else ServiceKind.OIL_CHANGE
+            for fuel_type in [*fuel_modifiers, None]:
+                # Electric vehicles ignore fuel and oil modifiers
+                fuel_factor = 1.0 if electric else fuel_modifiers.get(fuel_type, 1.0)
+                for oil_brand in [*oil_modifiers, None]:
+                    oil_factor = 1.0 if electric else oil_modifiers.get(oil_brand, 1.0)
+                    service[vehicle_type, fuel_type, oil_brand] = (
+                        int(config['base_km'] * fuel_factor * oil_factor),
+                        int(config['base_months'] * oil_factor),
+                        kind
+                    )
+
+        tire = {}
+        for tire_brand in [*tire_modifiers, None]:
+            for conditions in [*condition_modifiers, None]:
+                tire_km = rules['tire_base_km'] * tire_modifiers.get(tire_brand, 1.0)
+                tire[tire_brand, conditions] = (
+                    int(tire_km * condition_modifiers.get(conditions, 1.0)),
+                    rules['tire_base_months']  # Time doesn't change much for tires
+                )
+
+        self._table = {
+            service_key + tire_key: Intervals(service_km, service_months, tire_km, tire_months, kind)
+            for service_key, (service_km, service_months, kind) in service.items()
+            for tire_key, (tire_km, tire_months) in tire.items()
+        }
+
+    def __len__(self):
+        return len(self._table)
+
+    def canonical_key(self, vehicle_type=None, fuel_type=None, oil_brand=None, tire_brand=None,
+                      driving_conditions=None):
+        """Replace values the rules don't know about with None"""
+        key = (vehicle_type, fuel_type, oil_brand, tire_brand, driving_conditions)
+        return tuple(value if value in keys else None for value, keys in zip(key, self.dimensions))
+
+    def lookup(self, vehicle_type=None, fuel_type=None, oil_brand=None, tire_brand=None, driving_conditions=None):
+        """Get the Intervals for one combination of (already lower-cased) rule values"""
+        try:
+            return self._table[vehicle_type, fuel_type, oil_brand, tire_brand, driving_conditions]
+        except KeyError:
+            return self._table[self.canonical_key(vehicle_type, fuel_type, oil_brand, tire_brand,
+                                                  driving_conditions)]
+
+
+_interval_table = None
+_rules_file_state = {'path': None, 'mtime': None, 'checked_at': 0.0}
+
+
+def build_interval_rules(overrides=None):
+    """Merge operator overrides onto DEFAULT_INTERVAL_RULES, section by section"""
+    rules = copy.deepcopy(DEFAULT_INTERVAL_RULES)
+    for section, value in (overrides or {}).items():
+        if section == 'service_intervals':
+            for vehicle_type, config in value.items():
+                rules[section][vehicle_type] = {**rules[section].get(vehicle_type, {}), **config}
+        elif isinstance(value, dict):
+            rules.setdefault(section, {}).update(value)
+        else:
+            rules[section] = value
+    return rules
+
+
+def get_interval_table():
+    """The interval table currently in use, compiled from the defaults on first use"""
+    global _interval_table
+    if _interval_table is None:
+        _interval_table = IntervalTable(DEFAULT_INTERVAL_RULES)
+    return _interval_table
+
+
+def load_interval_rules(path=None):
+    """
+    Compile the default rules plus the JSON overrides in `path` and swap the new table in.
+    Estimators created after this call use the new intervals.
+    """
+    global _interval_table
+    overrides = {}
+    if path:
+        with open(path) as rules_file:
+            overrides = json.load(rules_file)
+
+    table = IntervalTable(build_interval_rules(overrides))
+    _interval_table = table
+    return table
+
+
+def refresh_interval_rules(path, check_interval=30):
+    """
+    Reload the rules file if it changed on disk. Cheap enough to call on every request:
+    the file is only stat-ed once per check_interval seconds, so every worker process
+    picks up tuned intervals shortly after the file is edited.
+    """
+    state = _rules_file_state
+    now = time.monotonic()
+    if state['path'] == path and now - state['checked_at'] < check_interval:
+        return
+
+    state['checked_at'] = now
+    try:
+        mtime = os.stat(path).st_mtime
+        if state['path'] != path or state['mtime'] != mtime:
+            load_interval_rules(path)
+            state['path'], state['mtime'] = path, mtime
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        # Keep serving the previous table if the file is missing or broken
+        logger.warning("Could not load interval rules from %s: %s", path, e)
+
+
+def _factorize(values):
+    """Split a categorical column into its distinct values and per-row indexes"""
+    distinct = {}
+    # None and empty strings both fall back to the estimator defaults
+    codes = {value: distinct.setdefault(str(value or ''), len(distinct)) for value in dict.fromkeys(values)}
+    inverse = np.fromiter(map(codes.__getitem__, values), dtype=np.int64, count=len(values))
+    return list(distinct), inverse
+
+
+def _lookup_intervals(columns, make_key):
+    """
+    Look up the interval table once per distinct combination of the categorical columns.
+    Returns an (n, 5) int array with one Intervals row per vehicle.
+    """
+    table = get_interval_table()
+    factorized = [_factorize(column) for column in columns]
+
+    combos = np.zeros(len(factorized[0][1]), dtype=np.int64)
+    for uniques, inverse in factorized:
+        combos = combos * len(uniques) + inverse
+    unique_combos, inverse = np.unique(combos, return_inverse=True)
+
+    rows = []
+    for combo in unique_combos.tolist():
+        values = []
+        for uniques, _ in reversed(factorized):
+            combo, index = divmod(combo, len(uniques))
+            values.append(uniques[index])
+        rows.append(table.lookup(**make_key(*reversed(values))))
+
+    return np.array(rows, dtype=np.int64).reshape(-1, len(Intervals._fields))[inverse.reshape(-1)]
+
+
+def _month_number(value):
+    """Months since year 0 of a date, datetime or ISO date string"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return value.year * 12 + value.month - 1
+
+
+def _month_numbers(dates):
+    """
+    _month_number per date, and a mask of the missing ones. Plain integer arithmetic: converting
+    each date to datetime64 costs several times more.
+    """
+    dates = list(dates)
+    try:
+        numbers = np.fromiter((d.year * 12 + d.month - 1 if d else -1 for d in dates),
+                              dtype=np.int64, count=len(dates))
+    except AttributeError:
+        # ISO date strings, e.g. straight from a form
+        numbers = np.fromiter((_month_number(d) if d else -1 for d in dates), dtype=np.int64, count=len(dates))
+    return numbers, numbers < 0
+
+
+def months_elapsed(dates, today=None, missing=0):
+    """
+    Whole calendar months between each date and today, counted the same way as the dashboard
+    (year/month difference, ignoring the day). Missing dates get the `missing` value.
+    """
+    numbers, absent = _month_numbers(dates)
+    return np.where(absent, missing, _month_number(today or date.today()) - numbers)
+
+
+def months_after(dates, months):
+    """
+    First day of the month `months` calendar months after each date: the day months_elapsed()
+    reaches that count. Returns a list of dates, None where the date is missing.
+    """
+    numbers, absent = _month_numbers(dates)
+    due = (numbers + np.asarray(months, dtype=np.int64)).tolist()
+    return [None if missing else date(number // 12, number % 12 + 1, 1)
+            for number, missing in zip(due, absent.tolist())]
+
+
+def estimate_maintenance_batch(distances, months, fuel_types, oil_brands, vehicle_types):
+    """
+    Vectorized MaintenanceEstimator for a whole fleet in one pass.
+    Takes equal-length columns and returns a dict of arrays: adjusted_km, adjusted_months,
+    km_remaining, months_remaining (negative when overdue), status (Severity codes) and kind
+    (ServiceKind codes).
+    """
+    distances = np.asarray(distances, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+
+    intervals = _lookup_intervals(
+        [vehicle_types, fuel_types, oil_brands],
+        lambda vehicle_type, fuel_type, oil_brand: {
+            'vehicle_type': vehicle_type.lower() or 'gasoline',
+            'fuel_type': fuel_type.lower() or 'gasoline',
+            'oil_brand': oil_brand.lower() or 'standard'
+        }
+    )
+    adjusted_km = intervals[:, 0]
+    adjusted_months = intervals[:, 1]
+    km_remaining = adjusted_km - distances
+    months_remaining = adjusted_months - months
+
+    due = (km_remaining <= 0) | (months_remaining <= 0)
+    urgent = due & ((-km_remaining > adjusted_km * 0.2) | (-months_remaining > 2))
+    soon = ~due & ((km_remaining <= 1000) | (months_remaining <= 1))
+    status = np.select([urgent, due, soon], [Severity.URGENT, Severity.NOW, Severity.SOON], Severity.GOOD)
+
+    return {
+        'adjusted_km': adjusted_km,
+        'adjusted_months': adjusted_months,
+        'km_remaining': km_remaining,
+        'months_remaining': months_remaining,
+        'status': status.astype(np.int8),
+        'kind': intervals[:, 4].astype(np.int8)
+    }
+
+
+def estimate_tire_batch(distances, months, tire_brands, driving_conditions=None):
+    """
+    Vectorized TireChangeEstimator for a whole fleet in one pass.
+    Returns the same dict of arrays as estimate_maintenance_batch.
+    """
+    distances = np.asarray(distances, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    if driving_conditions is None:
+        driving_conditions = np.full(len(distances), 'normal', dtype=object)
+
+    intervals = _lookup_intervals(
+        [tire_brands, driving_conditions],
+        lambda tire_brand, conditions: {
+            'tire_brand': tire_brand.lower() or 'standard',
+            'driving_conditions': conditions.lower()
+        }
+    )
+    adjusted_km = intervals[:, 2]
+    adjusted_months = intervals[:, 3]
+    km_remaining = adjusted_km - distances
+    months_remaining = adjusted_months - months
+
+    due = (km_remaining <= 0) | (months_remaining <= 0)
+    urgent = due & ((-km_remaining > adjusted_km * 0.1) | (-months_remaining > 6))
+    soon = ~due & ((km_remaining <= 5000) | (months_remaining <= 6))
+    status = np.select([urgent, due, soon], [Severity.URGENT, Severity.NOW, Severity.SOON], Severity.GOOD)
+
+    return {
+        'adjusted_km': adjusted_km,
+        'adjusted_months': adjusted_months,
+        'km_remaining': km_remaining,
+        'months_remaining': months_remaining,
+        'status': status.astype(np.int8),
+        'kind': np.full(len(distances), ServiceKind.TIRE_CHANGE, dtype=np.int8)
+    }
+
+
+def to_service_statuses(result):
+    """Turn a batch result into a list of ServiceStatus records, one per vehicle"""
+    return list(map(ServiceStatus._make, zip(result['status'].tolist(), result['km_remaining'].tolist(),
+                                             result['months_remaining'].tolist(), result['kind'].tolist())))
+
+
 # Original OilChangeEstimator class for backward compatibility
 class OilChangeEstimator:
     """
@@ -0,0 +1,336 @@
+"""
+Due-service reminders for car owners. Runs in two phases:
+
+1. enqueue_due_reminders(): one INSERT ... SELECT per service type and range of car ids records
+   a pending reminder for every car that became due, deduplicated per due cycle
+   (next_*_due_km/date) by the unique key on service_reminders.
+2. deliver_reminders(): pending/failed reminders are claimed in batches (status 'sending' with
+   this run's claim token, rows locked by other runs are skipped) and pushed through an asyncio
+   dispatcher with bounded concurrency and a token-bucket rate limit shared by the whole run.
+   Their status is then written back with one executemany per batch. Overlapping runs (cron and
+   a manual `flask send-reminders`) therefore never send the same reminder twice; claims older
+   than the claim timeout are released as failed so a crashed run's reminders are retried.
+"""
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from email.message import EmailMessage
+import asyncio
+import json
+import logging
+import smtplib
+import time
+import uuid
+
+from .fleet import refresh_service_due
+from .servicing import service_name
+
+logger = logging.getLogger(__name__)
+
+REMINDER_BATCH_SIZE = 1000
+MAX_ATTEMPTS = 3
+CLAIM_TIMEOUT = 600  # Seconds before a claimed but unreported reminder is released
+NO_DUE_DATE = date(9999, 12, 31)  # Stored instead of NULL so the dedupe key stays comparable
+
+# service_type -> materialized due columns on cars
+DUE_COLUMNS = {
+    'oil_change': ('next_oil_due_km', 'next_oil_due_date'),
+    'tire_change': ('next_tire_due_km', 'next_tire_due_date')
+}
+
+ENQUEUE_BATCH_SIZE = 10000  # Car ids covered by one enqueue statement
+
+# Newly due cars of one service type among the cars in an id range: a primary key range on cars and a
+# unique key lookup per car, so a run never scans the whole fleet in one statement
+ENQUEUE_DUE_REMINDERS = """
+    INSERT INTO service_reminders (car_id, company_id, service_type, due_km, due_date, status)
+    SELECT c.id, c.company_id, %s, c.{due_km}, COALESCE(c.{due_date}, %s), 'pending'
+    FROM cars c
+    LEFT JOIN service_reminders r
+           ON r.car_id = c.id AND r.service_type = %s
+          AND r.due_km = c.{due_km} AND r.due_date = COALESCE(c.{due_date}, %s)
+    WHERE c.id > %s AND c.id <= %s AND c.is_active = TRUE AND c.{due_km} IS NOT NULL
+      AND (c.mileage >= c.{due_km} OR c.{due_date} <= %s)
+      AND r.id IS NULL
+"""
+
+ReminderMessage = namedtuple('ReminderMessage', 'reminder_id company_id phone owner text')
+
+
+def enqueue_query(service_type, today, low_id, high_id):
+    """SQL and parameters of ENQUEUE_DUE_REMINDERS for one service type and the cars in (low_id, high_id]"""
+    due_km, due_date = DUE_COLUMNS[service_type]
+    return (ENQUEUE_DUE_REMINDERS.format(due_km=due_km, due_date=due_date),
+            (service_type, NO_DUE_DATE, service_type, NO_DUE_DATE, low_id, high_id, today))
+
+
+def enqueue_due_reminders(connection, today=None, batch_size=ENQUEUE_BATCH_SIZE):
+    """Record a pending reminder for every active car newly due for a service; returns how many"""
+    today = today or date.today()
+    refresh_service_due(connection)
+    cursor = connection.cursor()
+    cursor.execute("SELECT MAX(id) AS max_id FROM cars")
+    max_id = cursor.fetchone()['max_id'] or 0
+    queued = 0
+    for low_id in range(0, max_id, batch_size):
+        for service_type in DUE_COLUMNS:
+            cursor.execute(*enqueue_query(service_type, today, low_id, low_id + batch_size))
+            queued += cursor.rowcount
+        connection.commit()
+    cursor.close()
+    return queued
+
+
+def reminder_text(row):
+    """SMS text for a reminder row"""
+    vehicle = f"{row['brand']} {row['model_name']}" if row['brand'] else (row['custom_model'] or 'vehicle')
+    service = service_name(row['service_type'], (row['fuel_type'] or 'gasoline').lower()).lower()
+    return (f"Hello {row['owner']}, your {vehicle} ({row['plate_number']}) is due for {service}. "
+            f"Please contact {row['company_name']} to book it.")
+
+
+# Next undelivered reminders of active cars, locked for claiming; rows another run holds are skipped
+SELECT_CLAIMABLE = """
+    SELECT r.id FROM service_reminders r
+    JOIN cars c ON c.id = r.car_id
+    WHERE r.status IN ('pending', 'failed') AND r.attempts < %s AND r.id > %s AND c.is_active = TRUE
+    ORDER BY r.id
+    LIMIT %s
+    FOR UPDATE OF r SKIP LOCKED
+"""
+
+SELECT_CLAIMED = """
+    SELECT r.id, r.company_id, r.service_type, c.plate_number, c.owner, c.tel_no, c.custom_model,
+           cm.brand, cm.model AS model_name, cm.fuel_type, co.company_name
+    FROM service_reminders r
+    JOIN cars c ON c.id = r.car_id
+    JOIN companies co ON co.id = r.company_id
+    LEFT JOIN car_models cm ON cm.id = c.car_model_id
+    WHERE r.claim_token = %s
+    ORDER BY r.id
+"""
+
+
+def release_expired_claims(connection, timeout=CLAIM_TIMEOUT):
+    """Mark reminders claimed more than `timeout` seconds ago (by a run that died) as failed; returns how many"""
+    cursor = connection.cursor()
+    cursor.execute("""
+        UPDATE service_reminders
+        SET status = 'failed', attempts = attempts + 1, last_error = 'delivery claim expired', claim_token = NULL
+        WHERE status = 'sending' AND claimed_at < %s
+    """, (datetime.now() - timedelta(seconds=timeout),))
+    released = cursor.rowcount
+    connection.commit()
+    cursor.close()
+    return released
+
+
+def _claimed_batches(connection, batch_size, max_attempts):
+    """
+    Claim undelivered reminders batch by batch for this run and yield them as ReminderMessage
+    lists with the claim token to report them under.
+    """
+    cursor = connection.cursor()
+    last_id = 0
+    while True:
+        cursor.execute(SELECT_CLAIMABLE, (max_attempts, last_id, batch_size))
+        ids = [row['id'] for row in cursor.fetchall()]
+        if not ids:
+            connection.commit()
+            break
+        last_id = ids[-1]
+        token = uuid.uuid4().hex
+        cursor.execute(f"""
+            UPDATE service_reminders SET status = 'sending', claim_token = %s, claimed_at = %s
+            WHERE id IN ({', '.join(['%s'] * len(ids))})
+        """, (token, datetime.now(), *ids))
+        connection.commit()
+
+        cursor.execute(SELECT_CLAIMED, (token,))
+        yield token, [ReminderMessage(row['id'], row['company_id'], row['tel_no'], row['owner'], reminder_text(row))
+                      for row in cursor.fetchall()]
+    cursor.close()
+
+
+class TokenBucket:
+    """Async rate limiter: `rate` acquisitions per second on average, bursts of up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ReminderDispatcher:
+    """Sends messages with at most `concurrency` in flight and `rate` per second, retrying failures"""
+
+    def __init__(self, sender, concurrency=50, rate=100, retries=2, timeout=10, backoff=0.5):
+        self.sender = sender
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+
+    async def _deliver(self, message, bucket):
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            await bucket.acquire()
+            try:
+                await asyncio.wait_for(self.sender.send(message), self.timeout)
+                return None
+            except Exception as e:
+                error = str(e) or type(e).__name__
+        return error
+
+    async def dispatch(self, messages, bucket=None):
+        """
+        Send all messages; returns {reminder_id: error or None}. Pass the same bucket to every
+        dispatch of a run so the rate limit applies to the run rather than to each batch.
+        """
+        bucket = bucket or TokenBucket(self.rate)
+        queue = asyncio.Queue()
+        for message in messages:
+            queue.put_nowait(message)
+        results = {}
+
+        async def worker():
+            while not queue.empty():
+                message = queue.get_nowait()
+                results[message.reminder_id] = await self._deliver(message, bucket)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(messages)))))
+        return results
+
+
+async def _deliver_claimed(connection, dispatcher, batch_size, max_attempts):
+    bucket = TokenBucket(dispatcher.rate)
+    sent = failed = 0
+    cursor = connection.cursor()
+    for token, messages in _claimed_batches(connection, batch_size, max_attempts):
+        results = await dispatcher.dispatch(messages, bucket)
+        now = datetime.now()
+        # Only while the claim is still ours; an expired claim may have been taken by another run
+        cursor.executemany("""
+            UPDATE service_reminders
+            SET status = %s, attempts = attempts + 1, last_error = %s, sent_at = %s, claim_token = NULL
+            WHERE id = %s AND claim_token = %s
+        """, [('failed' if error else 'sent', error, None if error else now, reminder_id, token)
+              for reminder_id, error in results.items()])
+        connection.commit()
+        failures = sum(1 for error in results.values() if error)
+        sent += len(results) - failures
+        failed += failures
+    cursor.close()
+    return sent, failed
+
+
+def deliver_reminders(connection, dispatcher, batch_size=REMINDER_BATCH_SIZE, max_attempts=MAX_ATTEMPTS,
+                      claim_timeout=CLAIM_TIMEOUT):
+    """Claim and send undelivered reminders in batches and record the outcome; returns (sent, failed)"""
+    release_expired_claims(connection, claim_timeout)
+    return asyncio.run(_deliver_claimed(connection, dispatcher, batch_size, max_attempts))
+
+
+class ReminderSender:
+    """Delivery channel interface"""
+
+    async def send(self, message):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LogSender(ReminderSender):
+    """Writes reminders to the application log (development)"""
+
+    async def send(self, message):
+        logger.info("Reminder to %s (%s): %s", message.owner, message.phone, message.text)
+
+
+class FileSender(ReminderSender):
+    """Appends reminders as NDJSON lines to a file, a local stand-in for a real gateway"""
+
+    def __init__(self, path):
+        self.file = open(path, 'a', encoding='utf-8')
+
+    async def send(self, message):
+        self.file.write(json.dumps(message._asdict(), ensure_ascii=False) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class SMTPSender(ReminderSender):
+    """Sends reminders through an email-to-SMS gateway: mail to <phone>@<gateway_domain>"""
+
+    def __init__(self, host, port, sender, gateway_domain, username=None, password=None, use_tls=False):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.gateway_domain = gateway_domain
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+
+    def _send(self, message):
+        email = EmailMessage()
+        email['From'] = self.sender
+        email['To'] = f"{''.join(filter(str.isdigit, message.phone))}@{self.gateway_domain}"
+        email['Subject'] = 'Service reminder'
+        email.set_content(message.text)
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(email)
+
+    async def send(self, message):
+        # smtplib blocks, keep it off the event loop
+        await asyncio.to_thread(self._send, message)
+
+
+def build_sender(config):
+    """Sender selected by REMINDER_SENDER ('log', 'file' or 'smtp')"""
+    kind = config.get('REMINDER_SENDER', 'log')
+    if kind == 'file':
+        return FileSender(config['REMINDER_FILE'])
+    if kind == 'smtp':
+        return SMTPSender(config['REMINDER_SMTP_HOST'], config.get('REMINDER_SMTP_PORT', 25),
+                          config['REMINDER_SMTP_FROM'], config['REMINDER_SMS_GATEWAY_DOMAIN'],
+                          config.get('REMINDER_SMTP_USER'), config.get('REMINDER_SMTP_PASSWORD'),
+                          config.get('REMINDER_SMTP_TLS', False))
+    if kind == 'log':
+        return LogSender()
+    raise ValueError(f"Unknown REMINDER_SENDER '{kind}'")
+
+
+def send_due_reminders(connection, config):
+    """Full reminder run: enqueue newly due vehicles, then deliver; returns counters"""
+    queued = enqueue_due_reminders(connection)
+    sender = build_sender(config)
+    try:
+        dispatcher = ReminderDispatcher(sender, concurrency=config.get('REMINDER_CONCURRENCY', 50),
+                                        rate=config.get('REMINDER_RATE_PER_SECOND', 100))
+        sent, failed = deliver_reminders(connection, dispatcher,
+                                         max_attempts=config.get('REMINDER_MAX_ATTEMPTS', MAX_ATTEMPTS),
+                                         claim_timeout=config.get('REMINDER_CLAIM_TIMEOUT', CLAIM_TIMEOUT))
+    finally:
+        sender.close()
+    return {'queued': queued, 'sent': sent, 'failed': failed}
@@ -1,10 +1,24 @@
-from flask import Blueprint, request, render_template, redirect, url_for, flash, session, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+from flask import Blueprint, Response, stream_with_context, current_app, g, request, render_template, redirect, url_for, flash, session, jsonify, send_from_directory
+from markupsafe import Markup
 from app import mysql
-from .models.oil_calculator import MaintenanceEstimator, TireChangeEstimator, OilChangeEstimator
-from datetime import date, datetime, timedelta
+from .models.oil_calculator import MaintenanceEstimator, get_interval_table
+from .fleet import (PAGE_SIZE, resolve_fuel_type, parse_filters, parse_page_size,
+                    fetch_vehicle_page, get_fleet_summary, invalidate_fleet_summary, fetch_fleet_brands,
+                    vehicle_to_json, compute_service_due, refresh_service_due, SERVICE_DUE_COLUMNS)
+from .cache import summary_cache, identity_cache, row_fragment_cache
+from .security import HasherBusy, password_hasher
+from .catalog import SEARCH_LIMIT, MAX_SEARCH_LIMIT, car_model_catalog
+from .importer import detect_format, import_vehicles
+from .exporter import EXPORT_FORMATS, parse_columns, export_vehicles
+from .servicing import MAX_BULK_SERVICE, complete_services
+from .telemetry import MAX_READINGS_PER_REQUEST, odometer_buffer
+from .forecasting import fetch_forecasts
+from .logos import content_filename, is_content_addressed, logo_processor, store_logo
+from .history import (HISTORY_PAGE_SIZE, parse_history_limit, fetch_history_page, fetch_history_rollups,
+                      history_entry_to_json)
+from datetime import date, datetime
 import functools
+import hmac
 import os
 
 main = Blueprint('main', __name__)
@@ -13,6 +27,7 @@ main = Blueprint('main', __name__)
 UPLOAD_FOLDER = 'app/static/uploads/logos'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'svg'}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+LOGO_MAX_AGE = 365 * 24 * 3600  # Content-addressed logos never change
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -28,29 +43,51 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Identity fields shown on authenticated pages (never the password hash)
+IDENTITY_FIELDS = ('id', 'company_id', 'username', 'email', 'full_name', 'role', 'company_name', 'logo_filename')
+
+SELECT_CURRENT_USER = """
+    SELECT u.id, u.company_id, u.username, u.email, u.full_name, u.role, c.company_name, c.logo_filename
+    FROM users u
+    JOIN companies c ON u.company_id = c.id
+    WHERE u.id = %s AND u.is_active = TRUE
+"""
+
+SELECT_LOGIN_USER = """
+    SELECT u.*, c.company_name, c.logo_filename
+    FROM users u
+    JOIN companies c ON u.company_id = c.id
+    WHERE (u.email = %s OR u.username = %s) AND u.is_active = TRUE AND c.is_active = TRUE
+"""
+
+def cache_identity(user):
+    """Store a user's identity fields in the process cache and return them"""
+    identity = {field: user[field] for field in IDENTITY_FIELDS}
+    identity_cache.set(identity['id'], identity)
+    return identity
+
+def invalidate_company_identities(company_id):
+    """Drop the cached identities of a company's users, e.g. after its logo changed"""
+    identity_cache.invalidate_where(lambda user_id, identity: identity['company_id'] == company_id)
+
 def get_current_user():
-    """Get current user information"""
+    """Get current user information, cached per request and for a short time per process"""
     if 'user_id' not in session:
         return None
+    if 'current_user' in g:
+        return g.current_user
     
-    cursor = mysql.connection.cursor()
-    cursor.execute("""
-        SELECT u.*, c.company_name, c.logo_filename 
-        FROM users u 
-        JOIN companies c ON u.company_id = c.id 
-        WHERE u.id = %s AND u.is_active = TRUE
-    """, (session['user_id'],))
-    user = cursor.fetchone()
-    cursor.close()
-    return user
-
-def determine_vehicle_type(car_model_info):
-    """Determine vehicle type from car model information"""
-    if not car_model_info:
-        return 'gasoline'
+    user = identity_cache.get(session['user_id'])
+    if user is None:
+        cursor = mysql.connection.cursor()
+        cursor.execute(SELECT_CURRENT_USER, (session['user_id'],))
+        user = cursor.fetchone()
+        cursor.close()
+        if user:
+            user = cache_identity(user)
     
-    fuel_type = car_model_info.get('fuel_type', 'gasoline').lower()
-    return fuel_type
+    g.current_user = user
+    return user
 
 @main.route('/')
 def home():
@@ -90,22 +127,16 @@ def register():
                 flash('Passwords do not match!', 'error')
                 return render_template('register.html')
             
-            # Handle logo upload
+            # Handle logo upload; the file is only written once the company exists
             logo_filename = None
             if 'logo' in request.files:
                 file = request.files['logo']
                 if file and file.filename and allowed_file(file.filename):
-                    # Create upload directory if it doesn't exist
-                    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-                    
-                    # Generate secure filename
-                    original_filename = secure_filename(file.filename)
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    logo_filename = f"{timestamp}_{original_filename}"
-                    
-                    # Save file
-                    file_path = os.path.join(UPLOAD_FOLDER, logo_filename)
-                    file.save(file_path)
+                    logo_data = file.read()
+                    if len(logo_data) > MAX_FILE_SIZE:
+                        flash('Logo file too large! Maximum size is 5MB.', 'error')
+                        return render_template('register.html')
+                    logo_filename = content_filename(logo_data, file.filename)
             
             cursor = mysql.connection.cursor()
             
@@ -128,7 +159,7 @@ def register():
             
             # Create admin user
             username = email.split('@')[0]
-            password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+            password_hash = password_hasher.hash(password)
             
             cursor.execute("""
                 INSERT INTO users (company_id, username, email, password_hash, full_name, role)
@@ -138,6 +169,9 @@ def register():
             mysql.connection.commit()
             cursor.close()
             
+            if logo_filename:
+                save_logo(logo_filename, logo_data)
+            
             flash(f'Welcome {owner_name}! Your company account has been created successfully.', 'success')
             flash('Please log in with your credentials to continue.', 'info')
             
@@ -163,16 +197,11 @@ def login():
             
             cursor = mysql.connection.cursor()
             
-            cursor.execute("""
-                SELECT u.*, c.company_name, c.logo_filename 
-                FROM users u 
-                JOIN companies c ON u.company_id = c.id 
-                WHERE (u.email = %s OR u.username = %s) AND u.is_active = TRUE AND c.is_active = TRUE
-            """, (email_or_username, email_or_username))
+            cursor.execute(SELECT_LOGIN_USER, (email_or_username, email_or_username))
             
             user = cursor.fetchone()
             
-            if user and check_password_hash(user['password_hash'], password):
+            if user and password_hasher.verify(user['password_hash'], password):
                 # Create session
                 session['user_id'] = user['id']
                 session['company_id'] = user['company_id']
@@ -181,9 +210,14 @@ def login():
                 session['company_name'] = user['company_name']
                 session['role'] = user['role']
                 session['logo_filename'] = user['logo_filename']
+                cache_identity(user)  # The dashboard right after login needs no identity query
                 
-                # Update last login
-                cursor.execute("UPDATE users SET last_login = NOW() WHERE id = %s", (user['id'],))
+                # Update last login, upgrading the stored hash if the hashing settings changed
+                if password_hasher.needs_rehash(user['password_hash']):
+                    cursor.execute("UPDATE users SET last_login = NOW(), password_hash = %s WHERE id = %s",
+                                   (password_hasher.hash(password), user['id']))
+                else:
+                    cursor.execute("UPDATE users SET last_login = NOW() WHERE id = %s", (user['id'],))
                 mysql.connection.commit()
                 
                 flash(f'Welcome back, {user["full_name"]}!', 'success')
@@ -193,6 +227,8 @@ def login():
                 flash('Invalid email/username or password.', 'error')
                 cursor.close()
                 
+        except HasherBusy:
+            flash('The server is busy signing other users in. Please try again in a moment.', 'error')
         except Exception as e:
             flash(f'Login failed: {str(e)}', 'error')
     
@@ -201,189 +237,248 @@ def login():
 @main.route('/logout')
 def logout():
     """User logout"""
+    if 'user_id' in session:
+        identity_cache.invalidate(session['user_id'])
     session.clear()
     flash('You have been logged out successfully.', 'info')
     return redirect(url_for('main.login'))
 
+# Vehicle fields shown in a dashboard row (_vehicle_row.html)
+ROW_FIELDS = ('plate_number', 'car_model', 'vehicle_type', 'owner_name', 'owner_phone', 'mileage', 'gas_type',
+              'status', 'maintenance_status', 'tire_status')
+
+@main.app_template_global()
+def render_vehicle_rows(vehicles):
+    """
+    Dashboard table rows. A row is only rendered again when its car changed, the day or the interval
+    rules changed; otherwise the cached markup is reused. Besides updated_at the stamp holds every
+    field the row shows, since imports, servicing, telemetry and same-second edits do not always
+    move updated_at.
+    """
+    template = current_app.jinja_env.get_template('_vehicle_row.html')
+    today = date.today()
+    rules_version = get_interval_table().version
+    rows = []
+    for vehicle in vehicles:
+        stamp = (vehicle['updated_at'], today, rules_version, *(vehicle[field] for field in ROW_FIELDS))
+        row = row_fragment_cache.get(vehicle['id'], stamp)
+        if row is None:
+            row = template.render(vehicle=vehicle)
+            row_fragment_cache.set(vehicle['id'], stamp, row)
+        rows.append(row)
+    return Markup('\n'.join(rows))
+
+def save_logo(logo_filename, data):
+    """Write a logo once the change referring to it is committed, then make its thumbnails in the background"""
+    if store_logo(UPLOAD_FOLDER, logo_filename, data):
+        logo_processor.submit(os.path.abspath(os.path.join(UPLOAD_FOLDER, logo_filename)))
+
+@main.route('/logos/<path:filename>')
+def logo_file(filename):
+    """Company logos and their variants, with ETags; content-addressed ones may be cached for good"""
+    immutable = is_content_addressed(filename)
+    # The name of a content-addressed file already identifies its content
+    response = send_from_directory(os.path.abspath(UPLOAD_FOLDER), filename,
+                                   etag=filename if immutable else True,
+                                   max_age=LOGO_MAX_AGE if immutable else 0)
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+@main.app_template_global()
+def logo_sources(logo_filename, variant):
+    """WebP and PNG file names of a logo's pre-sized variant, or the original until it is processed"""
+    return logo_processor.sources(UPLOAD_FOLDER, logo_filename, variant)
+
 @main.route('/admin')
 @login_required
 def admin_dashboard():
     """Enhanced dashboard with electric car and tire tracking support"""
+    filters = parse_filters(request.args)
+    refresh_service_due(mysql.connection, session['company_id'])
     cursor = mysql.connection.cursor()
     
-    # Get vehicles with car model information
-    cursor.execute("""
-        SELECT c.*, cm.brand, cm.model as model_name, cm.engine_size, cm.fuel_type 
-        FROM cars c 
-        LEFT JOIN car_models cm ON c.car_model_id = cm.id 
-        WHERE c.company_id = %s AND c.is_active = TRUE 
-        ORDER BY c.created_at DESC
-    """, (session['company_id'],))
-    cars = cursor.fetchall()
-    
-    vehicles = []
-    critical_count = 0
-    good_count = 0
-    tire_critical_count = 0
+    # Only the first screen is rendered here, the rest is fetched from /api/vehicles
+    try:
+        vehicles, next_cursor = fetch_vehicle_page(cursor, session['company_id'], filters,
+                                                   after=request.args.get('cursor'))
+    except ValueError:
+        vehicles, next_cursor = fetch_vehicle_page(cursor, session['company_id'], filters)
+    summary = get_fleet_summary(cursor, session['company_id'])
+    brands = fetch_fleet_brands(cursor, session['company_id'])
+    cursor.close()
     
-    for car in cars:
-        # Determine vehicle type
-        vehicle_type = determine_vehicle_type(car)
-        
-        # Calculate maintenance needs (oil/battery service)
-        distance_since_service = car['mileage'] - car['last_oil_change_km']
-        
-        today = date.today()
-        last_change_date = car['last_oil_change_date']
-        if isinstance(last_change_date, str):
-            last_change_date = datetime.strptime(last_change_date, '%Y-%m-%d').date()
-        
-        months_since = (today.year - last_change_date.year) * 12 + (today.month - last_change_date.month)
-        
-        # Determine fuel type for estimator
-        if vehicle_type == 'electric':
-            fuel_type = 'electric'
-        elif vehicle_type == 'diesel':
-            fuel_type = 'diesel'
-        elif vehicle_type == 'hybrid':
-            fuel_type = 'hybrid'
-        else:
-            try:
-                fuel_type = int(car['gas_type']) if str(car['gas_type']).isdigit() else 95
-            except (ValueError, TypeError):
-                fuel_type = 95
-        
-        # Calculate maintenance status
-        estimator = MaintenanceEstimator(
-            distance_km=distance_since_service,
-            fuel_type=fuel_type,
-            months_since_last=months_since,
-            oil_brand=car['oil_type'] or 'standard',
-            vehicle_type=vehicle_type
-        )
-        
-        maintenance_status = estimator.calculate_maintenance_need()
-        
-        # Calculate tire status
-        tire_distance = car['mileage'] - (car['last_tire_change_km'] or 0)
-        tire_last_change = car['last_tire_change_date']
-        tire_months = 0
-        
-        if tire_last_change:
-            if isinstance(tire_last_change, str):
-                tire_last_change = datetime.strptime(tire_last_change, '%Y-%m-%d').date()
-            tire_months = (today.year - tire_last_change.year) * 12 + (today.month - tire_last_change.month)
-        else:
-            tire_months = 48  # Assume old tires if no data
-        
-        tire_estimator = TireChangeEstimator(
-            distance_km=tire_distance,
-            months_since_last=tire_months,
-            tire_brand=car['tire_brand'] or 'standard'
-        )
-        
-        tire_status = tire_estimator.calculate_tire_change_need()
-        
-        # Determine overall status
-        maintenance_critical = 'needed' in maintenance_status.lower() or 'now' in maintenance_status.lower()
-        tire_critical = 'needed' in tire_status.lower() or 'now' in tire_status.lower()
+    return render_template('admin_dashboard.html', 
+                         vehicles=vehicles,
+                         next_cursor=next_cursor,
+                         filters=filters,
+                         brands=brands,
+                         user=get_current_user(),
+                         **summary)
+
+@main.route('/api/vehicles')
+@login_required
+def list_vehicles():
+    """JSON vehicle listing with keyset pagination and the same filters as the dashboard"""
+    try:
+        refresh_service_due(mysql.connection, session['company_id'])
+        cursor = mysql.connection.cursor()
+        vehicles, next_cursor = fetch_vehicle_page(cursor, session['company_id'],
+                                                   parse_filters(request.args),
+                                                   after=request.args.get('cursor'),
+                                                   limit=parse_page_size(request.args.get('limit', PAGE_SIZE)))
+        cursor.close()
         
-        if maintenance_critical or tire_critical:
-            status = 'critical'
-            critical_count += 1
-            if tire_critical:
-                tire_critical_count += 1
-        else:
-            status = 'good'
-            good_count += 1
-        
-        # Enhanced car model display
-        if car['brand'] and car['model_name']:
-            car_model_display = f"{car['brand']} {car['model_name']}"
-            if car['engine_size'] and car['engine_size'] != '0.0L':
-                car_model_display += f" ({car['engine_size']})"
-            if vehicle_type == 'electric':
-                car_model_display += " ⚡"
-            elif vehicle_type == 'hybrid':
-                car_model_display += " 🔋"
-        else:
-            car_model_display = car['custom_model'] or 'Unknown Model'
-        
-        vehicles.append({
-            'id': car['id'],
-            'plate_number': car['plate_number'],
-            'car_model': car_model_display,
-            'owner_name': car['owner'],
-            'owner_phone': car['tel_no'],
-            'mileage': car['mileage'],
-            'gas_type': car['gas_type'],
-            'oil_type': car['oil_type'],
-            'vehicle_type': vehicle_type,
-            'status': status,
-            'maintenance_status': maintenance_status,
-            'tire_status': tire_status,
-            'distance_since_service': distance_since_service,
-            'months_since_service': months_since,
-            'tire_distance': tire_distance,
-            'tire_months': tire_months,
-            'last_oil_change_km': car['last_oil_change_km'],
-            'last_oil_change_date': car['last_oil_change_date'],
-            'last_tire_change_km': car['last_tire_change_km'],
-            'last_tire_change_date': car['last_tire_change_date']
+        return jsonify({
+            'vehicles': [vehicle_to_json(vehicle) for vehicle in vehicles],
+            'next_cursor': next_cursor,
+            'html': render_template('_vehicle_rows.html', vehicles=vehicles)
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def history_response(cursor, car_id=None):
+    """History page JSON shared by the vehicle and company timelines; rollups come with the first page"""
+    after = request.args.get('cursor')
+    entries, next_cursor = fetch_history_page(cursor, session['company_id'], car_id,
+                                              maintenance_type=request.args.get('type') or None,
+                                              after=after,
+                                              limit=parse_history_limit(request.args.get('limit', HISTORY_PAGE_SIZE)))
+    data = {
+        'entries': [history_entry_to_json(entry) for entry in entries],
+        'next_cursor': next_cursor
+    }
+    if not after:
+        data['rollups'] = fetch_history_rollups(cursor, session['company_id'], car_id)
+    return data
+
+@main.route('/api/vehicles/<int:vehicle_id>/history')
+@login_required
+def vehicle_history(vehicle_id):
+    """JSON maintenance timeline of one vehicle, newest first, with rollups on the first page"""
+    try:
+        cursor = mysql.connection.cursor()
+        cursor.execute("SELECT id, plate_number FROM cars WHERE id = %s AND company_id = %s",
+                       (vehicle_id, session['company_id']))
+        car = cursor.fetchone()
+        if not car:
+            cursor.close()
+            return jsonify({'error': 'Vehicle not found'}), 404
+        
+        data = history_response(cursor, vehicle_id)
+        cursor.close()
+        return jsonify({'vehicle_id': car['id'], 'plate_number': car['plate_number'], **data})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/history')
+@login_required
+def company_history():
+    """JSON maintenance timeline of the whole fleet, newest first, with rollups on the first page"""
+    try:
+        cursor = mysql.connection.cursor()
+        data = history_response(cursor)
+        cursor.close()
+        return jsonify(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def telemetry_company():
+    """Company id for the request's telematics bearer token, or None"""
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not token:
+        return None
+    for known_token, company_id in current_app.config.get('TELEMETRY_TOKENS', {}).items():
+        if hmac.compare_digest(token.encode(), known_token.encode()):
+            return company_id
+    return None
+
+@main.route('/api/telemetry/odometer', methods=['POST'])
+def ingest_odometer():
+    """Accept a batch of odometer readings from telematics boxes; mileage is updated on the next flush"""
+    company_id = telemetry_company()
+    if company_id is None:
+        return jsonify({'error': 'Invalid telemetry token'}), 401
     
-    cursor.close()
-    return render_template('admin_dashboard.html', 
-                         vehicles=vehicles,
-                         total_vehicles=len(vehicles),
-                         critical_count=critical_count,
-                         good_count=good_count,
-                         tire_critical_count=tire_critical_count,
-                         user=get_current_user())
+    data = request.get_json(silent=True) or {}
+    readings = data.get('readings')
+    if not isinstance(readings, list) or not readings:
+        return jsonify({'error': 'Expected a JSON body with a non-empty "readings" list'}), 400
+    if len(readings) > MAX_READINGS_PER_REQUEST:
+        return jsonify({'error': f'At most {MAX_READINGS_PER_REQUEST} readings per request'}), 400
+    
+    return jsonify(odometer_buffer.add(company_id, readings)), 202
+
+@main.route('/api/telemetry/stats')
+@login_required
+def telemetry_stats():
+    """Odometer ingestion and flush counters of this worker"""
+    return jsonify(odometer_buffer.stats())
+
+@main.route('/api/forecast')
+@login_required
+def service_forecast():
+    """Predicted next service dates from each vehicle's usage rate, soonest first"""
+    try:
+        within_days = request.args.get('days', type=int)
+        refresh_service_due(mysql.connection, session['company_id'])
+        cursor = mysql.connection.cursor()
+        vehicles = fetch_forecasts(cursor, session['company_id'], within_days)
+        cursor.close()
+        return jsonify({'vehicles': vehicles})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/cache_stats')
+@login_required
+def cache_stats():
+    """Hit/miss counters of this worker's caches"""
+    return jsonify({'fleet_summary': summary_cache.stats(), 'identity': identity_cache.stats(),
+                    'row_fragments': row_fragment_cache.stats()})
+
+@main.route('/api/pool_stats')
+@login_required
+def pool_stats():
+    """Connection pool usage of this worker"""
+    return jsonify(mysql.stats())
 
 @main.route('/api/car_models')
 @login_required
 def get_car_models():
-    """API endpoint to get car models for AJAX requests"""
+    """API endpoint to get car models for AJAX requests, grouped by brand"""
     try:
         cursor = mysql.connection.cursor()
-        cursor.execute("""
-            SELECT id, brand, model, engine_size, fuel_type 
-            FROM car_models 
-            WHERE is_active = TRUE 
-            ORDER BY brand, model, engine_size
-        """)
-        models = cursor.fetchall()
+        catalog = car_model_catalog.get(cursor)
         cursor.close()
         
-        # Group by brand for better organization
-        brands = {}
-        for model in models:
-            brand = model['brand']
-            if brand not in brands:
-                brands[brand] = []
-            
-            display_name = model['model']
-            if model['engine_size'] and model['engine_size'] != '0.0L':
-                display_name += f" ({model['engine_size']})"
-            
-            # Add fuel type indicator
-            if model['fuel_type'] == 'electric':
-                display_name += " ⚡"
-            elif model['fuel_type'] == 'hybrid':
-                display_name += " 🔋"
-            elif model['fuel_type'] == 'diesel':
-                display_name += " 🛢️"
-            
-            brands[brand].append({
-                'id': model['id'],
-                'model': model['model'],
-                'engine_size': model['engine_size'],
-                'fuel_type': model['fuel_type'],
-                'display': display_name
-            })
-        
-        return jsonify(brands)
+        # The browser revalidates with If-None-Match and gets a 304 while the catalog is unchanged
+        if request.if_none_match.contains(catalog.etag):
+            response = Response(status=304)
+        else:
+            response = Response(catalog.body, mimetype='application/json')
+        response.set_etag(catalog.etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/car_models/search')
+@login_required
+def search_car_models():
+    """Typeahead search over the car model catalog, returns the top ranked matches"""
+    try:
+        limit = min(max(request.args.get('limit', SEARCH_LIMIT, type=int), 1), MAX_SEARCH_LIMIT)
+        cursor = mysql.connection.cursor()
+        catalog = car_model_catalog.get(cursor)
+        cursor.close()
+        
+        return jsonify(catalog.search_index.search(request.args.get('q', ''), limit))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -406,7 +501,7 @@ def add_vehicle():
         
         # Tire tracking fields
         last_tire_change_km = int(request.form.get('last_tire_change_km', 0))
-        last_tire_change_date = request.form.get('last_tire_change_date')
+        last_tire_change_date = request.form.get('last_tire_change_date') or None
         tire_brand = request.form.get('tire_brand', 'standard')
         
         # Validate car model selection
@@ -440,22 +535,31 @@ def add_vehicle():
         # Get vehicle type for proper messaging
         vehicle_type = 'gasoline'
         if car_model_id:
-            cursor.execute("SELECT fuel_type FROM car_models WHERE id = %s", (car_model_id,))
-            model_info = cursor.fetchone()
+            model_info = car_model_catalog.lookup(cursor, car_model_id)
             if model_info:
                 vehicle_type = model_info['fuel_type']
         
+        # Materialized next-service-due columns
+        service_due = compute_service_due([{
+            'fuel_type': vehicle_type, 'gas_type': gas_type, 'oil_type': oil_type, 'mileage': mileage,
+            'last_oil_change_km': last_oil_change_km, 'last_oil_change_date': last_oil_change_date,
+            'last_tire_change_km': last_tire_change_km, 'last_tire_change_date': last_tire_change_date,
+            'tire_brand': tire_brand
+        }])[0]
+        
         # Insert vehicle with tire tracking
-        cursor.execute("""
+        cursor.execute(f"""
             INSERT INTO cars (company_id, plate_number, car_model_id, custom_model, owner, tel_no, mileage,
                             production_date, gas_type, oil_type, last_oil_change_km, last_oil_change_date, 
-                            last_tire_change_km, last_tire_change_date, tire_brand, created_by)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                            last_tire_change_km, last_tire_change_date, tire_brand, created_by,
+                            {', '.join(SERVICE_DUE_COLUMNS)})
+            VALUES ({', '.join(['%s'] * (16 + len(SERVICE_DUE_COLUMNS)))})
         """, (session['company_id'], plate_number, car_model_id, custom_model, owner_name, owner_phone, mileage,
               date.today(), gas_type, oil_type, last_oil_change_km, last_oil_change_date, 
-              last_tire_change_km, last_tire_change_date, tire_brand, session['user_id']))
+              last_tire_change_km, last_tire_change_date, tire_brand, session['user_id'], *service_due))
         
         mysql.connection.commit()
+        invalidate_fleet_summary(session['company_id'])
         cursor.close()
         
         # Calculate status for success message
@@ -463,22 +567,9 @@ def add_vehicle():
         last_change_date = datetime.strptime(last_oil_change_date, '%Y-%m-%d').date()
         months_since = (date.today().year - last_change_date.year) * 12 + (date.today().month - last_change_date.month)
         
-        # Determine fuel type for estimator
-        if vehicle_type == 'electric':
-            fuel_type = 'electric'
-        elif vehicle_type == 'diesel':
-            fuel_type = 'diesel'
-        elif vehicle_type == 'hybrid':
-            fuel_type = 'hybrid'
-        else:
-            try:
-                fuel_type = int(gas_type) if str(gas_type).isdigit() else 95
-            except:
-                fuel_type = 95
-        
         estimator = MaintenanceEstimator(
             distance_km=distance_since_service,
-            fuel_type=fuel_type,
+            fuel_type=resolve_fuel_type(vehicle_type, gas_type),
             months_since_last=months_since,
             oil_brand=oil_type,
             vehicle_type=vehicle_type
@@ -488,7 +579,7 @@ def add_vehicle():
         # Success message based on vehicle type
         service_type = "Battery/brake service" if vehicle_type == 'electric' else "Oil change"
         
-        if 'needed' in maintenance_status.lower():
+        if maintenance_status.is_critical:
             flash(f'Vehicle {plate_number} added successfully! ⚠️ {service_type} needed!', 'warning')
         else:
             flash(f'Vehicle {plate_number} added successfully! ✅ Maintenance status: Good', 'success')
@@ -500,6 +591,44 @@ def add_vehicle():
     
     return redirect(url_for('main.admin_dashboard'))
 
+@main.route('/admin/import', methods=['POST'])
+@login_required
+def import_fleet():
+    """Bulk import vehicles from an uploaded CSV or NDJSON file, returns a per-row error report"""
+    try:
+        file = request.files.get('file')
+        if not file or not file.filename:
+            return jsonify({'error': 'No file uploaded'}), 400
+        fmt = detect_format(file.filename, request.args.get('format'))
+        
+        report = import_vehicles(mysql.connection, session['company_id'], session['user_id'], file.stream, fmt)
+        if report.imported:
+            invalidate_fleet_summary(session['company_id'])
+        
+        return jsonify(report.to_dict())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/admin/export')
+@login_required
+def export_fleet():
+    """Stream the fleet with its maintenance and tire status as CSV or NDJSON"""
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported export format '{fmt}', use csv or ndjson"}), 400
+    try:
+        columns = parse_columns(request.args.get('columns'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    refresh_service_due(mysql.connection, session['company_id'])
+    chunks = export_vehicles(mysql.connection, session['company_id'], parse_filters(request.args), columns, fmt)
+    filename = f"fleet-{date.today().isoformat()}.{fmt}"
+    return Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 @main.route('/admin/service/<int:vehicle_id>', methods=['POST'])
 @login_required
 def service_vehicle(vehicle_id):
@@ -507,62 +636,53 @@ def service_vehicle(vehicle_id):
     try:
         service_type = request.form.get('service_type', 'oil_change')
         
-        cursor = mysql.connection.cursor()
-        
-        # Get vehicle info with model details
-        cursor.execute("""
-            SELECT c.*, cm.fuel_type 
-            FROM cars c 
-            LEFT JOIN car_models cm ON c.car_model_id = cm.id 
-            WHERE c.id = %s AND c.company_id = %s AND c.is_active = TRUE
-        """, (vehicle_id, session['company_id']))
-        car = cursor.fetchone()
-        
-        if not car:
+        serviced, _ = complete_services(mysql.connection, session['company_id'], session['user_id'],
+                                        session['full_name'], [vehicle_id], service_type)
+        if not serviced:
             flash('Vehicle not found or access denied!', 'error')
             return redirect(url_for('main.admin_dashboard'))
+        invalidate_fleet_summary(session['company_id'])
         
-        vehicle_type = determine_vehicle_type(car)
-        
-        if service_type == 'oil_change':
-            # Update maintenance service
-            cursor.execute("""
-                UPDATE cars 
-                SET last_oil_change_km = %s, last_oil_change_date = %s 
-                WHERE id = %s AND company_id = %s
-            """, (car['mileage'], date.today(), vehicle_id, session['company_id']))
-            
-            service_name = "Battery/brake service" if vehicle_type == 'electric' else "Oil change"
-            maintenance_type = 'battery_service' if vehicle_type == 'electric' else 'oil_change'
-            
-        elif service_type == 'tire_change':
-            # Update tire change
-            cursor.execute("""
-                UPDATE cars 
-                SET last_tire_change_km = %s, last_tire_change_date = %s 
-                WHERE id = %s AND company_id = %s
-            """, (car['mileage'], date.today(), vehicle_id, session['company_id']))
-            
-            service_name = "Tire change"
-            maintenance_type = 'tire_change'
-        
-        # Add to maintenance history
-        cursor.execute("""
-            INSERT INTO maintenance_history (car_id, company_id, maintenance_type, mileage_at_service, service_date, notes, performed_by)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (vehicle_id, session['company_id'], maintenance_type, car['mileage'], date.today(), 
-              f'{service_name} completed by {session["full_name"]}', session['user_id']))
-        
-        mysql.connection.commit()
-        cursor.close()
-        
-        flash(f'{service_name} completed for vehicle {car["plate_number"]}!', 'success')
+        flash(f'{serviced[0]["service"]} completed for vehicle {serviced[0]["plate_number"]}!', 'success')
         
     except Exception as e:
         flash(f'Error updating service: {str(e)}', 'error')
     
     return redirect(url_for('main.admin_dashboard'))
 
+@main.route('/admin/service/bulk', methods=['POST'])
+@login_required
+def bulk_service_vehicles():
+    """Complete the same service for many vehicles in one transaction, returns a JSON summary"""
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {'vehicle_ids': request.form.getlist('vehicle_ids'), 'service_type': request.form.get('service_type')}
+    
+    try:
+        vehicle_ids = [int(vehicle_id) for vehicle_id in data.get('vehicle_ids') or []]
+        service_type = data.get('service_type') or 'oil_change'
+        if not vehicle_ids:
+            return jsonify({'error': 'No vehicles selected'}), 400
+        if len(vehicle_ids) > MAX_BULK_SERVICE:
+            return jsonify({'error': f'At most {MAX_BULK_SERVICE} vehicles can be serviced at once'}), 400
+        
+        serviced, missing = complete_services(mysql.connection, session['company_id'], session['user_id'],
+                                              session['full_name'], vehicle_ids, service_type)
+        if serviced:
+            invalidate_fleet_summary(session['company_id'])
+        
+        return jsonify({
+            'service_type': service_type,
+            'requested': len(set(vehicle_ids)),
+            'completed': len(serviced),
+            'vehicles': serviced,
+            'not_found': missing
+        })
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @main.route('/admin/delete/<int:vehicle_id>', methods=['POST'])
 @login_required
 def delete_vehicle(vehicle_id):
@@ -585,8 +705,10 @@ def delete_vehicle(vehicle_id):
             UPDATE cars SET is_active = FALSE 
             WHERE id = %s AND company_id = %s
         """, (vehicle_id, session['company_id']))
+        cursor.execute("DELETE FROM vehicle_status_snapshots WHERE car_id = %s", (vehicle_id,))
         
         mysql.connection.commit()
+        invalidate_fleet_summary(session['company_id'])
         cursor.close()
         
         flash(f'Vehicle {car["plate_number"]} removed from fleet successfully!', 'success')
@@ -611,14 +733,6 @@ def upload_logo():
             return redirect(url_for('main.admin_dashboard'))
         
         if file and allowed_file(file.filename):
-            # Create upload directory if it doesn't exist
-            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-            
-            # Generate secure filename
-            original_filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            logo_filename = f"{timestamp}_{original_filename}"
-            
             # Check file size
             file.seek(0, os.SEEK_END)
             file_size = file.tell()
@@ -628,9 +742,9 @@ def upload_logo():
                 flash('Logo file too large! Maximum size is 5MB.', 'error')
                 return redirect(url_for('main.admin_dashboard'))
             
-            # Save file
-            file_path = os.path.join(UPLOAD_FOLDER, logo_filename)
-            file.save(file_path)
+            # Stored under its content hash, so re-uploads and other companies' copies share a file
+            logo_data = file.read()
+            logo_filename = content_filename(logo_data, file.filename)
             
             # Update database
             cursor = mysql.connection.cursor()
@@ -642,8 +756,11 @@ def upload_logo():
             mysql.connection.commit()
             cursor.close()
             
-            # Update session
+            # Update session and the cached identities of the company's users
             session['logo_filename'] = logo_filename
+            invalidate_company_identities(session['company_id'])
+            
+            save_logo(logo_filename, logo_data)
             
             flash('Company logo uploaded successfully!', 'success')
         else:
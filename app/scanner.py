@@ -0,0 +1,153 @@
+"""
+Background fleet scan. Sweeps every active car in id-ordered batches, evaluates the
+maintenance and tire estimators across a process pool, and stores the results in
+vehicle_status_snapshots so the dashboard only evaluates cars changed since the sweep.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import logging
+import threading
+import time
+
+from .fleet import estimator_inputs_key, evaluate_fleet
+from .models.oil_calculator import get_interval_table, load_interval_rules
+
+logger = logging.getLogger(__name__)
+
+SCAN_BATCH_SIZE = 2000
+MAX_CAR_ID = 2 ** 31 - 1  # cars.id is an INT
+
+UPSERT_SNAPSHOT = """
+    REPLACE INTO vehicle_status_snapshots
+        (car_id, company_id, evaluated_on, car_updated_at, inputs_key, rules_version, vehicle_type,
+         maintenance_severity, maintenance_km_remaining, maintenance_months_remaining, maintenance_kind,
+         tire_severity, tire_km_remaining, tire_months_remaining, tire_kind, is_critical)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+# Snapshots of removed cars in one id range of the sweep; primary key ranges on both tables, not a full scan
+DELETE_INACTIVE_SNAPSHOTS = """
+    DELETE FROM vehicle_status_snapshots
+    WHERE car_id > %s AND car_id <= %s
+      AND car_id IN (SELECT id FROM cars WHERE id > %s AND id <= %s AND is_active = FALSE)
+"""
+
+SELECT_SCAN_BATCH = """
+    SELECT c.id, c.company_id, c.updated_at, c.mileage, c.gas_type, c.oil_type,
+           c.last_oil_change_km, c.last_oil_change_date, c.last_tire_change_km,
+           c.last_tire_change_date, c.tire_brand, cm.fuel_type
+    FROM cars c
+    LEFT JOIN car_models cm ON c.car_model_id = cm.id
+    WHERE c.id > %s AND c.is_active = TRUE
+    ORDER BY c.id
+    LIMIT %s
+"""
+
+
+def _init_worker(rules_file):
+    """Process pool initializer: use the same interval rules as the app"""
+    if rules_file:
+        load_interval_rules(rules_file)
+
+
+def evaluate_snapshot_batch(cars):
+    """Snapshot rows (UPSERT_SNAPSHOT parameters) for a batch of car rows; runs in a worker process"""
+    today = date.today()
+    version = get_interval_table().version
+    vehicle_types, maintenance, tires, critical = evaluate_fleet(cars)
+    columns = zip(cars, vehicle_types,
+                  maintenance['status'].tolist(), maintenance['km_remaining'].tolist(),
+                  maintenance['months_remaining'].tolist(), maintenance['kind'].tolist(),
+                  tires['status'].tolist(), tires['km_remaining'].tolist(),
+                  tires['months_remaining'].tolist(), tires['kind'].tolist(), critical.tolist())
+    return [(car['id'], car['company_id'], today, car['updated_at'], estimator_inputs_key(car), version,
+             vehicle_type, *statuses)
+            for car, vehicle_type, *statuses in columns]
+
+
+def _car_batches(connection, batch_size):
+    """
+    Active cars in id order, keyset-paginated so each batch is an index range scan. Snapshots of
+    removed cars are dropped for each id range as the sweep passes it.
+    """
+    cursor = connection.cursor()
+    last_id = 0
+    while True:
+        cursor.execute(SELECT_SCAN_BATCH, (last_id, batch_size))
+        cars = cursor.fetchall()
+        upper_id = cars[-1]['id'] if cars else MAX_CAR_ID
+        cursor.execute(DELETE_INACTIVE_SNAPSHOTS, (last_id, upper_id, last_id, upper_id))
+        connection.commit()
+        if not cars:
+            break
+        last_id = upper_id
+        yield cars
+    cursor.close()
+
+
+def _write_snapshots(connection, rows):
+    cursor = connection.cursor()
+    cursor.executemany(UPSERT_SNAPSHOT, rows)
+    connection.commit()
+    cursor.close()
+
+
+def scan_fleet(connection, workers=0, batch_size=SCAN_BATCH_SIZE, rules_file=None):
+    """
+    Refresh the status snapshots of every active car. With workers > 0 the batches are
+    evaluated in a process pool (at most two batches in flight per worker); with 0 they are
+    evaluated in this process. Returns scan counters.
+    """
+    started = time.monotonic()
+    scanned = 0
+
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rules_file,)) as pool:
+            pending = []
+            for cars in _car_batches(connection, batch_size):
+                pending.append(pool.submit(evaluate_snapshot_batch, cars))
+                if len(pending) >= workers * 2:
+                    rows = pending.pop(0).result()
+                    _write_snapshots(connection, rows)
+                    scanned += len(rows)
+            for future in pending:
+                rows = future.result()
+                _write_snapshots(connection, rows)
+                scanned += len(rows)
+    else:
+        for cars in _car_batches(connection, batch_size):
+            rows = evaluate_snapshot_batch(cars)
+            _write_snapshots(connection, rows)
+            scanned += len(rows)
+
+    return {'scanned': scanned, 'seconds': round(time.monotonic() - started, 3)}
+
+
+_scheduler = None
+
+
+def start_scan_scheduler(app, db):
+    """
+    Run scan_fleet every FLEET_SCAN_INTERVAL seconds in a daemon thread of this process.
+    Enable it in a single process only (e.g. one dedicated worker), not in every web worker.
+    """
+    global _scheduler
+    if _scheduler is not None:
+        return _scheduler
+
+    interval = app.config['FLEET_SCAN_INTERVAL']
+
+    def run():
+        while True:
+            try:
+                with app.app_context():
+                    result = scan_fleet(db.connection, workers=app.config.get('FLEET_SCAN_WORKERS', 0),
+                                        rules_file=app.config.get('INTERVAL_RULES_FILE'))
+                logger.info("Fleet scan refreshed %(scanned)d vehicles in %(seconds)ss", result)
+            except Exception:
+                logger.exception("Fleet scan failed")
+            time.sleep(interval)
+
+    _scheduler = threading.Thread(target=run, name='fleet-scan', daemon=True)
+    _scheduler.start()
+    return _scheduler
@@ -0,0 +1,99 @@
+"""
+Password hashing. Hashes are computed and checked in a small bounded thread pool, so a burst of
+logins (e.g. at shift start) runs at most `workers` CPU-heavy hashes at once instead of tying up
+every request worker. Both hashlib's pbkdf2 and bcrypt release the GIL while hashing.
+
+Supported schemes are werkzeug's "pbkdf2:sha256:<iterations>$..." hashes and bcrypt "$2b$<rounds>$..."
+hashes. Stored hashes made with another scheme or cost are still accepted, and
+needs_rehash() tells the caller to replace them after a successful login.
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import threading
+
+import bcrypt
+from werkzeug.security import check_password_hash, generate_password_hash
+
+HASH_SCHEMES = ('pbkdf2', 'bcrypt')
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+
+
+class HasherBusy(Exception):
+    """The hashing pool did not get to the password within the timeout"""
+    pass
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords with a configurable scheme and cost in a bounded thread pool"""
+
+    def __init__(self, scheme='pbkdf2', pbkdf2_iterations=1000000, bcrypt_rounds=12, workers=4, timeout=10):
+        self._executor = None
+        self._lock = threading.Lock()
+        self.configure(scheme, pbkdf2_iterations, bcrypt_rounds, workers, timeout)
+
+    def configure(self, scheme=None, pbkdf2_iterations=None, bcrypt_rounds=None, workers=None, timeout=None):
+        """Change the hashing parameters; a new worker count takes effect on the next hash"""
+        if scheme is not None:
+            if scheme not in HASH_SCHEMES:
+                raise ValueError(f"Unknown password hash scheme '{scheme}'")
+            self.scheme = scheme
+        if pbkdf2_iterations is not None:
+            self.pbkdf2_iterations = pbkdf2_iterations
+        if bcrypt_rounds is not None:
+            if not 4 <= bcrypt_rounds <= 31:
+                raise ValueError("bcrypt rounds must be between 4 and 31")
+            self.bcrypt_rounds = bcrypt_rounds
+        if timeout is not None:
+            self.timeout = timeout
+        if workers is not None:
+            with self._lock:
+                self.workers = workers
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+
+    def _run(self, function, *args):
+        """Run function in the hashing pool, raising HasherBusy if it does not finish in time"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+            future = self._executor.submit(function, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise HasherBusy(f"Password hashing did not finish within {self.timeout}s")
+
+    def _hash(self, password):
+        if self.scheme == 'bcrypt':
+            return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.bcrypt_rounds)).decode('ascii')
+        return generate_password_hash(password, method=f'pbkdf2:sha256:{self.pbkdf2_iterations}')
+
+    @staticmethod
+    def _verify(password_hash, password):
+        if password_hash.startswith(BCRYPT_PREFIXES):
+            try:
+                return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('ascii'))
+            except ValueError:
+                return False
+        return check_password_hash(password_hash, password)
+
+    def hash(self, password):
+        """Hash a password with the configured scheme and cost"""
+        return self._run(self._hash, password)
+
+    def verify(self, password_hash, password):
+        """True if password matches password_hash (any supported scheme or cost)"""
+        return self._run(self._verify, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if password_hash was made with another scheme or cost than the configured one"""
+        if password_hash.startswith(BCRYPT_PREFIXES):
+            return self.scheme != 'bcrypt' or password_hash[4:6] != f'{self.bcrypt_rounds:02d}'
+        if self.scheme != 'pbkdf2':
+            return True
+        method = password_hash.split('$', 1)[0].split(':')
+        return method[:2] != ['pbkdf2', 'sha256'] or len(method) < 3 or method[2] != str(self.pbkdf2_iterations)
+
+
+# Process-wide hasher, configured from PASSWORD_* settings in create_app
+password_hasher = PasswordHasher()
@@ -0,0 +1,111 @@
+"""
+Service completion for one or many vehicles. Cars sharing the same adjusted interval are
+updated with one set-based UPDATE, and the history rows are written with one INSERT ... SELECT,
+all in a single transaction.
+"""
+from datetime import date
+
+from .fleet import evaluate_fleet
+from .forecasting import record_usage
+from .models.oil_calculator import months_after
+
+SERVICE_TYPES = ('oil_change', 'tire_change')
+MAX_BULK_SERVICE = 500
+
+# service_type -> (last km, last date, next due km, next due date) columns
+SERVICE_COLUMNS = {
+    'oil_change': ('last_oil_change_km', 'last_oil_change_date', 'next_oil_due_km', 'next_oil_due_date'),
+    'tire_change': ('last_tire_change_km', 'last_tire_change_date', 'next_tire_due_km', 'next_tire_due_date')
+}
+
+
+def service_name(service_type, vehicle_type):
+    """Human readable service name, as used in flash messages and history notes"""
+    if service_type == 'tire_change':
+        return "Tire change"
+    return "Battery/brake service" if vehicle_type == 'electric' else "Oil change"
+
+
+def history_type(service_type, vehicle_type):
+    """maintenance_history.maintenance_type for a completed service"""
+    if service_type == 'tire_change':
+        return 'tire_change'
+    return 'battery_service' if vehicle_type == 'electric' else 'oil_change'
+
+
+def complete_services(connection, company_id, user_id, performed_by_name, vehicle_ids, service_type):
+    """
+    Mark a service as done today for the company's active vehicles among vehicle_ids.
+    Returns (serviced, missing_ids) where serviced is a list of {id, plate_number, service}.
+    Raises ValueError for an unknown service type; rolls back on database errors.
+    """
+    if service_type not in SERVICE_TYPES:
+        raise ValueError(f"Unknown service type '{service_type}'")
+    vehicle_ids = list(dict.fromkeys(vehicle_ids))
+    if not vehicle_ids:
+        return [], []
+
+    today = date.today()
+    cursor = connection.cursor()
+    placeholders = ', '.join(['%s'] * len(vehicle_ids))
+    scope = f"c.company_id = %s AND c.is_active = TRUE AND c.id IN ({placeholders})"
+
+    try:
+        cursor.execute(f"""
+            SELECT c.*, cm.fuel_type
+            FROM cars c
+            LEFT JOIN car_models cm ON c.car_model_id = cm.id
+            WHERE {scope}
+        """, (company_id, *vehicle_ids))
+        cars = cursor.fetchall()
+        if not cars:
+            return [], vehicle_ids
+
+        # The adjusted intervals depend only on the car's type, fuel, oil and tires, not on its history
+        vehicle_types, maintenance, tires, _ = evaluate_fleet(cars)
+        intervals = maintenance if service_type == 'oil_change' else tires
+        groups = {}
+        for car, interval_km, interval_months in zip(cars, intervals['adjusted_km'].tolist(),
+                                                     intervals['adjusted_months'].tolist()):
+            groups.setdefault((interval_km, interval_months), []).append(car['id'])
+
+        last_km, last_date, due_km, due_date = SERVICE_COLUMNS[service_type]
+        for (interval_km, interval_months), ids in groups.items():
+            cursor.execute(f"""
+                UPDATE cars
+                SET {last_km} = mileage, {last_date} = %s,
+                    {due_km} = mileage + %s, {due_date} = %s
+                WHERE company_id = %s AND is_active = TRUE AND id IN ({', '.join(['%s'] * len(ids))})
+            """, (today, interval_km, months_after([today], [interval_months])[0], company_id, *ids))
+
+        cursor.execute(f"""
+            INSERT INTO maintenance_history (car_id, company_id, maintenance_type, mileage_at_service,
+                                             service_date, notes, performed_by)
+            SELECT c.id, c.company_id,
+                   CASE WHEN COALESCE(cm.fuel_type, 'gasoline') = 'electric' THEN %s ELSE %s END,
+                   c.mileage, %s,
+                   CASE WHEN COALESCE(cm.fuel_type, 'gasoline') = 'electric' THEN %s ELSE %s END,
+                   %s
+            FROM cars c
+            LEFT JOIN car_models cm ON c.car_model_id = cm.id
+            WHERE {scope}
+        """, (history_type(service_type, 'electric'), history_type(service_type, 'gasoline'), today,
+              f"{service_name(service_type, 'electric')} completed by {performed_by_name}",
+              f"{service_name(service_type, 'gasoline')} completed by {performed_by_name}",
+              user_id, company_id, *vehicle_ids))
+
+        # The odometer reading at service also feeds the usage-rate forecast
+        record_usage(cursor, [(car['id'], company_id, car['mileage'], today) for car in cars])
+
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    serviced = [{'id': car['id'], 'plate_number': car['plate_number'],
+                 'service': service_name(service_type, vehicle_type)}
+                for car, vehicle_type in zip(cars, vehicle_types)]
+    found = {car['id'] for car in cars}
+    return serviced, [vehicle_id for vehicle_id in vehicle_ids if vehicle_id not in found]
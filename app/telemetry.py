@@ -0,0 +1,215 @@
+"""
+Odometer ingestion for telematics boxes. Readings are buffered in memory and coalesced to the
+latest one per car, then written to cars.mileage by a background flusher with one bulk UPDATE
+per company and chunk. Readings older than, or below, the latest accepted one for a car are
+dropped, and GREATEST() in the UPDATE keeps mileage from going backwards across workers.
+Readings timestamped more than MAX_CLOCK_SKEW ahead of their arrival are rejected as invalid.
+
+Each worker process buffers and flushes its own readings; a crash loses at most one flush
+interval, which the next reading from the box replaces. The materialized next_*_due_km columns
+do not depend on mileage, so besides cars.mileage a flush only folds the readings into the
+usage-rate forecast statistics (see app/forecasting.py).
+"""
+from datetime import datetime
+import logging
+import threading
+import time
+
+from .fleet import invalidate_fleet_summary
+from .forecasting import record_usage
+
+logger = logging.getLogger(__name__)
+
+MAX_READINGS_PER_REQUEST = 5000
+FLUSH_CHUNK_SIZE = 500
+# Seconds a reading may be timestamped ahead of its arrival. Readings further in the future are
+# invalid: accepted, they would block every later reading for the car as "older than the latest"
+MAX_CLOCK_SKEW = 300
+
+
+def parse_reading(reading, received_at):
+    """(car_id, odometer_km, read_at timestamp) from a posted reading; raises ValueError if invalid"""
+    try:
+        car_id = int(reading['vehicle_id'])
+        odometer_km = int(reading['odometer_km'])
+        read_at = datetime.fromisoformat(reading['read_at']).timestamp() if reading.get('read_at') else received_at
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"Invalid reading: {reading!r}") from e
+    if odometer_km < 0 or read_at > received_at + MAX_CLOCK_SKEW:
+        raise ValueError(f"Invalid reading: {reading!r}")
+    return car_id, odometer_km, read_at
+
+
+class OdometerBuffer:
+    """Latest pending reading per (company_id, car_id), with ingestion and flush counters"""
+
+    def __init__(self, max_pending=50000):
+        self.max_pending = max_pending
+        self._pending = {}  # (company_id, car_id) -> (odometer_km, read_at, buffered_at)
+        self._latest = {}  # (company_id, car_id) -> (odometer_km, read_at) of the latest accepted reading
+        self._lock = threading.Lock()
+        self.flush_requested = threading.Event()
+
+        self.received = 0
+        self.accepted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.invalid = 0
+        self.flushes = 0
+        self.flushed_readings = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.max_latency_ms = 0.0
+        self.total_latency = 0.0
+        self._started = time.monotonic()
+
+    def add(self, company_id, readings):
+        """Buffer a batch of posted readings for a company; returns {accepted, dropped, invalid}"""
+        received_at = time.time()
+        parsed = []
+        invalid = 0
+        for reading in readings:
+            try:
+                parsed.append(parse_reading(reading, received_at))
+            except ValueError:
+                invalid += 1
+
+        accepted = dropped = coalesced = 0
+        now = time.monotonic()
+        with self._lock:
+            for car_id, odometer_km, read_at in parsed:
+                key = (company_id, car_id)
+                latest = self._latest.get(key)
+                if latest and (read_at < latest[1] or odometer_km < latest[0]):
+                    dropped += 1
+                    continue
+                self._latest[key] = (odometer_km, read_at)
+                pending = self._pending.get(key)
+                if pending:
+                    coalesced += 1
+                self._pending[key] = (odometer_km, read_at, pending[2] if pending else now)
+                accepted += 1
+            self.received += len(readings)
+            self.accepted += accepted
+            self.coalesced += coalesced
+            self.dropped += dropped
+            self.invalid += invalid
+            if len(self._pending) >= self.max_pending:
+                self.flush_requested.set()
+        return {'accepted': accepted, 'dropped': dropped, 'invalid': invalid}
+
+    def _take(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def _restore(self, pending):
+        """Put back readings of a failed flush, unless a newer one arrived meanwhile"""
+        with self._lock:
+            for key, entry in pending.items():
+                current = self._pending.get(key)
+                self._pending[key] = (current[0], current[1], entry[2]) if current else entry
+
+    def flush(self, connection):
+        """Write the pending readings to cars.mileage; returns how many were written"""
+        pending = self._take()
+        if not pending:
+            return 0
+
+        started = time.monotonic()
+        by_company = {}
+        for (company_id, car_id), (odometer_km, _, _) in pending.items():
+            by_company.setdefault(company_id, []).append((car_id, odometer_km))
+        usage = [(car_id, company_id, odometer_km, datetime.fromtimestamp(read_at))
+                 for (company_id, car_id), (odometer_km, read_at, _) in pending.items()]
+
+        cursor = connection.cursor()
+        try:
+            for company_id, readings in by_company.items():
+                for start in range(0, len(readings), FLUSH_CHUNK_SIZE):
+                    chunk = readings[start:start + FLUSH_CHUNK_SIZE]
+                    cases = ' '.join(['WHEN %s THEN %s'] * len(chunk))
+                    cursor.execute(f"""
+                        UPDATE cars
+                        SET mileage = GREATEST(mileage, CASE id {cases} END)
+                        WHERE company_id = %s AND is_active = TRUE AND id IN ({', '.join(['%s'] * len(chunk))})
+                    """, (*(value for reading in chunk for value in reading), company_id,
+                          *(car_id for car_id, _ in chunk)))
+            record_usage(cursor, usage)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            self._restore(pending)
+            with self._lock:
+                self.flush_errors += 1
+            raise
+        finally:
+            cursor.close()
+
+        for company_id in by_company:
+            invalidate_fleet_summary(company_id)
+
+        finished = time.monotonic()
+        with self._lock:
+            self.flushes += 1
+            self.flushed_readings += len(pending)
+            self.last_flush_ms = (finished - started) * 1000
+            self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+            for _, _, buffered_at in pending.values():
+                latency = finished - buffered_at
+                self.total_latency += latency
+                self.max_latency_ms = max(self.max_latency_ms, latency * 1000)
+        return len(pending)
+
+    def stats(self):
+        """Ingestion throughput and flush latency counters for monitoring"""
+        with self._lock:
+            uptime = time.monotonic() - self._started
+            oldest = min((entry[2] for entry in self._pending.values()), default=None)
+            return {
+                'pending': len(self._pending),
+                'oldest_pending_ms': round((time.monotonic() - oldest) * 1000, 1) if oldest else 0.0,
+                'received': self.received,
+                'accepted': self.accepted,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'invalid': self.invalid,
+                'readings_per_second': round(self.received / uptime, 1) if uptime else 0.0,
+                'flushes': self.flushes,
+                'flushed_readings': self.flushed_readings,
+                'flush_errors': self.flush_errors,
+                'last_flush_ms': round(self.last_flush_ms, 3),
+                'max_flush_ms': round(self.max_flush_ms, 3),
+                'avg_latency_ms': round(self.total_latency * 1000 / self.flushed_readings, 1)
+                                  if self.flushed_readings else 0.0,
+                'max_latency_ms': round(self.max_latency_ms, 1)
+            }
+
+
+odometer_buffer = OdometerBuffer()
+
+_flusher = None
+
+
+def start_telemetry_flusher(app, db):
+    """Flush the odometer buffer every TELEMETRY_FLUSH_INTERVAL seconds, or sooner when it fills up"""
+    global _flusher
+    if _flusher is not None:
+        return _flusher
+
+    interval = app.config.get('TELEMETRY_FLUSH_INTERVAL', 5)
+
+    def run():
+        while True:
+            odometer_buffer.flush_requested.wait(interval)
+            odometer_buffer.flush_requested.clear()
+            try:
+                with app.app_context():
+                    odometer_buffer.flush(db.connection)
+            except Exception:
+                logger.exception("Odometer flush failed")
+
+    _flusher = threading.Thread(target=run, name='odometer-flush', daemon=True)
+    _flusher.start()
+    return _flusher
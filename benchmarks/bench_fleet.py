@@ -0,0 +1,171 @@
+"""
+Estimator and dashboard benchmarks on synthetic fleets (see fleet_generator.py).
+
+- estimators.scalar.*: MaintenanceEstimator / TireChangeEstimator / OilChangeEstimator per vehicle
+- estimators.batch[N]: the vectorized fleet evaluation (fleet.evaluate_fleet) over N vehicles
+- dashboard.render[N]: GET /admin through the Flask test client, against an in-memory SQLite
+  stand-in holding N vehicles (memory_db.py)
+
+Results are written as JSON (p50/p99 in milliseconds). With --baseline, the run fails (exit 1)
+when any p50 or p99 is more than --threshold slower than the baseline's.
+
+    python benchmarks/bench_fleet.py --sizes 1000 10000 100000 --output bench.json
+    python benchmarks/bench_fleet.py --baseline bench.json --threshold 0.2
+"""
+from datetime import datetime
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from app import create_app  # noqa: E402
+from app.fleet import determine_vehicle_type, evaluate_fleet, resolve_fuel_type  # noqa: E402
+from app.models.oil_calculator import (MaintenanceEstimator, OilChangeEstimator, TireChangeEstimator,  # noqa: E402
+                                       months_elapsed)
+from fleet_generator import generate_fleet  # noqa: E402
+from memory_db import MemoryDatabase  # noqa: E402
+
+
+def summarize(samples, **extra):
+    """p50/p99/mean in milliseconds for a list of durations in seconds"""
+    samples_ms = np.asarray(samples) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(samples_ms, 50)), 6),
+        'p99_ms': round(float(np.percentile(samples_ms, 99)), 6),
+        'mean_ms': round(float(samples_ms.mean()), 6),
+        'samples': len(samples_ms),
+        **extra
+    }
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def bench_scalar_estimators(cars):
+    """Per-vehicle timings of the scalar estimator classes"""
+    months_oil = months_elapsed([car['last_oil_change_date'] for car in cars])
+    months_tire = months_elapsed([car['last_tire_change_date'] for car in cars], missing=48)
+    maintenance, tires, oil = [], [], []
+    for car, oil_months, tire_months in zip(cars, months_oil.tolist(), months_tire.tolist()):
+        vehicle_type = determine_vehicle_type(car)
+        fuel_type = resolve_fuel_type(vehicle_type, car['gas_type'])
+        maintenance.append(timed(lambda: MaintenanceEstimator(car['mileage'] - car['last_oil_change_km'], fuel_type,
+                                                              oil_months, car['oil_type'],
+                                                              vehicle_type).calculate_maintenance_need()))
+        tires.append(timed(lambda: TireChangeEstimator(car['mileage'] - car['last_tire_change_km'], tire_months,
+                                                       car['tire_brand']).calculate_tire_change_need()))
+        oil.append(timed(lambda: OilChangeEstimator(car['mileage'] - car['last_oil_change_km'], car['gas_type'],
+                                                    oil_months, car['oil_type']).calculate_oil_change_need()))
+    return {
+        'estimators.scalar.maintenance': summarize(maintenance),
+        'estimators.scalar.tire': summarize(tires),
+        'estimators.scalar.oil': summarize(oil)
+    }
+
+
+def bench_batch(cars, repeat):
+    """Whole-fleet vectorized evaluation"""
+    samples = [timed(evaluate_fleet, cars) for _ in range(repeat)]
+    result = summarize(samples, vehicles=len(cars))
+    result['per_vehicle_us'] = round(result['p50_ms'] * 1000 / len(cars), 4)
+    return result
+
+
+def bench_dashboard(cars, repeat):
+    """Full /admin render (listing page, header counters, brands, template) against the stand-in database"""
+    db = MemoryDatabase()
+    db.load_fleet(cars)
+    app = create_app({'DB_CREATOR': db.connection_factory(), 'TESTING': True, 'FLEET_SCAN_INTERVAL': None,
+                      'SUMMARY_CACHE_TTL': 0, 'IDENTITY_CACHE_TTL': 0})
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=1, company_id=1, username='bench', full_name='Bench Owner',
+                       company_name='Bench Fleet', role='admin')
+
+    samples = []
+    for _ in range(repeat + 1):
+        started = time.perf_counter()
+        response = client.get('/admin')
+        samples.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"/admin returned {response.status_code}")
+    return summarize(samples[1:], vehicles=len(cars))  # the first request warms up templates and caches
+
+
+def compare(results, baseline, threshold):
+    """Regressions of p50/p99 beyond threshold (a fraction) against a baseline result file"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p99_ms'):
+            if previous[metric] and result[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f"{name} {metric}: {previous[metric]:.4f} -> {result[metric]:.4f} "
+                                   f"(+{(result[metric] / previous[metric] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='fleet sizes for the batch and dashboard benchmarks (up to 1,000,000)')
+    parser.add_argument('--seed', type=int, default=0, help='synthetic fleet seed')
+    parser.add_argument('--scalar-sample', type=int, default=2000, help='vehicles timed one by one')
+    parser.add_argument('--repeat', type=int, default=15, help='runs per batch/dashboard benchmark')
+    parser.add_argument('--dashboard-max', type=int, default=100000,
+                        help='skip the dashboard benchmark for larger fleets (loading takes a while)')
+    parser.add_argument('--output', default='benchmark-results.json', help='JSON results file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed p50/p99 slowdown, as a fraction')
+    args = parser.parse_args()
+
+    fleet = generate_fleet(max(max(args.sizes), args.scalar_sample), seed=args.seed)
+    results = bench_scalar_estimators(fleet[:args.scalar_sample])
+    for size in sorted(args.sizes):
+        cars = fleet[:size]
+        results[f'estimators.batch[{size}]'] = bench_batch(cars, args.repeat)
+        if size <= args.dashboard_max:
+            results[f'dashboard.render[{size}]'] = bench_dashboard(cars, args.repeat)
+
+    for name, result in results.items():
+        print(f"{name:36} p50={result['p50_ms']:>10.4f}ms  p99={result['p99_ms']:>10.4f}ms")
+
+    output = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'seed': args.seed,
+            'sizes': sorted(args.sizes)
+        },
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Login hashing benchmark: simulates a burst of concurrent logins against app.security.PasswordHasher
+and reports per-login latency and throughput for each scheme/cost setting, to pick
+PASSWORD_HASH_SCHEME, PASSWORD_PBKDF2_ITERATIONS / PASSWORD_BCRYPT_ROUNDS and PASSWORD_HASH_WORKERS.
+
+    python benchmarks/bench_password_hash.py
+    python benchmarks/bench_password_hash.py --pbkdf2 300000 600000 --bcrypt 10 12 --logins 64 --clients 16
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.security import PasswordHasher  # noqa: E402
+
+PASSWORD = 'correct horse battery staple'
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def bench_setting(scheme, cost, logins, clients, workers):
+    """Time `logins` verifications issued by `clients` concurrent request threads"""
+    if scheme == 'bcrypt':
+        hasher = PasswordHasher(scheme='bcrypt', bcrypt_rounds=cost, workers=workers, timeout=600)
+    else:
+        hasher = PasswordHasher(scheme='pbkdf2', pbkdf2_iterations=cost, workers=workers, timeout=600)
+    password_hash = hasher.hash(PASSWORD)
+
+    def login(_):
+        started = time.perf_counter()
+        if not hasher.verify(password_hash, PASSWORD):
+            raise RuntimeError("verification failed")
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as requests:
+        latencies = list(requests.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'scheme': scheme,
+        'cost': cost,
+        'workers': workers,
+        'logins': logins,
+        'clients': clients,
+        'latency_ms': {
+            'p50': round(statistics.median(latencies) * 1000, 1),
+            'p95': round(percentile(latencies, 0.95) * 1000, 1),
+            'max': round(max(latencies) * 1000, 1)
+        },
+        'logins_per_second': round(logins / elapsed, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pbkdf2', type=int, nargs='*', default=[100000, 300000, 600000, 1000000],
+                        help='pbkdf2-sha256 iteration counts to test')
+    parser.add_argument('--bcrypt', type=int, nargs='*', default=[10, 11, 12],
+                        help='bcrypt rounds (log2 cost) to test')
+    parser.add_argument('--logins', type=int, default=32, help='logins per setting')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent login requests')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='hashing pool size')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    settings = [('pbkdf2', cost) for cost in args.pbkdf2] + [('bcrypt', cost) for cost in args.bcrypt]
+    results = []
+    for scheme, cost in settings:
+        result = bench_setting(scheme, cost, args.logins, args.clients, args.workers)
+        results.append(result)
+        if not args.json:
+            latency = result['latency_ms']
+            print(f"{scheme:7} cost={cost:<8} p50={latency['p50']:>8.1f}ms p95={latency['p95']:>8.1f}ms "
+                  f"max={latency['max']:>8.1f}ms  {result['logins_per_second']:>7.1f} logins/s")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
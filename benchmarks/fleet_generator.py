@@ -0,0 +1,101 @@
+"""
+Deterministic synthetic fleets for the benchmarks: car rows shaped like the dashboard query
+results (cars joined with car_models), with realistic fuel, octane, oil, tire, mileage and
+service date mixes. The same size and seed always give the same fleet.
+"""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+# (brand, model, fuel_type, engine_size), inserted with ids 1..N by memory_db
+CAR_MODELS = [
+    ('Toyota', 'Camry', 'gasoline', '2.5L'),
+    ('Toyota', 'Corolla', 'gasoline', '1.6L'),
+    ('Toyota', 'Prius', 'hybrid', '1.8L'),
+    ('Toyota', 'Land Cruiser', 'diesel', '4.5L'),
+    ('Honda', 'Civic', 'gasoline', '1.5L'),
+    ('Hyundai', 'Elantra', 'gasoline', '2.0L'),
+    ('BMW', '3 Series', 'diesel', '2.0L'),
+    ('Mercedes-Benz', 'E-Class', 'diesel', '2.2L'),
+    ('Lada', 'Vesta', 'gasoline', '1.6L'),
+    ('Renault', 'Logan', 'gasoline', '1.6L'),
+    ('Lexus', 'RX Hybrid', 'hybrid', '3.5L'),
+    ('Tesla', 'Model 3', 'electric', '0.0L'),
+    ('Nissan', 'Leaf', 'electric', '0.0L'),
+    ('BYD', 'Atto 3', 'electric', '0.0L')
+]
+
+# Share of the fleet per fuel type; CUSTOM_MODEL_SHARE of the cars get a custom (gasoline) model instead
+FUEL_MIX = {'gasoline': 0.62, 'diesel': 0.18, 'hybrid': 0.08, 'electric': 0.04}
+CUSTOM_MODEL_SHARE = 0.08
+OCTANE_MIX = {'92': 0.35, '95': 0.5, '98': 0.15}
+OIL_MIX = {'standard': 0.4, 'semi-synthetic': 0.25, 'synthetic': 0.25, 'premium': 0.1}
+TIRE_MIX = {'standard': 0.5, 'budget': 0.2, 'premium': 0.15, 'performance': 0.05, 'winter': 0.1}
+NO_TIRE_DATE_SHARE = 0.15
+
+
+def _choice(rng, mix, size):
+    return rng.choice(list(mix), size=size, p=np.array(list(mix.values())) / sum(mix.values()))
+
+
+def generate_fleet(size, seed=0, company_id=1, today=None):
+    """List of `size` car row dicts for company_id with ids 1..size"""
+    today = today or date.today()
+    rng = np.random.default_rng(seed)
+
+    # Pick a model per car so the fuel types follow FUEL_MIX
+    model_ids = np.empty(size, dtype=np.int64)
+    fuel_of_model = np.array([model[2] for model in CAR_MODELS])
+    fuels = _choice(rng, FUEL_MIX, size)
+    for fuel in FUEL_MIX:
+        rows = np.flatnonzero(fuels == fuel)
+        model_ids[rows] = rng.choice(np.flatnonzero(fuel_of_model == fuel) + 1, size=len(rows))
+    custom = rng.random(size) < CUSTOM_MODEL_SHARE
+    fuels[custom] = 'gasoline'
+
+    octanes = _choice(rng, OCTANE_MIX, size)
+    gas_types = np.where(np.isin(fuels, ['diesel', 'electric']), fuels, octanes)
+    oil_types = _choice(rng, OIL_MIX, size)
+    tire_brands = _choice(rng, TIRE_MIX, size)
+
+    # Mileage grows with age at 8k-30k km a year
+    age_days = rng.integers(30, 12 * 365, size)
+    mileage = (age_days / 365 * rng.uniform(8000, 30000, size)).astype(np.int64) + 10
+    oil_gap_km = np.minimum(rng.gamma(2.0, 4500, size).astype(np.int64), mileage)
+    oil_gap_days = np.minimum(rng.integers(0, 540, size), age_days)
+    tire_gap_km = np.minimum(rng.gamma(2.5, 18000, size).astype(np.int64), mileage)
+    tire_gap_days = np.minimum(rng.integers(0, 6 * 365, size), age_days)
+    no_tire_date = rng.random(size) < NO_TIRE_DATE_SHARE
+    created_minutes = rng.integers(0, 3 * 365 * 24 * 60, size)
+
+    started = datetime.combine(today, datetime.min.time())
+    cars = []
+    for i in range(size):
+        model = None if custom[i] else CAR_MODELS[model_ids[i] - 1]
+        created_at = started - timedelta(minutes=int(created_minutes[i]))
+        cars.append({
+            'id': i + 1,
+            'company_id': company_id,
+            'plate_number': f"{10 + i % 90:02d}-BN-{i + 1:07d}",
+            'car_model_id': None if custom[i] else int(model_ids[i]),
+            'custom_model': 'Custom build' if custom[i] else None,
+            'owner': f"Owner {i + 1}",
+            'tel_no': f"+99450{i:07d}",
+            'mileage': int(mileage[i]),
+            'production_date': today - timedelta(days=int(age_days[i])),
+            'gas_type': str(gas_types[i]),
+            'oil_type': str(oil_types[i]),
+            'last_oil_change_km': int(mileage[i] - oil_gap_km[i]),
+            'last_oil_change_date': today - timedelta(days=int(oil_gap_days[i])),
+            'last_tire_change_km': int(mileage[i] - tire_gap_km[i]),
+            'last_tire_change_date': None if no_tire_date[i] else today - timedelta(days=int(tire_gap_days[i])),
+            'tire_brand': str(tire_brands[i]),
+            'is_active': True,
+            'created_at': created_at,
+            'updated_at': created_at,
+            'brand': model[0] if model else None,
+            'model_name': model[1] if model else None,
+            'fuel_type': model[2] if model else None,
+            'engine_size': model[3] if model else None
+        })
+    return cars
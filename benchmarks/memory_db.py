@@ -0,0 +1,104 @@
+"""
+In-memory SQLite stand-in for the MySQL database, for benchmarks only. It covers the tables and
+SQL the dashboard reads. Use connection_factory() as the DB_CREATOR config value:
+
+    db = MemoryDatabase()
+    db.load_fleet(generate_fleet(10000))
+    app = create_app({'DB_CREATOR': db.connection_factory()})
+"""
+from datetime import date, datetime
+import itertools
+import sqlite3
+
+from app.fleet import SERVICE_DUE_COLUMNS, compute_service_due
+from fleet_generator import CAR_MODELS
+
+SCHEMA = """
+CREATE TABLE companies (id INTEGER PRIMARY KEY, company_name TEXT, owner_name TEXT, email TEXT, phone TEXT,
+                        country TEXT, language TEXT, business_size TEXT, primary_interest TEXT,
+                        logo_filename TEXT, is_active BOOLEAN DEFAULT TRUE);
+CREATE TABLE users (id INTEGER PRIMARY KEY, company_id INT, username TEXT UNIQUE, email TEXT UNIQUE,
+                    password_hash TEXT, full_name TEXT, role TEXT DEFAULT 'admin', is_active BOOLEAN DEFAULT TRUE,
+                    last_login TIMESTAMP);
+CREATE TABLE car_models (id INTEGER PRIMARY KEY, brand TEXT, model TEXT, fuel_type TEXT, engine_size TEXT,
+                         is_active BOOLEAN DEFAULT TRUE, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE cars (id INTEGER PRIMARY KEY, company_id INT, plate_number TEXT, car_model_id INT, custom_model TEXT,
+                   owner TEXT, tel_no TEXT, mileage INT, production_date DATE, gas_type TEXT, oil_type TEXT,
+                   last_oil_change_km INT, last_oil_change_date DATE, last_tire_change_km INT,
+                   last_tire_change_date DATE, tire_brand TEXT, next_oil_due_km INT, next_oil_due_date DATE,
+                   next_tire_due_km INT, next_tire_due_date DATE, due_rules_version TEXT, due_vehicle_type TEXT,
+                   created_by INT, is_active BOOLEAN DEFAULT TRUE,
+                   created_at TIMESTAMP, updated_at TIMESTAMP, UNIQUE (company_id, plate_number));
+CREATE INDEX idx_cars_company_listing ON cars (company_id, is_active, created_at);
+CREATE TABLE vehicle_status_snapshots (car_id INTEGER PRIMARY KEY, company_id INT, evaluated_on DATE,
+                                       car_updated_at TIMESTAMP, inputs_key TEXT, rules_version TEXT, vehicle_type TEXT,
+                                       maintenance_severity INT, maintenance_km_remaining INT,
+                                       maintenance_months_remaining INT, maintenance_kind INT, tire_severity INT,
+                                       tire_km_remaining INT, tire_months_remaining INT, tire_kind INT,
+                                       is_critical BOOLEAN);
+"""
+
+CAR_COLUMNS = ('id', 'company_id', 'plate_number', 'car_model_id', 'custom_model', 'owner', 'tel_no', 'mileage',
+               'production_date', 'gas_type', 'oil_type', 'last_oil_change_km', 'last_oil_change_date',
+               'last_tire_change_km', 'last_tire_change_date', 'tire_brand', 'created_at', 'updated_at')
+
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=' '))
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('BOOLEAN', lambda value: bool(int(value)))
+
+_names = itertools.count()
+
+
+class StandInCursor(sqlite3.Cursor):
+    """Cursor accepting the MySQL driver's %s placeholders and returning dict rows"""
+
+    def execute(self, sql, params=()):
+        return super().execute(sql.replace('%s', '?'), params)
+
+    def executemany(self, sql, seq):
+        return super().executemany(sql.replace('%s', '?'), seq)
+
+
+class StandInConnection(sqlite3.Connection):
+    def cursor(self, *args):
+        cursor = super().cursor(StandInCursor)
+        cursor.row_factory = lambda cursor, row: {column[0]: value for column, value in zip(cursor.description, row)}
+        return cursor
+
+
+class MemoryDatabase:
+    """A named shared-cache in-memory database, alive as long as this object is"""
+
+    def __init__(self):
+        self.uri = f"file:carminder_bench_{next(_names)}?mode=memory&cache=shared"
+        self._keeper = self.connect()
+        self._keeper.executescript(SCHEMA)
+        self._keeper.execute("""INSERT INTO companies (id, company_name, owner_name, email, phone, country, language,
+                                                       business_size, primary_interest)
+                                VALUES (1, 'Bench Fleet', 'Bench Owner', 'bench@example.com', '0', 'AZ', 'English',
+                                        '100+ vehicles', 'Fleet Management')""")
+        self._keeper.execute("""INSERT INTO users (id, company_id, username, email, password_hash, full_name)
+                                VALUES (1, 1, 'bench', 'bench@example.com', '-', 'Bench Owner')""")
+        self._keeper.executemany("INSERT INTO car_models (id, brand, model, fuel_type, engine_size) VALUES (?, ?, ?, ?, ?)",
+                                 [(i + 1, *model) for i, model in enumerate(CAR_MODELS)])
+        self._keeper.commit()
+
+    def connect(self):
+        return sqlite3.connect(self.uri, uri=True, factory=StandInConnection, check_same_thread=False,
+                               detect_types=sqlite3.PARSE_DECLTYPES)
+
+    def connection_factory(self):
+        return self.connect
+
+    def load_fleet(self, cars, batch_size=10000):
+        """Insert generated cars, with their materialized service due columns"""
+        for start in range(0, len(cars), batch_size):
+            batch = cars[start:start + batch_size]
+            self._keeper.executemany(f"""
+                INSERT INTO cars ({', '.join(CAR_COLUMNS)}, {', '.join(SERVICE_DUE_COLUMNS)}, created_by)
+                VALUES ({', '.join(['?'] * (len(CAR_COLUMNS) + len(SERVICE_DUE_COLUMNS)))}, 1)
+            """, [(*(car[column] for column in CAR_COLUMNS), *due) for car, due in zip(batch, compute_service_due(batch))])
+        self._keeper.commit()
@@ -6,5 +6,66 @@ MYSQL_PASSWORD = 'Turan2006'
 MYSQL_DB = 'carminder'
 MYSQL_CURSORCLASS = 'DictCursor'
 
+# Connection pool (per worker process), see app/db.py
+DB_POOL_MIN_SIZE = 1
+DB_POOL_MAX_SIZE = 10
+DB_POOL_TIMEOUT = 10         # seconds to wait for a free connection
+DB_POOL_MAX_LIFETIME = 3600  # recycle connections older than this (keep below MySQL wait_timeout)
+DB_POOL_IDLE_TIMEOUT = 300   # close connections above the minimum after this long unused
+DB_POOL_PING_AFTER = 5       # health-check connections idle longer than this on checkout
+
 SECRET_KEY = 'carminder-secret-key-2025'
-DEBUG = True
\ No newline at end of file
+DEBUG = True
+
+# Password hashing (see app/security.py and benchmarks/bench_password_hash.py).
+# Existing hashes made with other settings are upgraded on the user's next login.
+PASSWORD_HASH_SCHEME = 'pbkdf2'        # 'pbkdf2' or 'bcrypt'
+PASSWORD_PBKDF2_ITERATIONS = 1000000
+PASSWORD_BCRYPT_ROUNDS = 12
+PASSWORD_HASH_WORKERS = 4              # hashes computed at once per worker process
+PASSWORD_HASH_TIMEOUT = 10             # seconds a login waits for the hashing pool
+
+# Optional JSON file overriding the maintenance interval rules (see app/models/oil_calculator.py)
+INTERVAL_RULES_FILE = None
+INTERVAL_RULES_CHECK_SECONDS = 30
+
+# Dashboard header counters cache (per worker process): max companies and seconds before recount
+SUMMARY_CACHE_SIZE = 1024
+SUMMARY_CACHE_TTL = 60
+
+# Seconds a logged-in user's name/role/company logo is cached before being re-read
+IDENTITY_CACHE_TTL = 30
+
+# Memory budget (bytes, per worker process) for rendered dashboard table rows
+ROW_FRAGMENT_CACHE_BYTES = 32 * 1024 * 1024
+
+# Background threads (per worker process) validating uploaded logos and writing their thumbnails
+LOGO_WORKERS = 2
+
+# How often the cached car model catalog checks car_models for changes
+CATALOG_CHECK_SECONDS = 60
+
+# Background fleet scan: `flask scan-fleet` from cron, or set an interval (seconds) to run it
+# in-process. Workers > 0 evaluates batches in a process pool.
+FLEET_SCAN_INTERVAL = None
+FLEET_SCAN_WORKERS = 0
+
+# Prometheus-style metrics (per worker process). /metrics is only served when a token is set,
+# and the scraper must send "Authorization: Bearer <token>"
+METRICS_ENABLED = True
+METRICS_TOKEN = None
+
+# Telematics odometer ingestion (POST /api/telemetry/odometer with "Authorization: Bearer <token>").
+# Maps each box fleet's token to its company id; ingestion is disabled while empty.
+TELEMETRY_TOKENS = {}
+TELEMETRY_FLUSH_INTERVAL = 5     # seconds between bulk mileage updates
+TELEMETRY_MAX_PENDING = 50000    # flush early once this many cars have pending readings
+
+# Owner reminders (`flask send-reminders`): sender is 'log', 'file' (NDJSON to REMINDER_FILE)
+# or 'smtp' (email-to-SMS gateway, see app/reminders.py)
+REMINDER_SENDER = 'log'
+REMINDER_FILE = 'reminders.ndjson'
+REMINDER_CONCURRENCY = 50
+REMINDER_RATE_PER_SECOND = 100
+REMINDER_MAX_ATTEMPTS = 3
+REMINDER_CLAIM_TIMEOUT = 600    # seconds before reminders claimed by a crashed run are retried
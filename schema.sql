@@ -213,4 +213,59 @@ INSERT INTO car_models (brand, model, year_from, year_to, fuel_type, engine_size
 ('Lexus', 'RX Hybrid', 2016, 2025, 'hybrid', '3.5L');
 
 -- Update demo data
-UPDATE companies SET logo_filename = 'demo-logo.png' WHERE id = 1;
\ No newline at end of file
+UPDATE companies SET logo_filename = 'demo-logo.png' WHERE id = 1;
+
+-- Materialized next-service-due columns, maintained on write (run `flask backfill-service-due` for existing rows)
+ALTER TABLE cars ADD COLUMN next_oil_due_km INT NULL AFTER tire_brand;
+ALTER TABLE cars ADD COLUMN next_oil_due_date DATE NULL AFTER next_oil_due_km;
+ALTER TABLE cars ADD COLUMN next_tire_due_km INT NULL AFTER next_oil_due_date;
+ALTER TABLE cars ADD COLUMN next_tire_due_date DATE NULL AFTER next_tire_due_km;
+CREATE INDEX idx_cars_service_due ON cars (company_id, is_active, next_oil_due_date, next_tire_due_date,
+                                           next_oil_due_km, next_tire_due_km, mileage);
+
+-- Precomputed vehicle statuses written by the background fleet scan (`flask scan-fleet`)
+DROP TABLE IF EXISTS vehicle_status_snapshots;
+CREATE TABLE vehicle_status_snapshots (
+    car_id INT PRIMARY KEY,
+    company_id INT NOT NULL,
+    evaluated_on DATE NOT NULL,
+    car_updated_at TIMESTAMP NULL,
+    rules_version CHAR(12) NOT NULL,
+    vehicle_type VARCHAR(20) NOT NULL,
+    maintenance_severity TINYINT NOT NULL,
+    maintenance_km_remaining INT NOT NULL,
+    maintenance_months_remaining INT NOT NULL,
+    maintenance_kind TINYINT NOT NULL,
+    tire_severity TINYINT NOT NULL,
+    tire_km_remaining INT NOT NULL,
+    tire_months_remaining INT NOT NULL,
+    tire_kind TINYINT NOT NULL,
+    is_critical BOOLEAN NOT NULL,
+    scanned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (car_id) REFERENCES cars(id) ON DELETE CASCADE,
+    FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE,
+    INDEX idx_snapshots_company (company_id, is_critical)
+);
+
+-- Due-service reminders sent to car owners, one per car, service and due cycle (`flask send-reminders`)
+DROP TABLE IF EXISTS service_reminders;
+CREATE TABLE service_reminders (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    car_id INT NOT NULL,
+    company_id INT NOT NULL,
+    service_type ENUM('oil_change', 'tire_change') NOT NULL,
+    due_km INT NOT NULL,
+    due_date DATE NOT NULL,
+    status ENUM('pending', 'sent', 'failed') DEFAULT 'pending',
+    attempts INT DEFAULT 0,
+    last_error VARCHAR(255) NULL,
+    sent_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (car_id) REFERENCES cars(id) ON DELETE CASCADE,
+    FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_reminder_per_due (car_id, service_type, due_km, due_date),
+    INDEX idx_reminders_status (status, id)
+);
+
+-- Later schema changes are versioned migrations in app/migrations.py: run `flask migrate-db`
+-- after loading this file (and on every deploy), then `flask check-query-plans`.